@@ -0,0 +1,260 @@
+"""
+Benchmarks of the STL I/O, pipeline stages, converters and batch throughput on synthetic meshes.
+
+    python run_benchmarks.py --output results.json
+    python run_benchmarks.py --sizes 10k,100k,1M,10M --suites io,stages
+    python run_benchmarks.py --output new.json --baseline results.json --threshold 0.15
+"""
+import argparse
+import contextlib
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+BENCHMARK_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCHMARK_DIRECTORY, '..', 'guiVersion'))
+sys.path.insert(0, os.path.join(BENCHMARK_DIRECTORY, '..', 'otherScripts'))
+
+import mesh_engine
+import stl_io
+import synthetic_meshes
+from job_scheduler import JobScheduler
+from processing_backends import create_worker_pool, run_pipeline_job
+
+SUITES = ('io', 'stages', 'convert', 'batch')
+EXIT_REGRESSION = 1
+# Benchmarks faster than this are mostly timer and scheduling noise and are never flagged
+NOISE_FLOOR_SECONDS = 0.005
+
+PIPELINE_PARAMS = {
+    'target_polygon_count': 50000,
+    'laplacian_smooth_lambda_factor': 1.0,
+    'subdivision_levels': 1,
+    'smoothing_factor': 1.0,
+    'smoothing_iterations': 2,
+    'crisp_edge_bevel_width': 0.1,
+    'lod_polygon_counts': [],
+}
+
+
+def parse_list(text):
+    return [item.strip() for item in text.split(',') if item.strip()]
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Time the ModelEnhancer pipeline on synthetic meshes.")
+    parser.add_argument('--suites', type=parse_list, default=list(SUITES), help=f"any of {', '.join(SUITES)}")
+    parser.add_argument('--kinds', type=parse_list, default=list(synthetic_meshes.KINDS),
+                        help=f"mesh kinds, any of {', '.join(synthetic_meshes.KINDS)}")
+    parser.add_argument('--sizes', type=parse_list, default=['10k', '100k', '1M'],
+                        help="triangle counts of the generated meshes, e.g. 10k,100k,1M,10M")
+    parser.add_argument('--repeat', type=int, default=3, help="runs per benchmark; the best one counts")
+    parser.add_argument('--concurrency', type=lambda text: [int(item) for item in parse_list(text)],
+                        default=[1, 2, 4], help="worker counts for the batch suite")
+    parser.add_argument('--batch-files', type=int, default=8, help="files per batch run")
+    parser.add_argument('--batch-size', default='100k', help="triangles per file in the batch suite")
+    parser.add_argument('--engine', choices=('native', 'blender'), default='native',
+                        help="engine of the stages and batch suites (stages needs native)")
+    parser.add_argument('--work-dir', default=os.path.join(tempfile.gettempdir(), 'ModelEnhancer-benchmarks'),
+                        help="generated meshes are kept here and reused by later runs")
+    parser.add_argument('--output', help="write the results to this JSON file")
+    parser.add_argument('--baseline', help="results JSON of an earlier run to compare against")
+    parser.add_argument('--threshold', type=float, default=0.10,
+                        help="relative slowdown against the baseline that counts as a regression")
+    return parser.parse_args(argv)
+
+
+def best_of(repeat, function, setup=None):
+    """Best wall time of `repeat` calls of `function`, each after an untimed `setup`."""
+    times = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+@contextlib.contextmanager
+def quiet_stdout():
+    """Send fd 1 to the null device, so worker processes started inside inherit it too."""
+    sys.stdout.flush()
+    saved = os.dup(1)
+    with open(os.devnull, 'w') as devnull:
+        os.dup2(devnull.fileno(), 1)
+    try:
+        yield
+    finally:
+        sys.stdout.flush()
+        os.dup2(saved, 1)
+        os.close(saved)
+
+
+def mesh_inputs(args):
+    for kind in args.kinds:
+        for size in args.sizes:
+            triangles = synthetic_meshes.parse_size(size)
+            path = synthetic_meshes.mesh_file(args.work_dir, kind, triangles)
+            yield f"{kind}-{synthetic_meshes.format_size(triangles)}", path
+
+
+def bench_io(args, results, scratch):
+    for name, path in mesh_inputs(args):
+        triangles = stl_io.read_triangles(path)
+        output_path = os.path.join(scratch, 'io.stl')
+        # np.array forces the memory-mapped pages in, so the read is measured rather than deferred
+        results[f"io/read_binary/{name}"] = best_of(args.repeat, lambda: np.array(stl_io.read_triangles(path)))
+        results[f"io/write_binary/{name}"] = best_of(args.repeat, lambda: stl_io.write_triangles(output_path, triangles))
+        results[f"io/load_mesh/{name}"] = best_of(args.repeat, lambda: mesh_engine.load_mesh(path))
+
+
+def bench_stages(args, results, scratch):
+    if args.engine != 'native':
+        print("Skipping the stages suite, it times the native engine in-process", file=sys.stderr)
+        return
+    for name, path in mesh_inputs(args):
+        best = {}
+        for _ in range(args.repeat):
+            result = mesh_engine.process_stl(
+                path, scratch, os.path.basename(path), **PIPELINE_PARAMS, log_callback=lambda line: None
+            )
+            for record in result['stage_profile']:
+                best[record['stage']] = min(best.get(record['stage'], float('inf')), record['wall'])
+            best['total'] = min(best.get('total', float('inf')), result['total_time'])
+        for stage, seconds in best.items():
+            results[f"stage/{stage}/{name}"] = seconds
+
+
+def bench_convert(args, results, scratch):
+    # The converter walks whole folders, so each mesh gets a folder of its own
+    from convert_meshes import convert_folder
+    for name, path in mesh_inputs(args):
+        stl_directory = os.path.join(scratch, 'stl-' + name)
+        obj_directory = os.path.join(scratch, 'obj-' + name)
+        back_directory = os.path.join(scratch, 'back-' + name)
+        os.makedirs(stl_directory, exist_ok=True)
+        shutil.copy(path, stl_directory)
+        with quiet_stdout():
+            # force, or every repeat after the first would find its output up to date
+            results[f"convert/stl_to_obj/{name}"] = best_of(
+                args.repeat, lambda: convert_folder(stl_directory, obj_directory, 'obj', force=True)
+            )
+            results[f"convert/obj_to_stl/{name}"] = best_of(
+                args.repeat, lambda: convert_folder(obj_directory, back_directory, 'stl', force=True)
+            )
+
+
+def run_batch(engine, concurrency, files, output_directory):
+    if engine == 'native':
+        # Checkpoints would let every repeat resume from the last stage
+        pool = mesh_engine.NativeEnginePool(concurrency, checkpoint_directory=None).start()
+    else:
+        pool = create_worker_pool(engine, concurrency)
+    scheduler = JobScheduler(concurrency)
+    try:
+        jobs = [
+            scheduler.submit(os.path.basename(path), lambda job, path=path: run_pipeline_job(
+                pool, engine, path, output_directory, PIPELINE_PARAMS, log_callback=lambda line: None
+            ))
+            for path in files
+        ]
+        scheduler.wait()
+    finally:
+        scheduler.shutdown()
+        pool.shutdown()
+    failed = [job.name for job in jobs if job.error is not None]
+    if failed:
+        raise RuntimeError(f"Batch benchmark jobs failed: {', '.join(failed)}")
+
+
+def bench_batch(args, results, scratch):
+    triangles = synthetic_meshes.parse_size(args.batch_size)
+    kinds = args.kinds
+    # Different seeds so no two inputs are the same file
+    files = [synthetic_meshes.mesh_file(args.work_dir, kinds[index % len(kinds)], triangles, seed=index)
+             for index in range(args.batch_files)]
+    for concurrency in args.concurrency:
+        with quiet_stdout():
+            seconds = best_of(args.repeat, lambda: run_batch(args.engine, concurrency, files, scratch))
+        results[f"batch/{args.engine}/{args.batch_files}x{synthetic_meshes.format_size(triangles)}/c{concurrency}"] = seconds
+        print(f"  {concurrency} workers: {args.batch_files / seconds * 60:.1f} files/min", flush=True)
+
+
+BENCHMARKS = {'io': bench_io, 'stages': bench_stages, 'convert': bench_convert, 'batch': bench_batch}
+
+
+def machine_info():
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=BENCHMARK_DIRECTORY, capture_output=True, text=True
+        ).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'commit': commit,
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'processor': platform.processor(),
+        'cpu_count': os.cpu_count(),
+    }
+
+
+def compare(results, baseline, threshold):
+    """Print current against baseline times; returns the names slower than `threshold` allows."""
+    regressions = []
+    print(f"{'benchmark':<55} {'baseline':>10} {'current':>10} {'change':>8}")
+    for name in sorted(set(results) & set(baseline)):
+        before, after = baseline[name], results[name]
+        change = after / before - 1 if before > 0 else 0.0
+        flag = ''
+        if change > threshold and after > NOISE_FLOOR_SECONDS:
+            regressions.append(name)
+            flag = '  REGRESSION'
+        print(f"{name:<55} {before:>10.4f} {after:>10.4f} {change:>+8.1%}{flag}")
+    missing = set(baseline) - set(results)
+    if missing:
+        print(f"{len(missing)} baseline benchmarks were not run this time")
+    return regressions
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    unknown = set(args.suites) - set(SUITES)
+    if unknown:
+        print(f"Unknown suites: {', '.join(sorted(unknown))}", file=sys.stderr)
+        return EXIT_REGRESSION
+    results = {}
+    with tempfile.TemporaryDirectory(prefix='bench-') as scratch:
+        for suite in args.suites:
+            print(f"Running the {suite} suite", flush=True)
+            BENCHMARKS[suite](args, results, scratch)
+    report = {'machine': machine_info(), 'settings': {key: value for key, value in vars(args).items()
+                                                       if key not in ('output', 'baseline')}, 'results': results}
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+    if not args.baseline:
+        for name, seconds in sorted(results.items()):
+            print(f"{name:<55} {seconds:>10.4f}")
+        return 0
+    with open(args.baseline, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)
+    regressions = compare(results, baseline['results'], args.threshold)
+    if regressions:
+        print(f"{len(regressions)} benchmarks regressed by more than {args.threshold:.0%}")
+        return EXIT_REGRESSION
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
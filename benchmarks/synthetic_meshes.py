@@ -0,0 +1,115 @@
+"""Seeded scan-like test meshes: a noisy sphere, a terrain patch and a sphere with holes."""
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'guiVersion'))
+
+import stl_io
+import vertex_weld
+
+KINDS = ('sphere', 'terrain', 'holes')
+# Radial noise of the sphere and vertical noise of the terrain, relative to their size
+DEFAULT_NOISE = 0.002
+
+
+def parse_size(text):
+    """'10k' -> 10000, '1.5M' -> 1500000."""
+    text = text.strip()
+    scale = {'k': 1e3, 'm': 1e6}.get(text[-1:].lower())
+    return int(float(text[:-1]) * scale) if scale else int(text)
+
+
+def format_size(triangles):
+    if triangles >= 1e6 and triangles % 100000 == 0:
+        return f"{triangles / 1e6:g}M"
+    if triangles >= 1e3 and triangles % 100 == 0:
+        return f"{triangles / 1e3:g}k"
+    return str(triangles)
+
+
+def _grid_faces(rows, cols, offset=0):
+    """Two triangles per cell of a rows x cols vertex grid, numbered row by row from `offset`."""
+    index = np.arange(rows * cols, dtype=np.int64).reshape(rows, cols) + offset
+    a, b = index[:-1, :-1].ravel(), index[:-1, 1:].ravel()
+    c, d = index[1:, :-1].ravel(), index[1:, 1:].ravel()
+    return np.concatenate([np.stack([a, c, b], axis=1), np.stack([b, c, d], axis=1)])
+
+
+def noisy_sphere(triangles, noise=DEFAULT_NOISE, seed=0):
+    """Unit sphere of about `triangles` triangles (12 n^2) with radial Gaussian noise."""
+    n = max(1, int(round(np.sqrt(triangles / 12))))
+    ticks = np.linspace(-1.0, 1.0, n + 1)
+    u, v = np.meshgrid(ticks, ticks, indexing='ij')
+    u, v = u.ravel(), v.ravel()
+    one = np.ones_like(u)
+    vertices, faces = [], []
+    # Each cube side is (fixed axis, sign); edge ticks are shared exactly, so welding closes the seams
+    for axis in range(3):
+        for sign in (1.0, -1.0):
+            coords = [None, None, None]
+            coords[axis] = sign * one
+            coords[(axis + 1) % 3], coords[(axis + 2) % 3] = u, v
+            side_faces = _grid_faces(n + 1, n + 1, sum(len(side) for side in vertices))
+            if sign < 0:
+                # Keep every side wound outwards
+                side_faces = side_faces[:, ::-1]
+            vertices.append(np.stack(coords, axis=1))
+            faces.append(side_faces)
+    vertices, faces = vertex_weld.weld_mesh(np.concatenate(vertices), np.concatenate(faces), tolerance=0.0)
+    vertices /= np.linalg.norm(vertices, axis=1, keepdims=True)
+    rng = np.random.default_rng(seed)
+    vertices *= 1.0 + rng.normal(0.0, noise, (len(vertices), 1))
+    return vertices, faces
+
+
+def terrain(triangles, noise=DEFAULT_NOISE, octaves=6, seed=0):
+    """Square patch of about `triangles` triangles over [0, 1]^2, with sums of random waves as relief."""
+    n = max(2, int(round(np.sqrt(triangles / 2))) + 1)
+    rng = np.random.default_rng(seed)
+    ticks = np.linspace(0.0, 1.0, n)
+    x, y = np.meshgrid(ticks, ticks, indexing='ij')
+    height = np.zeros_like(x)
+    for octave in range(octaves):
+        frequency = 2.0 ** octave
+        for _ in range(4):
+            angle, phase = rng.uniform(0, 2 * np.pi, 2)
+            wave = frequency * 2 * np.pi * (np.cos(angle) * x + np.sin(angle) * y)
+            height += 0.1 / frequency * np.sin(wave + phase)
+    height += rng.normal(0.0, noise, height.shape)
+    vertices = np.stack([x.ravel(), y.ravel(), height.ravel()], axis=1)
+    return vertices, _grid_faces(n, n)
+
+
+def with_holes(vertices, faces, holes=12, radius=0.15, seed=0):
+    """Remove the faces within `radius` (relative to the bounding box diagonal) of random surface points."""
+    rng = np.random.default_rng(seed)
+    centroids = vertices[faces].mean(axis=1)
+    diagonal = np.linalg.norm(vertices.max(axis=0) - vertices.min(axis=0))
+    keep = np.ones(len(faces), dtype=bool)
+    for center in centroids[rng.choice(len(faces), size=min(holes, len(faces)), replace=False)]:
+        keep &= np.linalg.norm(centroids - center, axis=1) > radius * diagonal / 2
+    return vertices, faces[keep]
+
+
+def generate(kind, triangles, seed=0, noise=DEFAULT_NOISE):
+    if kind == 'sphere':
+        return noisy_sphere(triangles, noise, seed)
+    if kind == 'terrain':
+        return terrain(triangles, noise, seed=seed)
+    if kind == 'holes':
+        return with_holes(*noisy_sphere(triangles, noise, seed), seed=seed)
+    raise ValueError(f"Unknown mesh kind '{kind}', expected one of {', '.join(KINDS)}")
+
+
+def mesh_file(directory, kind, triangles, seed=0):
+    """Path of a binary STL of the requested mesh in `directory`, generated the first time it is asked for."""
+    path = os.path.join(directory, f"{kind}-{format_size(triangles)}-s{seed}.stl")
+    if not os.path.exists(path):
+        os.makedirs(directory, exist_ok=True)
+        vertices, faces = generate(kind, triangles, seed)
+        temp_path = path + '.tmp'
+        stl_io.write_mesh(temp_path, vertices, faces)
+        os.replace(temp_path, path)
+    return path
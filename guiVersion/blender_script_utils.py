@@ -1,138 +1,280 @@
-import subprocess
-import threading
+import json
+
+# Lines starting with this prefix carry a JSON job result, everything else is log output
+RESULT_PREFIX = '@@RESULT '
+# Lines starting with this prefix carry a JSON stage event: {"file", "stage", "event": "start" | "end", "seconds"};
+# end events also carry the stage's profile record (see stage_profiler)
+STAGE_PREFIX = '@@STAGE '
+# Bumped whenever BLENDER_PIPELINE changes its output for the same input and parameters
+PIPELINE_VERSION = '3'
+
+# Run by the one-shot scripts after the task functions are defined. The result line
+# and the exit code are the only completion signals, nothing is written next to the scans.
+RESULT_REPORTER = r"""
+def report_result(task, *args):
+    import json
+    import traceback
+    try:
+        result = task(*args)
+        result['status'] = 'ok'
+    except Exception:
+        result = {'status': 'error', 'error': traceback.format_exc()}
+    print('@@RESULT ' + json.dumps(result), flush=True)
+    if result['status'] != 'ok':
+        sys.exit(1)
+"""
+
+
+def parse_result_line(line):
+    """Return the result dict carried by a RESULT_PREFIX line, or None for ordinary output."""
+    if not line.startswith(RESULT_PREFIX):
+        return None
+    return json.loads(line[len(RESULT_PREFIX):])
+
+
+def parse_stage_line(line):
+    """Return the event dict carried by a STAGE_PREFIX line, or None for any other output."""
+    if not line.startswith(STAGE_PREFIX):
+        return None
+    return json.loads(line[len(STAGE_PREFIX):])
+
+
+def run_script_process(command, log_callback=print, stage_callback=None, timeout=None):
+    """Run a one-shot Blender command and return its result dict once the process exits."""
+    # Imported here because the supervisor parses lines with the helpers above
+    from process_supervisor import default_supervisor
+    return default_supervisor().run(command, timeout, log_callback, stage_callback).result()
+
+# Blender-side pipeline, shared by the one-shot script and the worker pool.
+# Kept as plain source (not an f-string) so every caller passes its own values.
+BLENDER_PIPELINE = r"""
+import bpy
+import sys
+import os
+import time
+import json
+
+# Blender's copy of stage_profiler.StageRecorder; every start and end is also
+# reported as a stage event line
+class StageRecorder:
+    def __init__(self, filename):
+        self.filename = filename
+        self.records = {}
+        self.started = {}
+
+    def counts(self, obj):
+        if obj is None or obj.type != 'MESH':
+            return None, None
+        return len(obj.data.vertices), len(obj.data.polygons)
+
+    def peak_rss(self):
+        try:
+            with open('/proc/self/status') as f:
+                for line in f:
+                    if line.startswith('VmHWM:'):
+                        return int(line.split()[1]) * 1024
+        except OSError:
+            pass
+        try:
+            import resource
+        except ImportError:
+            return None
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == 'darwin' else peak * 1024
+
+    def report(self, event):
+        print('@@STAGE ' + json.dumps(dict(event, file=self.filename)), flush=True)
+
+    def start(self, stage, obj=None):
+        try:
+            with open('/proc/self/clear_refs', 'w') as f:
+                f.write('5')
+        except OSError:
+            pass
+        self.started[stage] = (time.perf_counter(), time.process_time()) + self.counts(obj)
+        self.report({'stage': stage, 'event': 'start', 'seconds': None})
+
+    def end(self, stage, obj=None):
+        wall_start, cpu_start, vertices_in, faces_in = self.started.pop(stage)
+        vertices_out, faces_out = self.counts(obj)
+        record = self.records.setdefault(stage, {
+            'stage': stage, 'wall': 0.0, 'cpu': 0.0, 'peak_rss': None,
+            'vertices_in': None, 'faces_in': None, 'vertices_out': None, 'faces_out': None,
+        })
+        record['wall'] += time.perf_counter() - wall_start
+        record['cpu'] += time.process_time() - cpu_start
+        rss = self.peak_rss()
+        if rss is not None:
+            record['peak_rss'] = max(record['peak_rss'] or 0, rss)
+        for key, value in (('vertices_in', vertices_in), ('faces_in', faces_in),
+                           ('vertices_out', vertices_out), ('faces_out', faces_out)):
+            if value is not None:
+                record[key] = (record[key] or 0) + value
+        self.report(dict(record, event='end', seconds=record['wall']))
+        return record['wall']
+
+def process_stl(
+    filepath, directory_path, filename,
+    target_polygon_count, laplacian_smooth_lambda_factor,
+    subdivision_levels, smoothing_factor, smoothing_iterations,
+    crisp_edge_bevel_width, lod_polygon_counts=()
+):
+    # Clear all mesh objects
+    bpy.ops.object.select_all(action='DESELECT')
+    bpy.ops.object.select_by_type(type='MESH')
+    bpy.ops.object.delete()
+    print("Processing file: ", filename, flush=True)
+    file_start_time = time.time()
+    stage_timings = {}
+    stages = StageRecorder(filename)
+    # Import STL file
+    stages.start('import')
+    bpy.ops.import_mesh.stl(filepath=filepath)
+
+    stage_timings['import'] = stages.end('import', bpy.context.active_object)
+    print("Time to import: ", stage_timings['import'], "seconds", flush=True)
+    # Get the current object
+    obj = bpy.context.active_object
+    input_polygons = len(obj.data.polygons)
+    print("Applying initial decimation...", flush=True)
+    stages.start('initial_decimation', obj)
+    # Decimate the model to 50k polygons
+    final_decimate_ratio = 250000 / len(obj.data.polygons)
+    bpy.ops.object.modifier_add(type='DECIMATE')
+    obj.modifiers["Decimate"].ratio = final_decimate_ratio
+    bpy.ops.object.modifier_apply(modifier="Decimate")
+    stage_timings['initial_decimation'] = stages.end('initial_decimation', obj)
+    print("Time for initial decimation: ", stage_timings['initial_decimation'], "seconds", flush=True)
+    print("Denoising the surface - Laplacian Smooth...", flush=True)
+    stages.start('laplacian_smooth', obj)
+    # Denoise the surface using Laplacian Smooth
+    bpy.ops.object.modifier_add(type='LAPLACIANSMOOTH')
+    obj.modifiers["LaplacianSmooth"].lambda_factor = 0.1
+    bpy.ops.object.modifier_apply(modifier="LaplacianSmooth")
+    stage_timings['laplacian_smooth'] = stages.end('laplacian_smooth', obj)
+    print("Time for Laplacian Smooth denoising: ", stage_timings['laplacian_smooth'], "seconds", flush=True)
+    print("Applying subdivision surface modifier...", flush=True)
+    stages.start('subdivision', obj)
+    # Dynamic subdivision (Subdivision Surface)
+    bpy.ops.object.modifier_add(type='SUBSURF')
+    obj.modifiers["Subdivision"].levels = 1 # Increase as needed
+    bpy.ops.object.modifier_apply(modifier="Subdivision")
+    stage_timings['subdivision'] = stages.end('subdivision', obj)
+    print("Time for subdivision: ", stage_timings['subdivision'], "seconds", flush=True)
+    print("Denoising the surface - Smooth...", flush=True)
+    stages.start('smooth', obj)
+    # Denoise the surface using Smooth
+    bpy.ops.object.modifier_add(type='SMOOTH')
+    obj.modifiers["Smooth"].factor = .5
+    obj.modifiers["Smooth"].iterations = 2
+    bpy.ops.object.modifier_apply(modifier="Smooth")
+    stage_timings['smooth'] = stages.end('smooth', obj)
+    print("Time for denoising - Smooth: ", stage_timings['smooth'], "seconds", flush=True)
+
+    print("Making edges crisp...", flush=True)
+    stages.start('bevel', obj)
+    # Make edges more crisp
+    bpy.ops.object.modifier_add(type='BEVEL')
+    obj.modifiers["Bevel"].width = 0.01
+    bpy.ops.object.modifier_apply(modifier="Bevel")
+    stage_timings['bevel'] = stages.end('bevel', obj)
+    print("Time for making edges crisp: ", stage_timings['bevel'], "seconds", flush=True)
+    print("Removing doubles and filling holes...", flush=True)
+    stages.start('cleanup', obj)
+    # Clean up the mesh
+    bpy.ops.object.mode_set(mode = 'EDIT')
+    bpy.ops.mesh.remove_doubles()
+    bpy.ops.mesh.fill_holes()
+    bpy.ops.object.mode_set(mode = 'OBJECT')
+    stage_timings['cleanup'] = stages.end('cleanup', obj)
+    print("Time for cleaning up the mesh: ", stage_timings['cleanup'], "seconds", flush=True)
+    print("Exporting the processed STL...", flush=True)
+    # The first output is decimated to the target and every LOD from the output before it,
+    # so the smoothed mesh is only built once
+    targets = [target_polygon_count] + sorted(lod_polygon_counts, reverse=True)
+    if len(targets) == 1:
+        output_names = ["processed_" + filename]
+    else:
+        stem = os.path.splitext(filename)[0]
+        output_names = ["processed_%s_%d.stl" % (stem, target) for target in targets]
+    outputs = []
+    for index, (target, output_name) in enumerate(zip(targets, output_names)):
+        stage = 'final_decimation' if index == 0 else 'lod_decimation'
+        if target < len(obj.data.polygons):
+            stages.start(stage, obj)
+            bpy.ops.object.modifier_add(type='DECIMATE')
+            obj.modifiers["Decimate"].ratio = target / len(obj.data.polygons)
+            bpy.ops.object.modifier_apply(modifier="Decimate")
+            stage_timings[stage] = stages.end(stage, obj)
+            print("Time for", stage.replace('_', ' '), "to", target, "polygons: ", stage_timings[stage], "seconds", flush=True)
+        elif index == 0:
+            print("The mesh has", len(obj.data.polygons), "polygons, no more than the target of", target,
+                  "- exporting it without final decimation", flush=True)
+        else:
+            # Exporting it would label a larger mesh with this LOD's count
+            print("Skipping the", target, "polygon LOD, the mesh already has only", len(obj.data.polygons),
+                  "polygons", flush=True)
+            continue
+        stages.start('export', obj)
+        # Export the processed STL
+        output_path = os.path.join(directory_path, output_name)
+        bpy.ops.export_mesh.stl(filepath=output_path)
+        stage_timings['export'] = stages.end('export', obj)
+        over_target = len(obj.data.polygons) > target
+        if over_target:
+            print("Warning:", output_name, "has", len(obj.data.polygons), "polygons, over the target of", target,
+                  flush=True)
+        outputs.append({'target': target, 'output_path': output_path, 'output_polygons': len(obj.data.polygons),
+                        'over_target': over_target})
+    print("Time for exporting: ", stage_timings['export'], "seconds", flush=True)
+    print("Time for processing: ", time.time() - file_start_time, "seconds", flush=True)
+    print("Done processing ", filename, "\n", flush=True)
+    return {
+        'output_path': outputs[0]['output_path'],
+        'input_polygons': input_polygons,
+        'output_polygons': outputs[0]['output_polygons'],
+        'outputs': outputs,
+        'targets': targets,
+        'stage_timings': stage_timings,
+        'stage_profile': list(stages.records.values()),
+        'total_time': time.time() - file_start_time,
+    }
+"""
 
 def generate_blender_script(
     filepath, directory_path, filename, 
     target_polygon_count, laplacian_smooth_lambda_factor, 
     subdivision_levels, smoothing_factor, smoothing_iterations, 
-    crisp_edge_bevel_width 
+    crisp_edge_bevel_width, lod_polygon_counts=()
 ):
-    # Replace file paths for safety...
-    safe_filepath = filepath.replace('\\', '\\\\')
-    safe_directory_path = directory_path.replace('\\', '\\\\')
     # The script content for Blender...
-    blender_script = f"""
-import bpy
-import sys
-import os
-import time
-
-target_polygon_count = {target_polygon_count}
-laplacian_smooth_lambda_factor = {laplacian_smooth_lambda_factor}
-subdivision_levels = {subdivision_levels}
-smoothing_factor = {smoothing_factor}
-smoothing_iterations = {smoothing_iterations}
-crisp_edge_bevel_width = {crisp_edge_bevel_width}
-# Clear all mesh objects
-bpy.ops.object.select_all(action='DESELECT')
-bpy.ops.object.select_by_type(type='MESH')
-bpy.ops.object.delete()
-print("Processing file: ", "{filename}", flush=True)
-file_start_time = time.time()
-# Import STL file
-start_time = time.time()
-bpy.ops.import_mesh.stl(filepath=r"{safe_filepath}")
-
-print("Time to import: ", time.time() - start_time, "seconds", flush=True)
-# Get the current object
-obj = bpy.context.active_object
-print("Applying initial decimation...", flush=True)
-start_time = time.time() 
-# Decimate the model to 50k polygons
-final_decimate_ratio = 250000 / len(obj.data.polygons)
-bpy.ops.object.modifier_add(type='DECIMATE')
-obj.modifiers["Decimate"].ratio = final_decimate_ratio
-bpy.ops.object.modifier_apply(modifier="Decimate")
-print("Time for initial decimation: ", time.time() - start_time, "seconds", flush=True)
-print("Denoising the surface - Laplacian Smooth...", flush=True)
-start_time = time.time()
-# Denoise the surface using Laplacian Smooth
-bpy.ops.object.modifier_add(type='LAPLACIANSMOOTH')
-obj.modifiers["LaplacianSmooth"].lambda_factor = 0.1
-bpy.ops.object.modifier_apply(modifier="LaplacianSmooth")
-print("Time for Laplacian Smooth denoising: ", time.time() - start_time, "seconds", flush=True)
-print("Applying subdivision surface modifier...", flush=True)
-start_time = time.time()
-# Dynamic subdivision (Subdivision Surface)
-bpy.ops.object.modifier_add(type='SUBSURF')
-obj.modifiers["Subdivision"].levels = 1 # Increase as needed
-bpy.ops.object.modifier_apply(modifier="Subdivision")
-print("Time for subdivision: ", time.time() - start_time, "seconds", flush=True)
-print("Denoising the surface - Smooth...", flush=True)
-start_time = time.time()
-# Denoise the surface using Smooth
-bpy.ops.object.modifier_add(type='SMOOTH')
-obj.modifiers["Smooth"].factor = .5
-obj.modifiers["Smooth"].iterations = 2
-bpy.ops.object.modifier_apply(modifier="Smooth")
-print("Time for denoising - Smooth: ", time.time() - start_time, "seconds", flush=True)
-
-print("Making edges crisp...", flush=True)
-start_time = time.time()
-# Make edges more crisp
-bpy.ops.object.modifier_add(type='BEVEL')
-obj.modifiers["Bevel"].width = 0.01
-bpy.ops.object.modifier_apply(modifier="Bevel")
-print("Time for making edges crisp: ", time.time() - start_time, "seconds", flush=True)
-print("Removing doubles and filling holes...", flush=True)
-start_time = time.time()
-# Clean up the mesh
-bpy.ops.object.mode_set(mode = 'EDIT')
-bpy.ops.mesh.remove_doubles()
-bpy.ops.mesh.fill_holes()
-bpy.ops.object.mode_set(mode = 'OBJECT')
-print("Time for cleaning up the mesh: ", time.time() - start_time, "seconds", flush=True)
-print("Applying final decimation...", flush=True)
-start_time = time.time() 
-# Decimate the model to 50k polygons
-final_decimate_ratio = 250000 / len(obj.data.polygons)
-bpy.ops.object.modifier_add(type='DECIMATE')
-obj.modifiers["Decimate"].ratio = final_decimate_ratio
-bpy.ops.object.modifier_apply(modifier="Decimate")
-print("Time for final decimation: ", time.time() - start_time, "seconds", flush=True)
-print("Exporting the processed STL...", flush=True)
-start_time = time.time()
-# Export the processed STL
-bpy.ops.export_mesh.stl(filepath=os.path.join("{safe_directory_path}", "processed_" + "{filename}"))
-print("Time for exporting: ", time.time() - start_time, "seconds", flush=True)
-print("Time for processing: ", time.time() - file_start_time, "seconds", flush=True)
-print("Done processing ", "{filename}", "\\n", flush=True)
-# Write a '.done' file to indicate processing completion
-done_file_path = os.path.join(r"{safe_directory_path}", "{filename}.done")
-with open(done_file_path, 'w') as done_file:
-    done_file.write('done')
-   """
+    blender_script = BLENDER_PIPELINE + RESULT_REPORTER + f"""
+report_result(
+    process_stl,
+    {filepath!r}, {directory_path!r}, {filename!r},
+    {target_polygon_count!r}, {laplacian_smooth_lambda_factor!r},
+    {subdivision_levels!r}, {smoothing_factor!r}, {smoothing_iterations!r},
+    {crisp_edge_bevel_width!r}, {list(lod_polygon_counts)!r}
+)
+"""
     return blender_script
 
 def run_blender_script(
     filepath, directory_path, filename,
     target_polygon_count, laplacian_smooth_lambda_factor,
     subdivision_levels, smoothing_factor, smoothing_iterations,
-    crisp_edge_bevel_width, update_status_callback
+    crisp_edge_bevel_width, lod_polygon_counts=(), update_status_callback=None
 ):
     blender_script = generate_blender_script(
         filepath, directory_path, filename, 
         target_polygon_count, laplacian_smooth_lambda_factor, 
         subdivision_levels, smoothing_factor, smoothing_iterations, 
-        crisp_edge_bevel_width
+        crisp_edge_bevel_width, lod_polygon_counts
     )
 
-    def run_script():
-        command = ['blender', '--background', '--python-expr', blender_script]
-        process = subprocess.Popen(
-            command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True
-        )
-        while True:
-            output = process.stdout.readline()
-            if output == '' and process.poll() is not None:
-                if process.returncode == 0:
-                    update_status_callback(filename, "Complete")
-                else:
-                    update_status_callback(filename, "Error", "red")
-                break
-            if output:
-                print(output.strip())
-                # Use callback for UI updates instead of direct interaction
-
-    thread = threading.Thread(target=run_script)
-    thread.start()
+    # --python-exit-code makes an exception in the script fail the process
+    command = ['blender', '--background', '--python-exit-code', '1', '--python-expr', blender_script]
+    result = run_script_process(command)
+    if update_status_callback is not None:
+        update_status_callback(filename, "Complete" if result['status'] == 'ok' else "Error")
+    return result
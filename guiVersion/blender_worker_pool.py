@@ -0,0 +1,128 @@
+import asyncio
+from concurrent.futures import Future
+
+from blender_script_utils import BLENDER_PIPELINE
+from process_supervisor import JobTimeoutError, WorkerCrashedError, default_supervisor
+from render_stl import BLENDER_RENDER
+
+# Job loop run inside each long-lived Blender. Jobs arrive as one JSON object per
+# line on stdin: {"id": ..., "task": "process" | "render" | "render_batch", "args": {...}}.
+WORKER_LOOP = r"""
+import json
+import traceback
+
+TASKS = {'process': process_stl, 'render': render_stl, 'render_batch': render_batch}
+
+def reset_scene():
+    # Leave the file as if Blender had just started
+    if bpy.context.object is not None and bpy.context.object.mode != 'OBJECT':
+        bpy.ops.object.mode_set(mode='OBJECT')
+    bpy.ops.object.select_all(action='SELECT')
+    bpy.ops.object.delete()
+    for collection in (bpy.data.meshes, bpy.data.materials, bpy.data.cameras, bpy.data.lights):
+        for block in list(collection):
+            if block.users == 0:
+                collection.remove(block)
+
+for line in sys.stdin:
+    if not line.strip():
+        continue
+    job = json.loads(line)
+    if job.get('task') == 'shutdown':
+        break
+    try:
+        result = TASKS[job['task']](**job['args'])
+        result['status'] = 'ok'
+    except Exception:
+        result = {'status': 'error', 'error': traceback.format_exc()}
+    result['id'] = job['id']
+    try:
+        reset_scene()
+    except Exception:
+        pass
+    print('@@RESULT ' + json.dumps(result), flush=True)
+"""
+
+WORKER_SCRIPT = BLENDER_PIPELINE + BLENDER_RENDER + WORKER_LOOP
+
+
+def default_worker_command(blender_executable='blender'):
+    return [blender_executable, '--background', '--python-expr', WORKER_SCRIPT]
+
+
+class BlenderWorkerPool:
+    """A fixed number of headless Blender processes that stay alive between jobs."""
+
+    def __init__(self, size=1, worker_command=None, output_callback=None, stage_callback=None,
+                 job_timeout=None, supervisor=None):
+        self.size = size
+        self.worker_command = worker_command or default_worker_command()
+        self.output_callback = output_callback or print
+        self.stage_callback = stage_callback
+        self.job_timeout = job_timeout
+        self.supervisor = supervisor or default_supervisor()
+        self._jobs = None
+        self._workers = []
+
+    def start(self):
+        self._jobs = self.supervisor.submit(self._make_queue()).result()
+        self._workers = [self.supervisor.submit(self._worker_loop()) for _ in range(self.size)]
+        return self
+
+    async def _make_queue(self):
+        # Created on the loop so it belongs to the supervisor thread
+        return asyncio.Queue()
+
+    def submit(self, task, **args):
+        """Queue a job and return a Future resolving to the worker's result dict."""
+        if not self._workers:
+            self.start()
+        future = Future()
+        self.supervisor.call_soon(self._jobs.put_nowait, (task, args, future))
+        return future
+
+    def shutdown(self, wait=True):
+        for _ in self._workers:
+            self.supervisor.call_soon(self._jobs.put_nowait, None)
+        if wait:
+            for worker in self._workers:
+                worker.result()
+        self._workers = []
+
+    def logs(self, job_id):
+        return self.supervisor.logs(job_id)
+
+    async def _worker_loop(self):
+        worker = None
+        while True:
+            item = await self._jobs.get()
+            if item is None:
+                break
+            task, args, future = item
+            if not future.set_running_or_notify_cancel():
+                continue
+            job_id = self.supervisor.new_job_id()
+            try:
+                if worker is None or worker.returncode is not None:
+                    worker = await self.supervisor.spawn(self.worker_command, self.output_callback, self.stage_callback)
+                result = await asyncio.wait_for(
+                    worker.request(job_id, {'id': job_id, 'task': task, 'args': args}), self.job_timeout
+                )
+            except asyncio.TimeoutError:
+                # A hung Blender never answers again; kill it and start fresh for the next job
+                await worker.kill()
+                worker = None
+                future.set_exception(JobTimeoutError(
+                    f"Job {job_id} ({task}) ran longer than {self.job_timeout} seconds and its worker was killed"
+                ))
+                continue
+            except (OSError, ValueError, WorkerCrashedError) as e:
+                # The worker is gone or unusable, a fresh one is started for the next job
+                if worker is not None:
+                    await worker.kill()
+                worker = None
+                future.set_exception(e if isinstance(e, WorkerCrashedError) else WorkerCrashedError(str(e)))
+                continue
+            future.set_result(result)
+        if worker is not None:
+            await worker.stop()
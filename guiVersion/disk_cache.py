@@ -0,0 +1,100 @@
+import os
+import shutil
+import tempfile
+import threading
+
+
+class DiskCache:
+    """Files stored under string keys in one directory, least recently used evicted over `max_bytes`."""
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, key):
+        return os.path.join(self.directory, key)
+
+    def get(self, key):
+        """Path of the entry for `key`, or None when it is not cached."""
+        path = self.path(key)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    def put(self, key, source_path):
+        """Copy `source_path` into the cache under `key` and return the stored path."""
+        handle, temp_path = tempfile.mkstemp(dir=self.directory, prefix='.incoming-')
+        os.close(handle)
+        try:
+            shutil.copyfile(source_path, temp_path)
+            # Readers only ever see complete entries
+            os.replace(temp_path, self.path(key))
+        except BaseException:
+            os.remove(temp_path)
+            raise
+        self.evict()
+        return self.path(key)
+
+    def put_bytes(self, key, data):
+        handle, temp_path = tempfile.mkstemp(dir=self.directory, prefix='.incoming-')
+        try:
+            with os.fdopen(handle, 'wb') as f:
+                f.write(data)
+            os.replace(temp_path, self.path(key))
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        self.evict()
+        return self.path(key)
+
+    def get_bytes(self, key):
+        path = self.get(key)
+        if path is None:
+            return None
+        try:
+            with open(path, 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            # Evicted by another process between the lookup and the read
+            return None
+
+    def entries(self):
+        """(mtime, size, path) of every complete entry, oldest first."""
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.startswith('.incoming-') or not entry.is_file():
+                continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+        return sorted(entries)
+
+    def size(self):
+        return sum(size for _, size, _ in self.entries())
+
+    def evict(self):
+        with self._lock:
+            entries = self.entries()
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in entries:
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                total -= size
+
+    def clear(self):
+        for _, _, path in self.entries():
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
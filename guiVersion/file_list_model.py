@@ -0,0 +1,134 @@
+from PyQt5.QtCore import QAbstractListModel, QModelIndex, Qt, QTimer
+
+# Status and metadata changes are repainted together at most this often
+REFRESH_INTERVAL_MS = 100
+
+
+class FileListModel(QAbstractListModel):
+    """STL files of the working directory with their metadata and status, repainted in batches."""
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.filenames = []
+        self.rows = {}
+        self.checked = set()
+        # Per file name: metadata from the index and the last job status
+        self.info = {}
+        self.status = {}
+        self._dirty_rows = set()
+        self._refresh_timer = QTimer(self)
+        self._refresh_timer.setSingleShot(True)
+        self._refresh_timer.setInterval(REFRESH_INTERVAL_MS)
+        self._refresh_timer.timeout.connect(self.flush)
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.filenames)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        filename = self.filenames[index.row()]
+        if role == Qt.DisplayRole:
+            return self.item_text(filename)
+        if role == Qt.CheckStateRole:
+            return Qt.Checked if filename in self.checked else Qt.Unchecked
+        if role == Qt.UserRole:
+            return filename
+        return None
+
+    def setData(self, index, value, role=Qt.EditRole):
+        if role != Qt.CheckStateRole or not index.isValid():
+            return False
+        filename = self.filenames[index.row()]
+        if value == Qt.Checked:
+            self.checked.add(filename)
+        else:
+            self.checked.discard(filename)
+        self.dataChanged.emit(index, index, [Qt.CheckStateRole])
+        return True
+
+    def flags(self, index):
+        if not index.isValid():
+            return Qt.NoItemFlags
+        return Qt.ItemIsEnabled | Qt.ItemIsSelectable | Qt.ItemIsUserCheckable
+
+    def item_text(self, filename):
+        text = filename
+        info = self.info.get(filename)
+        if info is not None:
+            text += f"  [{info['triangles']:,} tris"
+            if info['bbox_min'] is not None:
+                extent = [high - low for low, high in zip(info['bbox_min'], info['bbox_max'])]
+                text += ", " + " x ".join(f"{length:.1f}" for length in extent)
+            text += "]"
+        if filename in self.status:
+            text += f" - {self.status[filename]}"
+        return text
+
+    def set_files(self, filenames):
+        """Show `filenames`, all checked, dropping the rows, metadata and statuses of the previous directory."""
+        self.beginResetModel()
+        self.filenames = list(filenames)
+        self.checked = set(self.filenames)
+        self.info.clear()
+        self.status.clear()
+        self._dirty_rows.clear()
+        self._rebuild_rows()
+        self.endResetModel()
+
+    def clear(self):
+        self.set_files([])
+
+    def remove_checked(self):
+        self.beginResetModel()
+        self.filenames = [filename for filename in self.filenames if filename not in self.checked]
+        self.checked.clear()
+        self._dirty_rows.clear()
+        self._rebuild_rows()
+        self.endResetModel()
+
+    def set_all_checked(self, checked):
+        self.checked = set(self.filenames) if checked else set()
+        if self.filenames:
+            self.dataChanged.emit(self.index(0), self.index(len(self.filenames) - 1), [Qt.CheckStateRole])
+
+    def checked_files(self):
+        return [filename for filename in self.filenames if filename in self.checked]
+
+    def sort_by(self, key, reverse=False):
+        """Reorder the rows by key(filename); selection and the current row follow their files."""
+        self.layoutAboutToBeChanged.emit()
+        persistent = self.persistentIndexList()
+        persistent_names = [self.filenames[index.row()] for index in persistent]
+        self.filenames.sort(key=key, reverse=reverse)
+        self._rebuild_rows()
+        self.changePersistentIndexList(persistent, [self.index(self.rows[name]) for name in persistent_names])
+        self.layoutChanged.emit()
+
+    def set_status(self, filename, status):
+        self.status[filename] = status
+        self._mark_dirty(filename)
+
+    def set_info(self, filename, info):
+        self.info[filename] = info
+        self._mark_dirty(filename)
+
+    def flush(self):
+        """Repaint the rows changed since the last flush in one go."""
+        if not self._dirty_rows:
+            return
+        first, last = min(self._dirty_rows), max(self._dirty_rows)
+        self._dirty_rows.clear()
+        self.dataChanged.emit(self.index(first), self.index(last), [Qt.DisplayRole])
+
+    def _mark_dirty(self, filename):
+        row = self.rows.get(filename)
+        # Statuses of scheduler jobs that are not files (render batches) have no row
+        if row is None:
+            return
+        self._dirty_rows.add(row)
+        if not self._refresh_timer.isActive():
+            self._refresh_timer.start()
+
+    def _rebuild_rows(self):
+        self.rows = {filename: row for row, filename in enumerate(self.filenames)}
@@ -0,0 +1,100 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+# Job states, in the order a job normally goes through them
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+
+def job_key(filepath, settings):
+    """
+    Journal id of processing `filepath` with `settings` (the parameters, engine and output
+    directory), so a rerun with other settings is a new job rather than one already done.
+    """
+    digest = hashlib.blake2b(json.dumps(settings, sort_keys=True).encode(), digest_size=10).hexdigest()
+    return f"{filepath}@{digest}"
+
+
+class JobJournal:
+    """Append-only, fsync'd JSON-lines record of job states; reopening it replays the batch so far."""
+
+    def __init__(self, path):
+        self.path = path
+        self.jobs = {}
+        self._lock = threading.Lock()
+        self._replay()
+        self._file = open(path, 'a', encoding='utf-8')
+        if self._needs_newline:
+            # The previous run died halfway through a line
+            self._file.write('\n')
+
+    def _replay(self):
+        self._needs_newline = False
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, 'r', encoding='utf-8') as f:
+            lines = f.read().split('\n')
+        self._needs_newline = lines[-1] != ''
+        for line in lines:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                # Blank or torn lines from an interrupted write carry no state
+                continue
+            self._apply(entry)
+
+    def _apply(self, entry):
+        job = self.jobs.setdefault(entry['job'], {'state': None, 'failures': 0, 'error': None})
+        job['state'] = entry['state']
+        if entry['state'] == FAILED:
+            job['failures'] += 1
+            job['error'] = entry.get('error')
+
+    def record(self, job_id, state, **details):
+        entry = {'time': time.time(), 'job': job_id, 'state': state, **details}
+        with self._lock:
+            if self._file.closed:
+                # Jobs still winding down after an interrupt stay 'running' and are reclaimed next time
+                return
+            self._file.write(json.dumps(entry) + '\n')
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._apply(entry)
+
+    def plan(self, job_ids, max_attempts):
+        """Split `job_ids` into 'run', 'done', 'exhausted' and 'reclaimed' (running when the last run stopped)."""
+        plan = {'run': [], 'done': [], 'exhausted': [], 'reclaimed': []}
+        for job_id in job_ids:
+            job = self.jobs.get(job_id)
+            state = job['state'] if job else None
+            if state == DONE:
+                plan['done'].append(job_id)
+            elif state == FAILED and job['failures'] >= max_attempts:
+                plan['exhausted'].append(job_id)
+            else:
+                if state == RUNNING:
+                    plan['reclaimed'].append(job_id)
+                plan['run'].append(job_id)
+        return plan
+
+    def journaled(self, job_id, run):
+        """Wrap a scheduler `run(job)` callable so each attempt is recorded as running, then done or failed."""
+        def run_journaled(job):
+            self.record(job_id, RUNNING)
+            try:
+                result = run(job)
+            except Exception as e:
+                self.record(job_id, FAILED, error=str(e))
+                raise
+            self.record(job_id, DONE, outputs=[output['output_path'] for output in result.get('outputs', [])])
+            return result
+        return run_journaled
+
+    def close(self):
+        with self._lock:
+            self._file.close()
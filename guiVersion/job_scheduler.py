@@ -0,0 +1,190 @@
+import heapq
+import itertools
+import os
+import struct
+import threading
+import time
+
+# Status strings are the ones shown next to each file in the GUI list
+PENDING = "Pending"
+PROCESSING = "Processing"
+RETRYING = "Retrying"
+COMPLETE = "Complete"
+ERROR = "Error"
+CANCELLED = "Cancelled"
+
+
+def estimate_job_cost(filepath):
+    """
+    Rough relative cost of processing an STL, used to start the biggest files first.
+    Binary STLs report their triangle count in the header, anything else falls back to file size.
+    """
+    try:
+        size = os.path.getsize(filepath)
+        with open(filepath, 'rb') as f:
+            header = f.read(84)
+    except OSError:
+        return 0
+    if len(header) == 84:
+        triangle_count = struct.unpack('<I', header[80:84])[0]
+        if 84 + 50 * triangle_count == size:
+            return triangle_count
+    # ASCII STL spends roughly 250 bytes per facet
+    return size // 250
+
+
+class Job:
+    def __init__(self, name, run, cost=0, memory=0):
+        self.name = name
+        self.run = run
+        self.cost = cost
+        self.memory = memory
+        self.status = PENDING
+        self.attempts = 0
+        self.result = None
+        self.error = None
+        self.cancelled = False
+        self.done = threading.Event()
+
+
+class JobScheduler:
+    """
+    Runs jobs on a bounded number of threads, most expensive first, retrying failures `max_retries` times.
+    With a `memory_budget`, jobs only start while the running ones' estimated memory fits in it.
+    """
+
+    def __init__(self, max_workers=1, max_retries=0, status_callback=None, memory_budget=None):
+        self.max_workers = max_workers
+        self.max_retries = max_retries
+        self.status_callback = status_callback
+        self.memory_budget = memory_budget
+        self.memory_in_use = 0
+        self._queue = []
+        self._order = itertools.count()
+        self._jobs = []
+        self._condition = threading.Condition()
+        self._threads = []
+        self._closed = False
+
+    def submit(self, name, run, cost=0, memory=0):
+        job = Job(name, run, cost, memory)
+        with self._condition:
+            self._jobs.append(job)
+            self._push(job)
+            if len(self._threads) < self.max_workers:
+                thread = threading.Thread(target=self._worker_loop, daemon=True)
+                self._threads.append(thread)
+                thread.start()
+            self._condition.notify()
+        self._set_status(job, PENDING)
+        return job
+
+    def cancel(self, job=None):
+        """Cancel one job, or every job that has not finished yet when no job is given."""
+        with self._condition:
+            targets = [job] if job is not None else list(self._jobs)
+            for target in targets:
+                if not target.done.is_set():
+                    # Running jobs can watch `job.cancelled`; their result is discarded either way
+                    target.cancelled = True
+            still_queued = [entry for entry in self._queue if not entry[2].cancelled]
+            dropped = [entry[2] for entry in self._queue if entry[2].cancelled]
+            self._queue = still_queued
+            heapq.heapify(self._queue)
+        for target in dropped:
+            self._finish(target, CANCELLED)
+
+    def wait(self, timeout=None):
+        """Block until every submitted job has finished; returns False when `timeout` seconds pass first."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for job in list(self._jobs):
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            if not job.done.wait(remaining):
+                return False
+        return True
+
+    def shutdown(self, wait=True):
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        if wait:
+            for thread in self._threads:
+                thread.join()
+
+    @property
+    def jobs(self):
+        return list(self._jobs)
+
+    def _push(self, job):
+        # heapq is a min-heap, so the cost is negated for longest-job-first
+        heapq.heappush(self._queue, (-job.cost, next(self._order), job))
+
+    def _admit(self):
+        """Take the most expensive queued job that fits in the memory left, or None."""
+        if self.memory_budget is None:
+            job = heapq.heappop(self._queue)[2]
+            self.memory_in_use += job.memory
+            return job
+        for index, entry in enumerate(sorted(self._queue)):
+            job = entry[2]
+            if self.memory_in_use == 0 or self.memory_in_use + job.memory <= self.memory_budget:
+                self._queue.remove(entry)
+                heapq.heapify(self._queue)
+                self.memory_in_use += job.memory
+                return job
+            if index == 0 and job.memory > self.memory_budget:
+                # Letting smaller jobs past it would keep the memory in use and hold it back
+                # until the whole batch is done; instead the running jobs drain and it goes next
+                return None
+        return None
+
+    def _release(self, job):
+        with self._condition:
+            self.memory_in_use -= job.memory
+            self._condition.notify_all()
+
+    def _next_job(self):
+        with self._condition:
+            while True:
+                if not self._queue and self._closed:
+                    return None
+                job = self._admit() if self._queue else None
+                if job is not None:
+                    return job
+                self._condition.wait()
+
+    def _worker_loop(self):
+        while True:
+            job = self._next_job()
+            if job is None:
+                return
+            job.attempts += 1
+            self._set_status(job, PROCESSING)
+            try:
+                job.result = job.run(job)
+            except Exception as e:
+                job.error = e
+                self._release(job)
+                if job.cancelled:
+                    self._finish(job, CANCELLED)
+                elif job.attempts <= self.max_retries:
+                    self._set_status(job, RETRYING)
+                    with self._condition:
+                        self._push(job)
+                        self._condition.notify()
+                else:
+                    self._finish(job, ERROR)
+                continue
+            # An earlier attempt may have failed
+            job.error = None
+            self._release(job)
+            self._finish(job, CANCELLED if job.cancelled else COMPLETE)
+
+    def _finish(self, job, status):
+        self._set_status(job, status)
+        job.done.set()
+
+    def _set_status(self, job, status):
+        job.status = status
+        if self.status_callback is not None:
+            self.status_callback(job, status)
@@ -0,0 +1,41 @@
+from collections import deque
+
+from PyQt5.QtCore import QTimer
+from PyQt5.QtWidgets import QPlainTextEdit
+
+# Lines kept in the view; older ones scroll out for good
+MAX_LOG_LINES = 5000
+# Lines queued since the last flush are appended together at most this often
+FLUSH_INTERVAL_MS = 100
+
+
+class LogView(QPlainTextEdit):
+    """Read-only console that appends queued lines in batches and keeps at most MAX_LOG_LINES."""
+
+    def __init__(self, parent=None, max_lines=MAX_LOG_LINES):
+        super().__init__(parent)
+        self.setReadOnly(True)
+        self.setMaximumBlockCount(max_lines)
+        self._pending = deque(maxlen=max_lines)
+        self._dropped = 0
+        self._flush_timer = QTimer(self)
+        self._flush_timer.setSingleShot(True)
+        self._flush_timer.setInterval(FLUSH_INTERVAL_MS)
+        self._flush_timer.timeout.connect(self.flush)
+
+    def append(self, text):
+        if len(self._pending) == self._pending.maxlen:
+            self._dropped += 1
+        self._pending.append(text)
+        if not self._flush_timer.isActive():
+            self._flush_timer.start()
+
+    def flush(self):
+        if not self._pending:
+            return
+        lines = list(self._pending)
+        self._pending.clear()
+        if self._dropped:
+            lines.insert(0, f"... {self._dropped} lines skipped")
+            self._dropped = 0
+        self.appendPlainText("\n".join(lines))
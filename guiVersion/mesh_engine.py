@@ -0,0 +1,333 @@
+import hashlib
+import json
+import multiprocessing
+import os
+import struct
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import trimesh
+
+from disk_cache import DiskCache
+from processing_backends import output_filenames
+from result_cache import hash_file
+import mesh_smoothing
+import mesh_subdivision
+import qem_decimate
+import stl_io
+import vertex_weld
+from stage_profiler import StageRecorder
+
+# Bumped whenever a stage changes its output for the same input and parameters
+ENGINE_VERSION = '9'
+# Stage outputs kept so a re-run with changed late-stage parameters resumes mid-pipeline
+CHECKPOINT_DIRECTORY = os.path.join(os.path.expanduser('~'), '.cache', 'ModelEnhancer', 'checkpoints')
+CHECKPOINT_MAX_BYTES = 10 * 1024 ** 3
+# Peak memory a single subdivision stage may forecast before its level is capped
+SUBDIVISION_MEMORY_BUDGET = mesh_subdivision.DEFAULT_MEMORY_BUDGET
+# Scans whose in-core working set would exceed this are processed in tiles by tiled_processing
+MEMORY_BUDGET = 8 * 1024 ** 3
+
+# Blender's Bevel modifier only touches edges sharper than this by default
+BEVEL_ANGLE_LIMIT = np.radians(30)
+
+
+def decimate(mesh, target_polygon_count):
+    if len(mesh.faces) <= target_polygon_count:
+        return mesh
+    vertices, faces = qem_decimate.decimate(mesh.vertices, mesh.faces, target_polygon_count)
+    return trimesh.Trimesh(vertices, faces, process=False)
+
+
+def laplacian_smooth(mesh, laplacian_smooth_lambda_factor):
+    # One cotangent-weighted pass, like the LaplacianSmooth modifier with its default repeat count
+    mesh.vertices = mesh_smoothing.laplacian_smooth(
+        mesh.vertices, mesh.faces, laplacian_smooth_lambda_factor, weights='cotangent'
+    )
+    return mesh
+
+
+def subdivide(mesh, subdivision_levels, memory_budget=None, log_callback=print):
+    if subdivision_levels <= 0:
+        return mesh
+    vertices, faces = mesh_subdivision.subdivide(
+        mesh.vertices, mesh.faces, subdivision_levels,
+        memory_budget=SUBDIVISION_MEMORY_BUDGET if memory_budget is None else memory_budget,
+        on_over_budget='cap', log_callback=log_callback
+    )
+    return trimesh.Trimesh(vertices, faces, process=False)
+
+
+def smooth(mesh, smoothing_factor, smoothing_iterations):
+    # The Smooth modifier moves each vertex towards the plain average of its neighbours
+    mesh.vertices = mesh_smoothing.laplacian_smooth(
+        mesh.vertices, mesh.faces, smoothing_factor, smoothing_iterations, weights='uniform'
+    )
+    return mesh
+
+
+def bevel(mesh, crisp_edge_bevel_width):
+    """Round off edges sharper than BEVEL_ANGLE_LIMIT by pulling their vertices in, at most `crisp_edge_bevel_width`."""
+    if crisp_edge_bevel_width <= 0 or len(mesh.face_adjacency) == 0:
+        return mesh
+    sharp_edges = mesh.face_adjacency_edges[mesh.face_adjacency_angles > BEVEL_ANGLE_LIMIT]
+    if len(sharp_edges) == 0:
+        return mesh
+    sharp_vertices = np.unique(sharp_edges)
+    operator = mesh_smoothing.laplacian_matrix(mesh.vertices, mesh.faces, 'uniform')
+    vertices = mesh.vertices.copy()
+    offset = (operator @ vertices)[sharp_vertices] - vertices[sharp_vertices]
+    length = np.linalg.norm(offset, axis=1)
+    scale = np.minimum(1.0, crisp_edge_bevel_width / np.maximum(length, 1e-12))
+    vertices[sharp_vertices] += offset * scale[:, None]
+    mesh.vertices = vertices
+    return mesh
+
+
+def clean_up(mesh):
+    # Equivalent of remove_doubles + fill_holes in edit mode
+    vertices, faces = vertex_weld.weld_mesh(mesh.vertices, mesh.faces)
+    mesh = trimesh.Trimesh(vertices, faces, process=False)
+    mesh.remove_unreferenced_vertices()
+    trimesh.repair.fill_holes(mesh)
+    return mesh
+
+
+# Same order as the Blender pipeline in blender_script_utils.BLENDER_PIPELINE.
+# Each entry is (stage name, function, names of the parameters it takes).
+PIPELINE_STAGES = [
+    ('initial_decimation', decimate, ('target_polygon_count',)),
+    ('laplacian_smooth', laplacian_smooth, ('laplacian_smooth_lambda_factor',)),
+    ('subdivision', subdivide, ('subdivision_levels',)),
+    ('smooth', smooth, ('smoothing_factor', 'smoothing_iterations')),
+    ('bevel', bevel, ('crisp_edge_bevel_width',)),
+    ('cleanup', clean_up, ()),
+    ('final_decimation', decimate, ('target_polygon_count',)),
+]
+
+
+def load_mesh(filepath):
+    # STL repeats every shared corner once per triangle; weld straight away so
+    # all stages work on the indexed mesh
+    vertices, faces = vertex_weld.weld_triangles(stl_io.read_triangles(filepath))
+    if len(faces) == 0:
+        raise ValueError(f"{filepath} contains no triangles")
+    return trimesh.Trimesh(vertices, faces, process=False)
+
+
+def save_mesh(mesh, output_path):
+    stl_io.write_mesh(output_path, mesh.vertices, mesh.faces)
+
+
+def export_outputs(mesh, directory_path, filename, target_polygon_count, lod_polygon_counts,
+                   stages, log_callback=print):
+    """Save the mesh and each LOD, decimated from the one before it; returns one entry per output file."""
+    targets = [target_polygon_count] + sorted(lod_polygon_counts, reverse=True)
+    outputs = []
+    for index, (target, output_name) in enumerate(zip(targets, output_filenames(filename, targets))):
+        if index > 0:
+            stages.start('lod_decimation', mesh)
+            mesh = decimate(mesh, target)
+            stages.end('lod_decimation', mesh)
+        stages.start('export', mesh)
+        output_path = os.path.join(directory_path, output_name)
+        save_mesh(mesh, output_path)
+        stages.end('export', mesh)
+        over_target = len(mesh.faces) > target
+        if over_target:
+            log_callback(f"Warning: {output_name} has {len(mesh.faces)} polygons, decimation could not "
+                         f"get it down to the target of {target}")
+        outputs.append({
+            'target': target, 'output_path': output_path, 'output_polygons': len(mesh.faces),
+            'over_target': over_target,
+        })
+    if len(outputs) > 1:
+        log_callback(f"Time for LOD decimation: {stages.timings()['lod_decimation']} seconds")
+    return outputs
+
+
+def checkpoint_keys(input_hash, params):
+    """One key per stage, covering the input and the parameters of that stage and every stage before it."""
+    digest = hashlib.blake2b(f"{input_hash}:{ENGINE_VERSION}".encode(), digest_size=20)
+    keys = []
+    for name, _, param_names in PIPELINE_STAGES:
+        digest.update(json.dumps([name, [params[param] for param in param_names]]).encode())
+        keys.append(digest.copy().hexdigest())
+    return keys
+
+
+def pack_mesh(mesh):
+    vertices = np.ascontiguousarray(mesh.vertices, dtype='<f8')
+    faces = np.ascontiguousarray(mesh.faces, dtype='<i4')
+    return struct.pack('<QQ', len(vertices), len(faces)) + vertices.tobytes() + faces.tobytes()
+
+
+def unpack_mesh(data):
+    vertex_count, face_count = struct.unpack_from('<QQ', data)
+    vertices = np.frombuffer(data, dtype='<f8', count=vertex_count * 3, offset=16).reshape(-1, 3)
+    faces = np.frombuffer(data, dtype='<i4', count=face_count * 3, offset=16 + vertices.nbytes).reshape(-1, 3)
+    return trimesh.Trimesh(vertices.copy(), faces.astype(np.int64), process=False)
+
+
+def load_checkpoint(checkpoints, keys):
+    """(stage index, mesh) of the deepest stored stage output, or (-1, None) when there is none."""
+    for index in reversed(range(len(keys))):
+        data = checkpoints.get_bytes(keys[index])
+        if data is not None:
+            return index, unpack_mesh(data)
+    return -1, None
+
+
+def process_stl(
+    filepath, directory_path, filename,
+    target_polygon_count, laplacian_smooth_lambda_factor,
+    subdivision_levels, smoothing_factor, smoothing_iterations,
+    crisp_edge_bevel_width, lod_polygon_counts=(), log_callback=print, checkpoints=None, memory_budget=None,
+    stage_callback=None
+):
+    """
+    Run the modifier pipeline on array-backed meshes; returns the same result dict as the Blender pipeline.
+    Resumes from `checkpoints` when given, and scans over `memory_budget` go through tiled_processing.
+    """
+    # Imported here because tiled_processing builds on this module's stages
+    import tiled_processing
+    memory_budget = MEMORY_BUDGET if memory_budget is None else memory_budget
+    if not tiled_processing.fits_in_memory(stl_io.read_triangle_count(filepath), memory_budget):
+        return tiled_processing.process_stl_tiled(
+            filepath, directory_path, filename,
+            target_polygon_count, laplacian_smooth_lambda_factor,
+            subdivision_levels, smoothing_factor, smoothing_iterations,
+            crisp_edge_bevel_width, memory_budget, lod_polygon_counts, log_callback, stage_callback
+        )
+    params = {
+        'target_polygon_count': target_polygon_count,
+        'laplacian_smooth_lambda_factor': laplacian_smooth_lambda_factor,
+        'subdivision_levels': subdivision_levels,
+        'smoothing_factor': smoothing_factor,
+        'smoothing_iterations': smoothing_iterations,
+        'crisp_edge_bevel_width': crisp_edge_bevel_width,
+    }
+    log_callback(f"Processing file: {filename}")
+    file_start_time = time.time()
+    stages = StageRecorder(stage_callback, filename)
+
+    stages.start('import')
+    resume_index, mesh, keys = -1, None, None
+    if checkpoints is not None:
+        keys = checkpoint_keys(hash_file(filepath), params)
+        resume_index, mesh = load_checkpoint(checkpoints, keys)
+    if mesh is None:
+        mesh = load_mesh(filepath)
+        input_polygons = len(mesh.faces)
+    else:
+        input_polygons = stl_io.read_triangle_count(filepath)
+        log_callback(f"Resuming after stage {PIPELINE_STAGES[resume_index][0]} from its checkpoint")
+    stages.end('import', mesh)
+
+    for index, (name, function, param_names) in enumerate(PIPELINE_STAGES):
+        if index <= resume_index:
+            stages.skip(name)
+            continue
+        stages.start(name, mesh)
+        if name == 'subdivision':
+            mesh = function(mesh, subdivision_levels, log_callback=log_callback)
+        else:
+            mesh = function(mesh, *(params[param] for param in param_names))
+        log_callback(f"Time for {name}: {stages.end(name, mesh)} seconds")
+        if checkpoints is not None:
+            checkpoints.put_bytes(keys[index], pack_mesh(mesh))
+
+    outputs = export_outputs(
+        mesh, directory_path, filename, target_polygon_count, lod_polygon_counts, stages, log_callback
+    )
+    return {
+        'output_path': outputs[0]['output_path'],
+        'input_polygons': input_polygons,
+        'output_polygons': outputs[0]['output_polygons'],
+        'outputs': outputs,
+        'stage_timings': stages.timings(),
+        'stage_profile': stages.records(),
+        'total_time': time.time() - file_start_time,
+        'resumed_after': PIPELINE_STAGES[resume_index][0] if resume_index >= 0 else None,
+    }
+
+
+# Queue a pool worker sends its log lines and stage events over, set by init_worker
+_worker_messages = None
+
+
+def init_worker(messages):
+    global _worker_messages
+    _worker_messages = messages
+
+
+def run_task(task, args, checkpoint_directory=None):
+    """Worker-process entry point; failures come back as error results like the Blender workers'."""
+    import traceback
+    try:
+        if task != 'process':
+            raise ValueError(f"The native engine cannot run '{task}' jobs")
+        checkpoints = None
+        if checkpoint_directory is not None:
+            checkpoints = DiskCache(checkpoint_directory, CHECKPOINT_MAX_BYTES)
+        callbacks = {}
+        if _worker_messages is not None:
+            callbacks = {
+                'log_callback': lambda line: _worker_messages.put(('output', line)),
+                'stage_callback': lambda event: _worker_messages.put(('stage', event)),
+            }
+        result = process_stl(**args, checkpoints=checkpoints, **callbacks)
+        result['status'] = 'ok'
+    except Exception:
+        result = {'status': 'error', 'error': traceback.format_exc()}
+    return result
+
+
+class NativeEnginePool:
+    """
+    Same submit/shutdown interface as BlenderWorkerPool, backed by a process pool.
+    Worker log lines and stage events are forwarded to the callbacks from a listener thread.
+    """
+
+    def __init__(self, size=1, checkpoint_directory=CHECKPOINT_DIRECTORY, output_callback=None, stage_callback=None):
+        self.size = size
+        self.checkpoint_directory = checkpoint_directory
+        self.output_callback = output_callback or print
+        self.stage_callback = stage_callback
+        self._executor = None
+        self._messages = None
+        self._listener = None
+
+    def start(self):
+        if self._executor is None:
+            self._messages = multiprocessing.Queue()
+            self._listener = threading.Thread(target=self._forward_messages, args=(self._messages,), daemon=True)
+            self._listener.start()
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.size, initializer=init_worker, initargs=(self._messages,)
+            )
+        return self
+
+    def _forward_messages(self, messages):
+        # Runs until shutdown sends None
+        for kind, payload in iter(messages.get, None):
+            if kind == 'output':
+                self.output_callback(payload)
+            elif self.stage_callback is not None:
+                self.stage_callback(payload)
+
+    def submit(self, task, **args):
+        self.start()
+        return self._executor.submit(run_task, task, args, self.checkpoint_directory)
+
+    def shutdown(self, wait=True):
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait, cancel_futures=not wait)
+            self._executor = None
+            # Queued after everything the workers sent, so the listener drains those first
+            self._messages.put(None)
+            if wait:
+                self._listener.join()
+            self._messages = self._listener = None
@@ -0,0 +1,113 @@
+import hashlib
+from collections import OrderedDict
+
+import numpy as np
+import scipy.sparse
+
+WEIGHTS = ('uniform', 'cotangent')
+# Laplacians kept around for re-runs on the same mesh, e.g. parameter sweeps
+CACHE_SIZE = 8
+# Taubin pass-band frequency used to derive mu from lambda
+TAUBIN_PASS_BAND = 0.1
+
+_matrix_cache = OrderedDict()
+
+
+def _mesh_key(vertices, faces, weights):
+    digest = hashlib.blake2b(np.ascontiguousarray(faces).tobytes(), digest_size=16)
+    digest.update(str(len(vertices)).encode())
+    if weights == 'cotangent':
+        # Cotangent weights depend on the geometry, uniform ones only on connectivity
+        digest.update(np.ascontiguousarray(vertices).tobytes())
+    return weights, digest.hexdigest()
+
+
+def _uniform_weights(faces):
+    rows = faces[:, [0, 1, 1, 2, 2, 0]].ravel()
+    cols = faces[:, [1, 0, 2, 1, 0, 2]].ravel()
+    return rows, cols, np.ones(len(rows))
+
+
+def _cotangent_weights(vertices, faces):
+    rows, cols, values = [], [], []
+    for corner in range(3):
+        # The angle at `corner` is opposite the edge between the other two vertices
+        i, j, k = faces[:, corner], faces[:, (corner + 1) % 3], faces[:, (corner + 2) % 3]
+        u = vertices[j] - vertices[i]
+        v = vertices[k] - vertices[i]
+        sine = np.linalg.norm(np.cross(u, v), axis=1)
+        cotangent = np.einsum('ij,ij->i', u, v) / np.maximum(sine, 1e-12)
+        # Obtuse angles give negative weights, which make the averaging unstable
+        weight = 0.5 * np.maximum(cotangent, 1e-6)
+        rows += [j, k]
+        cols += [k, j]
+        values += [weight, weight]
+    return np.concatenate(rows), np.concatenate(cols), np.concatenate(values)
+
+
+def laplacian_matrix(vertices, faces, weights='uniform'):
+    """
+    Row-normalised (n, n) sparse averaging operator W, so that W @ vertices
+    gives every vertex the weighted mean of its neighbours. Cached per mesh.
+    """
+    if weights not in WEIGHTS:
+        raise ValueError(f"Unknown weights '{weights}', expected one of {', '.join(WEIGHTS)}")
+    faces = np.asarray(faces, dtype=np.int64)
+    key = _mesh_key(vertices, faces, weights)
+    if key in _matrix_cache:
+        _matrix_cache.move_to_end(key)
+        return _matrix_cache[key]
+
+    if weights == 'uniform':
+        rows, cols, values = _uniform_weights(faces)
+    else:
+        rows, cols, values = _cotangent_weights(np.asarray(vertices, dtype=np.float64), faces)
+    vertex_count = len(vertices)
+    matrix = scipy.sparse.coo_matrix((values, (rows, cols)), shape=(vertex_count, vertex_count)).tocsr()
+    if weights == 'uniform':
+        # Every interior edge was listed once per adjacent face
+        matrix.data[:] = 1.0
+    totals = np.asarray(matrix.sum(axis=1)).ravel()
+    # Isolated vertices keep their position
+    isolated = totals == 0
+    totals[isolated] = 1.0
+    matrix = scipy.sparse.diags(1.0 / totals) @ matrix
+    if isolated.any():
+        matrix = matrix + scipy.sparse.diags(isolated.astype(np.float64))
+    matrix = matrix.tocsr()
+
+    _matrix_cache[key] = matrix
+    while len(_matrix_cache) > CACHE_SIZE:
+        _matrix_cache.popitem(last=False)
+    return matrix
+
+
+def _apply(vertices, matrix, factors, pinned):
+    vertices = np.array(vertices, dtype=np.float64)
+    for factor in factors:
+        delta = matrix @ vertices - vertices
+        if pinned is not None:
+            delta[pinned] = 0.0
+        vertices += factor * delta
+    return vertices
+
+
+def laplacian_smooth(vertices, faces, factor, iterations=1, weights='uniform', pinned=None):
+    """Move every vertex `factor` of the way to its neighbour average, `iterations` times."""
+    matrix = laplacian_matrix(vertices, faces, weights)
+    return _apply(vertices, matrix, [factor] * iterations, pinned)
+
+
+def taubin_smooth(vertices, faces, factor, iterations=1, weights='uniform', pinned=None, mu=None):
+    """
+    Taubin lambda/mu smoothing: each iteration is a shrinking step with
+    `factor` followed by an inflating step with `mu`, so the mesh keeps its volume.
+    """
+    if mu is None:
+        mu = 1.0 / (TAUBIN_PASS_BAND - 1.0 / factor)
+    matrix = laplacian_matrix(vertices, faces, weights)
+    return _apply(vertices, matrix, [factor, mu] * iterations, pinned)
+
+
+def clear_cache():
+    _matrix_cache.clear()
@@ -0,0 +1,140 @@
+import numpy as np
+
+METHODS = ('loop', 'midpoint')
+# Peak memory allowed for one subdivision run unless the caller passes its own budget
+DEFAULT_MEMORY_BUDGET = 4 * 1024 ** 3
+
+# Bytes per element of the mesh being subdivided, which stays alive for the whole level
+VERTEX_BYTES = 3 * 8
+FACE_BYTES = 3 * 8
+# Bytes per vertex, edge and face of the input of one level taken by the arrays _subdivide_once
+# holds at its peaks: Loop peaks either while it moves the boundary vertices or while it
+# builds the new faces, midpoint either while it averages the edge ends or on the new faces.
+# Each constant is the larger of the two, so the sum bounds both.
+TEMPORARY_BYTES = {
+    'loop': {'vertex': 177, 'edge': 129, 'face': 264},
+    'midpoint': {'vertex': 24, 'edge': 97, 'face': 240},
+}
+
+
+class SubdivisionBudgetError(MemoryError):
+    pass
+
+
+def forecast_subdivision(vertex_count, face_count, levels, method='loop'):
+    """Predicted sizes and peak memory of every level, before anything is allocated."""
+    temporary = TEMPORARY_BYTES[method]
+    edge_count = int(1.5 * face_count)
+    forecast = []
+    for level in range(1, levels + 1):
+        new_vertex_count = vertex_count + edge_count
+        new_face_count = 4 * face_count
+        peak_bytes = (
+            vertex_count * (VERTEX_BYTES + temporary['vertex'])
+            + edge_count * temporary['edge']
+            + face_count * (FACE_BYTES + temporary['face'])
+        )
+        forecast.append({
+            'level': level,
+            'vertices': new_vertex_count,
+            'faces': new_face_count,
+            'peak_bytes': peak_bytes,
+        })
+        vertex_count, face_count, edge_count = new_vertex_count, new_face_count, 2 * edge_count + 3 * face_count
+    return forecast
+
+
+def affordable_levels(vertex_count, face_count, levels, memory_budget=DEFAULT_MEMORY_BUDGET, method='loop'):
+    """Highest level up to `levels` whose forecast peak fits in `memory_budget`."""
+    affordable = 0
+    for entry in forecast_subdivision(vertex_count, face_count, levels, method):
+        if entry['peak_bytes'] > memory_budget:
+            break
+        affordable = entry['level']
+    return affordable
+
+
+def _edge_table(faces, vertex_count):
+    """Unique edges, the edge index of every face side (m, 3) and how many faces use each edge."""
+    sides = np.sort(faces[:, [0, 1, 1, 2, 2, 0]].reshape(-1, 2), axis=1)
+    keys = sides[:, 0].astype(np.int64) * vertex_count + sides[:, 1]
+    keys, face_edges, counts = np.unique(keys, return_inverse=True, return_counts=True)
+    edges = np.stack([keys // vertex_count, keys % vertex_count], axis=1)
+    return edges, face_edges.reshape(-1, 3), counts
+
+
+def _subdivide_once(vertices, faces, method):
+    vertex_count = len(vertices)
+    edges, face_edges, counts = _edge_table(faces, vertex_count)
+    boundary = counts != 2
+    a, b = edges[:, 0], edges[:, 1]
+
+    if method == 'midpoint':
+        edge_points = 0.5 * (vertices[a] + vertices[b])
+        moved = vertices
+    else:
+        # Side s of a face runs from corner s to corner s+1; its opposite corner is s+2
+        opposite = faces[:, [2, 0, 1]].ravel()
+        opposite_sum = np.stack([
+            np.bincount(face_edges.ravel(), weights=vertices[opposite, axis], minlength=len(edges))
+            for axis in range(3)
+        ], axis=1)
+        edge_points = 0.375 * (vertices[a] + vertices[b]) + 0.125 * opposite_sum
+        edge_points[boundary] = 0.5 * (vertices[a[boundary]] + vertices[b[boundary]])
+
+        # Interior vertices: Loop's beta weights over the one-ring
+        ends = np.concatenate([a, b])
+        others = np.concatenate([b, a])
+        valence = np.bincount(ends, minlength=vertex_count)
+        ring_sum = np.stack([
+            np.bincount(ends, weights=vertices[others, axis], minlength=vertex_count) for axis in range(3)
+        ], axis=1)
+        safe_valence = np.maximum(valence, 1)
+        beta = (0.625 - (0.375 + 0.25 * np.cos(2 * np.pi / safe_valence)) ** 2) / safe_valence
+        moved = (1 - valence * beta)[:, None] * vertices + beta[:, None] * ring_sum
+
+        # Boundary vertices only follow their boundary neighbours
+        boundary_ends = np.concatenate([a[boundary], b[boundary]])
+        boundary_others = np.concatenate([b[boundary], a[boundary]])
+        on_boundary = np.bincount(boundary_ends, minlength=vertex_count) > 0
+        boundary_sum = np.stack([
+            np.bincount(boundary_ends, weights=vertices[boundary_others, axis], minlength=vertex_count)
+            for axis in range(3)
+        ], axis=1)
+        boundary_count = np.maximum(np.bincount(boundary_ends, minlength=vertex_count), 1)[:, None]
+        moved[on_boundary] = (0.75 * vertices + 0.25 * boundary_sum / boundary_count)[on_boundary]
+        isolated = valence == 0
+        moved[isolated] = vertices[isolated]
+
+    new_vertices = np.concatenate([moved, edge_points])
+    mid = face_edges + vertex_count
+    v0, v1, v2 = faces[:, 0], faces[:, 1], faces[:, 2]
+    m01, m12, m20 = mid[:, 0], mid[:, 1], mid[:, 2]
+    new_faces = np.concatenate([
+        np.stack([v0, m01, m20], axis=1),
+        np.stack([v1, m12, m01], axis=1),
+        np.stack([v2, m20, m12], axis=1),
+        np.stack([m01, m12, m20], axis=1),
+    ])
+    return new_vertices, new_faces
+
+
+def subdivide(vertices, faces, levels, method='loop', memory_budget=DEFAULT_MEMORY_BUDGET,
+              on_over_budget='cap', log_callback=None):
+    """Subdivide a triangle mesh `levels` times, capping or raising when a level is over `memory_budget`."""
+    if method not in METHODS:
+        raise ValueError(f"Unknown method '{method}', expected one of {', '.join(METHODS)}")
+    vertices = np.asarray(vertices, dtype=np.float64)
+    faces = np.asarray(faces, dtype=np.int64)
+    allowed = affordable_levels(len(vertices), len(faces), levels, memory_budget, method)
+    if allowed < levels:
+        peak = forecast_subdivision(len(vertices), len(faces), levels, method)[allowed]['peak_bytes']
+        message = (f"Subdivision level {allowed + 1} needs about {peak / 1024 ** 2:,.0f} MiB, "
+                   f"over the {memory_budget / 1024 ** 2:,.0f} MiB budget")
+        if on_over_budget == 'raise':
+            raise SubdivisionBudgetError(message)
+        if log_callback is not None:
+            log_callback(f"{message}; capping at level {allowed}")
+    for _ in range(allowed):
+        vertices, faces = _subdivide_once(vertices, faces, method)
+    return vertices, faces
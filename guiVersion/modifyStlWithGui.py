@@ -2,97 +2,34 @@ import os
 import time
 import sys
 import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from tkinter import messagebox
-from PyQt5.QtWidgets import QApplication, QWidget, QVBoxLayout, QPushButton, QFileDialog, QListWidget, QCheckBox, QGridLayout, QLineEdit, QLabel, QTextEdit, QListWidgetItem, QAbstractItemView
+from PyQt5.QtWidgets import QApplication, QWidget, QVBoxLayout, QPushButton, QFileDialog, QListView, QCheckBox, QGridLayout, QLineEdit, QLabel, QAbstractItemView, QComboBox
 from PyQt5.QtGui import QPalette, QColor, QIcon, QPixmap
-from PyQt5.QtCore import Qt, QThread, pyqtSignal, QEventLoop
-from PyQt5.QtCore import QSemaphore
-from blender_script_utils import run_blender_script
-from render_stl import run_render_script
-
-def check_processing_complete_flag(filepath):
-    """
-    Check if the .done file exists for the given filepath.
-    """
-    # Assuming the status file is named as '[filename].done'
-    status_file = f"{filepath}.done"
-    return os.path.exists(status_file)
-
-class RunBlenderScriptThread(QThread):
-    output = pyqtSignal(str)
-    # Add a flag to control the execution
-    _is_running = True
-
-    def stop(self):  # Method to signal the thread to stop
-        self._is_running = False
-
-    def __init__(self, filepath, value_fields, update_status, parent=None):
-        super(RunBlenderScriptThread, self).__init__(parent)
-        self.filepath = filepath
-        self.value_fields = value_fields
-        self.update_status = update_status
-
-    def run(self):
-        file_name = os.path.basename(self.filepath)
-        start_time = time.time()  # Capture start time
-        self.output.emit(f'Processing file {file_name}')
-        # Extract values from the UI
-        directory = self.value_fields['directory_entry'].text()
-        smoothing_factor = float(self.value_fields['smoothing_factor_entry'].text())
-        smoothing_iterations = int(self.value_fields['smoothing_iterations_entry'].text())
-        crisp_edge_bevel_width = float(self.value_fields['crisp_edge_bevel_width_entry'].text())
-        target_polygon_count = int(self.value_fields['target_polygon_count_entry'].text())
-        subdivision_levels = int(self.value_fields['subdivision_levels_entry'].text())
-        laplacian_smooth_lambda_factor = float(self.value_fields['laplacian_smooth_lambda_factor_entry'].text())
-        # Call the function with all required arguments
-        run_blender_script(
-            filepath=self.filepath,
-            directory_path=directory,
-            filename=os.path.basename(self.filepath),
-            target_polygon_count = target_polygon_count,
-            laplacian_smooth_lambda_factor = laplacian_smooth_lambda_factor,
-            subdivision_levels = subdivision_levels,
-            smoothing_factor=smoothing_factor,
-            smoothing_iterations=smoothing_iterations,
-            crisp_edge_bevel_width=crisp_edge_bevel_width,
-            update_status_callback=self.update_status
-        )
-                    # Wait until the processing of the file is complete
-        while not check_processing_complete_flag(self.filepath):
-            time.sleep(1)  # Wait a bit before re-checking
-        # Remove the .done files or they will interfere with the next batch
-        os.remove(f"{self.filepath}.done")
-
-        end_time = time.time()  # Capture end time
-        runtime_seconds = end_time - start_time
-        minutes, seconds = divmod(runtime_seconds, 60)
-        self.output.emit(f"{file_name} completed in {int(minutes)} minutes and {int(seconds)} seconds.")
-
-class RenderScriptThread(QThread):
-    output = pyqtSignal(str)
-    # Add a flag to control the execution
-    _is_running = True
-
-    def stop(self):  # Method to signal the thread to stop
-        self._is_running = False
-
-    def callRenderScript(self):
-        run_render_script(file=self.file, update_status_callback=self.update_status)
-        self.output.emit(f'Render completed successfully. File {self.file_name}')
-
-    def __init__(self, file, update_status, parent=None):
-        super(RenderScriptThread, self).__init__(parent)
-        self.file = file
-        self.file_name = os.path.basename(self.file)
-        self.update_status = update_status
-
-    def run(self):
-        self.callRenderScript()
-
-
+from PyQt5.QtCore import Qt, pyqtSignal
+from processing_backends import (
+    ENGINES, create_worker_pool, estimate_job_memory, format_outputs, output_filenames, run_pipeline_job
+)
+from job_scheduler import JobScheduler, estimate_job_cost
+from file_list_model import FileListModel
+from log_view import LogView
+from render_stl import render_output_path, split_render_batches
+from preview_cache import PreviewCache
+from result_cache import ResultCache
+from stage_profiler import ProfileLog, format_report
+from stl_index import StlIndex
+import preview_renderer
+
+PROFILE_DIRECTORY = os.path.join(os.path.expanduser('~'), '.cache', 'ModelEnhancer', 'profiles')
 
 class MeshProcessorApp(QWidget):
-    allThreadsFinished = pyqtSignal()  # Signal to indicate all threads in the batch have finished
+    # Scheduler threads report through these so widgets are only touched from the GUI thread
+    status_changed = pyqtSignal(str, str)
+    log_message = pyqtSignal(str)
+    file_indexed = pyqtSignal(dict)
+    stage_event = pyqtSignal(dict)
+    preview_ready = pyqtSignal(str, str, object)
 
     def __init__(self):
         super().__init__()
@@ -109,11 +46,77 @@ class MeshProcessorApp(QWidget):
             'smoothing_iterations_entry': self.smoothing_iterations_entry,
             'crisp_edge_bevel_width_entry': self.crisp_edge_bevel_width_entry
         }
-        self.thread_list = []  # Initialize a list to keep threads
-        self.semaphore = QSemaphore(self.concurrent_processing_count)  # Set the limit for concurrent threads
-        self.allThreadsFinished.connect(self.on_all_threads_finished)
-        self.active_thread_count = 0
-        self.batch_event_loop = QEventLoop()
+        self.status_changed.connect(self.update_status)
+        self.log_message.connect(self.console_output.append)
+        self.file_indexed.connect(self.on_file_indexed)
+        self.stage_event.connect(self.on_stage_event)
+        self.preview_ready.connect(self.on_preview_ready)
+        self.file_list.selectionModel().currentChanged.connect(self.show_preview)
+        self.stl_index = None
+        self.worker_pools = {}
+        self.scheduler = None
+        # (scheduler, pools) replaced after a concurrency change, still finishing their jobs
+        self.retired_schedulers = []
+        self.result_cache = None
+        self.preview_cache = None
+        # One preview renders at a time; requests for files the user has moved past return at once
+        self.preview_executor = ThreadPoolExecutor(max_workers=1)
+        self.preview_filename = None
+
+    def get_worker_pool(self, engine):
+        # Workers are kept alive across batches; get_scheduler retires them when the pool size changes
+        pool = self.worker_pools.get(engine)
+        if pool is None:
+            pool = create_worker_pool(
+                engine, self.concurrent_processing_count,
+                output_callback=self.log_message.emit, stage_callback=self.stage_event.emit
+            )
+            self.worker_pools[engine] = pool
+        return pool
+
+    def get_scheduler(self):
+        # Call before get_worker_pool, so a new pool size also gets new pools
+        if self.scheduler is None or self.scheduler.max_workers != self.concurrent_processing_count:
+            if self.scheduler is not None:
+                self.retire_scheduler(self.scheduler, list(self.worker_pools.values()))
+                self.worker_pools = {}
+            self.scheduler = JobScheduler(self.concurrent_processing_count, status_callback=self.on_job_status)
+        self.scheduler.max_retries = int(self.job_retries_entry.text())
+        memory_budget_gb = float(self.memory_budget_entry.text())
+        self.scheduler.memory_budget = memory_budget_gb * 1024 ** 3 if memory_budget_gb > 0 else None
+        return self.scheduler
+
+    def retire_scheduler(self, scheduler, pools):
+        # Jobs already queued on the old scheduler still run to completion on its pools,
+        # which are shut down once it has drained
+        retired = (scheduler, pools)
+        self.retired_schedulers.append(retired)
+
+        def drain():
+            scheduler.shutdown()
+            for pool in pools:
+                pool.shutdown()
+            self.retired_schedulers.remove(retired)
+        threading.Thread(target=drain, daemon=True).start()
+
+    def on_job_status(self, job, status):
+        self.status_changed.emit(job.name, status)
+
+    def cancel_jobs(self):
+        for scheduler, _ in list(self.retired_schedulers):
+            scheduler.cancel()
+        if self.scheduler is not None:
+            self.scheduler.cancel()
+
+    def closeEvent(self, event):
+        for scheduler, pools in list(self.retired_schedulers) + [(self.scheduler, list(self.worker_pools.values()))]:
+            if scheduler is not None:
+                scheduler.cancel()
+                scheduler.shutdown(wait=False)
+            for pool in pools:
+                pool.shutdown(wait=False)
+        self.preview_executor.shutdown(wait=False)
+        super().closeEvent(event)
 
     def create_widgets(self):
         layout = QVBoxLayout()
@@ -123,12 +126,18 @@ class MeshProcessorApp(QWidget):
         self.browse_button.clicked.connect(self.browse_directory)
         self.directory_label = QLabel('Directory: ')
         self.directory_entry = QLineEdit()
-        self.file_list = QListWidget()
+        self.file_model = FileListModel(self)
+        self.file_list = QListView()
+        self.file_list.setModel(self.file_model)
+        # Rows are laid out without measuring each one, which keeps 10k+ files responsive
+        self.file_list.setUniformItemSizes(True)
 
         self.apply_button = QPushButton('Process Selected')
         self.apply_button.clicked.connect(self.apply)
         self.quit_button = QPushButton('Quit')
         self.quit_button.clicked.connect(self.close)
+        self.cancel_button = QPushButton('Cancel')
+        self.cancel_button.clicked.connect(self.cancel_jobs)
 
         self.select_all_button = QPushButton("Select all", self)
         self.select_all_button.clicked.connect(self.select_all)
@@ -150,17 +159,30 @@ class MeshProcessorApp(QWidget):
         self.smoothing_iterations_entry = QLineEdit("2")
         self.crisp_edge_bevel_width_entry = QLineEdit("0.1")
         self.concurrent_processing_entry = QLineEdit("1")
+        self.job_retries_entry = QLineEdit("0")
+        # GiB shared by all running jobs, 0 for no limit
+        self.memory_budget_entry = QLineEdit("0")
+        self.memory_budget_entry.setToolTip(
+            "GiB the running jobs may use together, 0 for no limit. Native jobs on scans over "
+            "mesh_engine.MEMORY_BUDGET are tiled; that budget bounds the tile phase only."
+        )
+        self.engine_combo = QComboBox()
+        self.engine_combo.addItems(ENGINES)
+        self.use_cache_checkbox = QCheckBox('Reuse cached results')
+        self.use_cache_checkbox.setChecked(True)
 
-        self.console_output = QTextEdit()
-        self.console_output.setReadOnly(True)
+        self.console_output = LogView()
 
         self.render_button = QPushButton('Render STL')
         self.render_button.clicked.connect(self.render_stl)
+        self.sort_by_size_button = QPushButton('Sort by size')
+        self.sort_by_size_button.clicked.connect(self.sort_by_size)
         # Labels for showing rendered images
         self.original_render_label = QLabel()
         self.processed_render_label = QLabel()
 
         grid_layout.addWidget(self.render_button, 9, 0)
+        grid_layout.addWidget(self.sort_by_size_button, 9, 1)
         grid_layout.addWidget(self.original_render_label, 10, 0, 1, 2)
         grid_layout.addWidget(self.processed_render_label, 10, 2, 1, 2)
 
@@ -181,9 +203,17 @@ class MeshProcessorApp(QWidget):
         grid_layout.addWidget(self.crisp_edge_bevel_width_entry, 6, 1)
         grid_layout.addWidget(QLabel('concurrent_processing:'), 1, 2)
         grid_layout.addWidget(self.concurrent_processing_entry, 1, 3)
+        grid_layout.addWidget(QLabel('job_retries:'), 2, 2)
+        grid_layout.addWidget(self.job_retries_entry, 2, 3)
+        grid_layout.addWidget(QLabel('engine:'), 3, 2)
+        grid_layout.addWidget(self.engine_combo, 3, 3)
+        grid_layout.addWidget(self.use_cache_checkbox, 4, 2, 1, 2)
+        grid_layout.addWidget(QLabel('memory_budget_gb:'), 5, 2)
+        grid_layout.addWidget(self.memory_budget_entry, 5, 3)
         grid_layout.addWidget(self.crisp_edge_bevel_width_entry, 6, 1)
         grid_layout.addWidget(self.apply_button, 7, 0)
         grid_layout.addWidget(self.quit_button, 7, 1)
+        grid_layout.addWidget(self.cancel_button, 7, 2)
         grid_layout.addWidget(self.deselect_all_button, 8, 0)
         grid_layout.addWidget(self.select_all_button, 8, 1)
         grid_layout.addWidget(self.clear_list_button, 8, 2)
@@ -205,118 +235,203 @@ class MeshProcessorApp(QWidget):
 
 
     def load_and_display_image(self, image_path, label):
-        pixmap = QPixmap(image_path)
+        # Thumbnails are stretched to the full preview size, so the layout does not jump between tiers
+        pixmap = QPixmap(image_path).scaled(
+            preview_renderer.PREVIEW_WIDTH, preview_renderer.PREVIEW_HEIGHT, Qt.KeepAspectRatio, Qt.SmoothTransformation
+        )
         label.setPixmap(pixmap)
 
     def render_stl(self):
-        # Assuming you have a function to render STL and return the image paths
-        original_image, processed_image = self.render_stl_images()
-        self.load_and_display_image(original_image, self.original_render_label)
-        self.load_and_display_image(processed_image, self.processed_render_label)
-
         self.concurrent_processing_count = int(self.concurrent_processing_entry.text())
-        selected_files = [self.directory_entry.text() + '/' + self.file_list.item(index).text()
-                          for index in range(self.file_list.count())
-                          if self.file_list.item(index).checkState() == Qt.Checked]
-        for file in selected_files:
-            file_name = os.path.basename(file)
-            self.update_status(file_name, "Pending")
-
-        self.file_batches = list(self.chunk_file_list(selected_files,  self.concurrent_processing_count))
-
-        for file_batch in self.file_batches:
-            self.active_thread_count = len(file_batch)
-            for file in file_batch:
-                file_name = os.path.basename(file)
-                self.update_status(file_name, "Processing")
-                thread = RenderScriptThread(file, self.update_status)
-                thread.finished.connect(thread.deleteLater)
-                thread.finished.connect(lambda: self.thread_finished())
-                thread.output.connect(self.console_output.append)
-                self.thread_list.append(thread)
-                thread.start()
-            self.batch_event_loop.exec_()
-
-    def render_stl_images(self):
-        # Here, call your Blender script or any other rendering process
-        # Then return the paths of the rendered images
-        return "path/to/original_render.png", "path/to/processed_render.png"
+        scheduler = self.get_scheduler()
+        pool = self.get_worker_pool('blender')
+        # One Blender session per slot renders its share of the files; the scene is built once per batch
+        costed_files = self.selected_files_by_cost()
+        batches = split_render_batches(costed_files, self.concurrent_processing_count)
+        costs = dict(costed_files)
+        for number, files in enumerate(batches, 1):
+            for file in files:
+                self.update_status(os.path.basename(file), "Queued for render")
+            scheduler.submit(
+                f"render batch {number}/{len(batches)}",
+                lambda job, files=files: self.render_files(files, pool),
+                sum(costs[file] for file in files)
+            )
+
+    def render_files(self, files, pool):
+        result = pool.submit(
+            'render_batch', stl_file_paths=files, output_image_paths=[render_output_path(file) for file in files]
+        ).result()
+        if result['status'] != 'ok':
+            self.log_message.emit(result.get('error', ''))
+            raise RuntimeError(f"Render batch of {len(files)} files failed")
+        self.log_message.emit(f"Rendered {len(files) - result['failed']} of {len(files)} files")
+        return result
+
+    def processed_output_path(self, directory, filename):
+        # First output the current settings write for this file, if it has been processed
+        try:
+            params = self.read_pipeline_params()
+        except ValueError:
+            return None
+        targets = [params['target_polygon_count']] + params['lod_polygon_counts']
+        path = os.path.join(directory, output_filenames(filename, targets)[0])
+        return path if os.path.exists(path) else None
+
+    def show_preview(self, current, previous=None):
+        if not current.isValid():
+            return
+        filename = current.data(Qt.UserRole)
+        directory = self.directory_entry.text()
+        processed = self.processed_output_path(directory, filename)
+        if self.preview_cache is None:
+            self.preview_cache = PreviewCache()
+        self.preview_filename = filename
+        self.preview_executor.submit(self.render_preview, filename, os.path.join(directory, filename), processed)
+
+    def render_preview(self, filename, original, processed):
+        # Runs off the GUI thread; each tier comes back through preview_ready as soon as it is ready
+        try:
+            for _, before, after in self.preview_cache.previews(
+                    original, processed, lambda: self.preview_filename == filename):
+                self.preview_ready.emit(filename, before, after)
+        except (OSError, ValueError) as e:
+            self.log_message.emit(f"Preview of {filename} failed: {e}")
+
+    def on_preview_ready(self, filename, before, after):
+        if filename != self.preview_filename:
+            # The selection moved on while this preview was rendering
+            return
+        self.load_and_display_image(before, self.original_render_label)
+        if after is None:
+            self.processed_render_label.clear()
+        else:
+            self.load_and_display_image(after, self.processed_render_label)
 
     def update_status(self, filename, status):
-        # Search for the item in the QListWidget using the stored filename
-        for index in range(self.file_list.count()):
-            item = self.file_list.item(index)
-            if item.data(Qt.UserRole) == filename:  # Compare with the stored filename
-                # Updating the item text with the new status
-                item.setText(f"{filename} - {status}")
-                break
+        self.file_model.set_status(filename, status)
+
+    def on_stage_event(self, event):
+        # Sent by Blender as each pipeline stage or rendered file starts and ends
+        if event['event'] == 'start':
+            self.update_status(event['file'], f"Processing: {event['stage']}")
+        elif event['stage'] == 'render':
+            # A render batch reports each file as soon as its image is written
+            if event['status'] == 'ok':
+                self.update_status(event['file'], "Rendered")
+            else:
+                self.update_status(event['file'], "Render error")
+                self.log_message.emit(f"Render of {event['file']} failed: {event['error']}")
+
+    def start_indexing(self, directory, filenames):
+        # Headers and bounding boxes are read on the index's thread pool; results come back through a signal
+        if self.stl_index is None:
+            self.stl_index = StlIndex()
+        filepaths = [os.path.join(directory, filename) for filename in filenames]
+        threading.Thread(
+            target=self.stl_index.index_files, args=(filepaths, self.file_indexed.emit), daemon=True
+        ).start()
+
+    def on_file_indexed(self, info):
+        if os.path.dirname(info['path']) != os.path.abspath(self.directory_entry.text()):
+            # Left over from a directory that is no longer shown
+            return
+        self.file_model.set_info(os.path.basename(info['path']), info)
+
+    def sort_by_size(self):
+        # Largest scans first; files the index has not reached yet go last
+        info = self.file_model.info
+        self.file_model.sort_by(lambda filename: info.get(filename, {}).get('triangles', -1), reverse=True)
 
     # Function to clear the file list
     def clear_file_list(self):
-        self.file_list.clear()
+        self.file_model.clear()
 
-    # Function to remove selected files from the list
+    # Function to remove the checked files from the list
     def remove_selected_files(self):
-        # Go through the list backwards so you can remove items without affecting the indices of subsequent items
-        for index in reversed(range(self.file_list.count())):
-            item = self.file_list.item(index)
-            # Check if the item's checkbox is checked
-            if item.checkState() == Qt.Checked:
-                self.file_list.takeItem(index)
-
-    def chunk_file_list(self, files, size=3):
-        """Yield successive size-sized chunks from files."""
-        for i in range(0, len(files), size):
-            yield files[i:i + size]
+        self.file_model.remove_checked()
+
+    def selected_files(self):
+        directory = self.directory_entry.text()
+        return [directory + '/' + filename for filename in self.file_model.checked_files()]
+
+    def selected_files_by_cost(self):
+        # Submitted largest first so the first free slots never start on a small file
+        costed = []
+        for file in self.selected_files():
+            info = self.file_model.info.get(os.path.basename(file))
+            costed.append((file, info['triangles'] if info is not None else estimate_job_cost(file)))
+        return sorted(costed, key=lambda entry: entry[1], reverse=True)
+
+    def read_pipeline_params(self):
+        # Several comma-separated targets make one job write an LOD per target, largest first
+        targets = sorted((int(target) for target in self.target_polygon_count_entry.text().split(',')), reverse=True)
+        return {
+            'target_polygon_count': targets[0],
+            'laplacian_smooth_lambda_factor': float(self.laplacian_smooth_lambda_factor_entry.text()),
+            'subdivision_levels': int(self.subdivision_levels_entry.text()),
+            'smoothing_factor': float(self.smoothing_factor_entry.text()),
+            'smoothing_iterations': int(self.smoothing_iterations_entry.text()),
+            'crisp_edge_bevel_width': float(self.crisp_edge_bevel_width_entry.text()),
+            'lod_polygon_counts': targets[1:],
+        }
 
     def apply(self):
         self.concurrent_processing_count = int(self.concurrent_processing_entry.text())
-        selected_files = [self.directory_entry.text() + '/' + self.file_list.item(index).text()
-                          for index in range(self.file_list.count())
-                          if self.file_list.item(index).checkState() == Qt.Checked]
-        for file in selected_files:
-            file_name = os.path.basename(file)
-            self.update_status(file_name, "Pending")
-
-        self.file_batches = list(self.chunk_file_list(selected_files,  self.concurrent_processing_count))
-
-        for file_batch in self.file_batches:
-            self.active_thread_count = len(file_batch)
-            for file in file_batch:
-                file_name = os.path.basename(file)
-                self.update_status(file_name, "Processing")
-                thread = RunBlenderScriptThread(file, self.value_fields, self.update_status)
-                thread.finished.connect(thread.deleteLater)
-                thread.finished.connect(lambda: self.thread_finished())
-                thread.output.connect(self.console_output.append)
-                self.thread_list.append(thread)
-                thread.start()
-            self.batch_event_loop.exec_()
-
-    def thread_finished(self):
-        self.active_thread_count -= 1
-        if self.active_thread_count == 0:
-            self.allThreadsFinished.emit()
-
-    def on_all_threads_finished(self):
-        self.batch_event_loop.exit()
-
-    def remove_thread(self, thread):
-        self.thread_list.remove(thread)
+        directory = self.directory_entry.text()
+        params = self.read_pipeline_params()
+        engine = self.engine_combo.currentText()
+        scheduler = self.get_scheduler()
+        pool = self.get_worker_pool(engine)
+        cache = None
+        if self.use_cache_checkbox.isChecked():
+            if self.result_cache is None:
+                self.result_cache = ResultCache()
+            cache = self.result_cache
+        # Every batch keeps its per-stage records, like modifyStl.py --profile
+        os.makedirs(PROFILE_DIRECTORY, exist_ok=True)
+        profile = ProfileLog(os.path.join(PROFILE_DIRECTORY, time.strftime('batch-%Y%m%d-%H%M%S.jsonl')))
+        # Each file is its own job; a free slot picks up the largest remaining file right away
+        jobs = []
+        for file, cost in self.selected_files_by_cost():
+            run = lambda job, file=file: self.process_file(file, directory, params, pool, engine, cache)
+            jobs.append(scheduler.submit(
+                os.path.basename(file), profile.profiled(file, run), cost, estimate_job_memory(file, params, engine)
+            ))
+        threading.Thread(target=self.report_profile, args=(jobs, profile), daemon=True).start()
+
+    def report_profile(self, jobs, profile):
+        # Waits off the GUI thread; the report goes to the log once every job of the batch has finished
+        for job in jobs:
+            job.done.wait()
+        profile.close()
+        report = profile.report()
+        if report['stages']:
+            self.log_message.emit(f"Stage profile of the batch, records in {profile.path}:\n" + format_report(report))
+
+    def process_file(self, filepath, directory, params, pool, engine, cache=None):
+        file_name = os.path.basename(filepath)
+        start_time = time.time()  # Capture start time
+        self.log_message.emit(f'Processing file {file_name}')
+        result = run_pipeline_job(pool, engine, filepath, directory, params, cache, self.log_message.emit)
+
+        end_time = time.time()  # Capture end time
+        runtime_seconds = end_time - start_time
+        minutes, seconds = divmod(runtime_seconds, 60)
+        self.log_message.emit(f"{file_name} completed in {int(minutes)} minutes and {int(seconds)} seconds.")
+        self.log_message.emit(
+            f"{file_name}: {result['input_polygons']:,} -> {format_outputs(result)} polygons, "
+            + ", ".join(f"{stage} {seconds:.1f}s" for stage, seconds in result['stage_timings'].items())
+        )
+        return result
 
     def browse_directory(self):
         directory = QFileDialog.getExistingDirectory(self, 'Select a directory', os.getenv('HOME'))
         if directory:
             self.directory_entry.setText(directory)
-            self.file_list.clear()
             stl_files = [f for f in os.listdir(directory) if f.endswith('.stl')]
-            for file in stl_files:
-                item = QListWidgetItem(file)
-                filename=os.path.basename(file)
-                item.setData(Qt.UserRole, filename)  # Store the original filename
-                self.file_list.addItem(item)
-                item.setCheckState(Qt.Checked)
-                self.file_list.addItem(item)
+            self.file_model.set_files(stl_files)
+            self.start_indexing(directory, stl_files)
             self.apply_button.setEnabled(True)
             self.select_all_button.setEnabled(True)
             self.deselect_all_button.setEnabled(True)
@@ -326,14 +441,10 @@ class MeshProcessorApp(QWidget):
         self.window.mainloop()
 
     def select_all(self):
-        for index in range(self.file_list.count()):
-            item = self.file_list.item(index)
-            item.setCheckState(Qt.Checked)
+        self.file_model.set_all_checked(True)
 
     def deselect_all(self):
-        for index in range(self.file_list.count()):
-            item = self.file_list.item(index)
-            item.setCheckState(Qt.Unchecked)
+        self.file_model.set_all_checked(False)
 
     def set_dark_theme(self):
         dark_palette = QPalette()
@@ -353,7 +464,7 @@ class MeshProcessorApp(QWidget):
         QApplication.instance().setPalette(dark_palette)
         QApplication.instance().setStyleSheet("""
             QToolTip { color: #ffffff; background-color: #2a82da; border: 1px solid white; }
-            QListWidget { color: #ffffff; }
+            QListView { color: #ffffff; }
             QPushButton { background-color: #353535; color: #ffffff; }
             QLineEdit { background-color: #353535; color: #ffffff; }
         """)
@@ -0,0 +1,73 @@
+"""Tiered preview images of STL files (a quick thumbnail, then full size), cached on disk."""
+import hashlib
+import json
+import os
+
+import preview_renderer
+from disk_cache import DiskCache
+
+DEFAULT_CACHE_DIRECTORY = os.path.join(os.path.expanduser('~'), '.cache', 'ModelEnhancer', 'previews')
+DEFAULT_MAX_BYTES = 256 * 1024 ** 2
+
+# Tier name -> (width, height, proxy grid cells or None for the whole mesh), in display order
+TIERS = {
+    'thumbnail': (160, 90, 160),
+    'full': (preview_renderer.PREVIEW_WIDTH, preview_renderer.PREVIEW_HEIGHT, None),
+}
+
+
+class PreviewCache:
+    """Rendered previews keyed by file version (path, size, mtime_ns) and view parameters."""
+
+    def __init__(self, directory=DEFAULT_CACHE_DIRECTORY, max_bytes=DEFAULT_MAX_BYTES):
+        self.store = DiskCache(directory, max_bytes)
+
+    @staticmethod
+    def file_version(filepath):
+        stat = os.stat(filepath)
+        return [os.path.abspath(filepath), stat.st_size, stat.st_mtime_ns]
+
+    def key(self, filepath, tier, camera_file_path=None):
+        """Cache key of one tier of a preview; `camera_file_path` is the mesh the camera was fitted to, if another."""
+        width, height, proxy_cells = TIERS[tier]
+        description = json.dumps({
+            'mesh': self.file_version(filepath),
+            'camera': self.file_version(camera_file_path) if camera_file_path is not None else None,
+            'width': width,
+            'height': height,
+            'proxy_cells': proxy_cells,
+            'version': preview_renderer.PREVIEW_VERSION,
+        }, sort_keys=True)
+        return hashlib.blake2b(description.encode(), digest_size=20).hexdigest() + '.png'
+
+    def cached(self, filepath, tier, camera_file_path=None):
+        """Path of the cached PNG, or None when this tier has not been rendered yet."""
+        return self.store.get(self.key(filepath, tier, camera_file_path))
+
+    def preview(self, filepath, tier, camera_file_path=None):
+        """Path of the PNG of one tier, rendering and storing it on a miss."""
+        key = self.key(filepath, tier, camera_file_path)
+        path = self.store.get(key)
+        if path is None:
+            width, height, proxy_cells = TIERS[tier]
+            image = preview_renderer.render_view(filepath, width, height, camera_file_path, proxy_cells)
+            path = self.store.put_bytes(key, preview_renderer.encode_png(image))
+        return path
+
+    def previews(self, original, processed=None, is_current=lambda: True):
+        """
+        Yield (tier, original PNG, processed PNG or None) from the coarsest uncached tier up, while `is_current()`.
+        """
+        if not is_current():
+            return
+        tiers = list(TIERS)
+        for index in range(len(tiers) - 1, 0, -1):
+            if self.cached(original, tiers[index]) is not None and (
+                    processed is None or self.cached(processed, tiers[index], original) is not None):
+                tiers = tiers[index:]
+                break
+        for tier in tiers:
+            if not is_current():
+                return
+            before = self.preview(original, tier)
+            yield tier, before, self.preview(processed, tier, original) if processed is not None else None
@@ -0,0 +1,204 @@
+"""Software preview renders of STL files, framed and lit like render_stl.BLENDER_RENDER."""
+import math
+import struct
+import zlib
+from collections import namedtuple
+
+import numpy as np
+
+import stl_io
+
+PREVIEW_WIDTH = 640
+PREVIEW_HEIGHT = 360
+# Field of view of Blender's default 50 mm lens on its 36 mm sensor, across the wider image side
+FIELD_OF_VIEW = 2 * math.atan(18 / 50)
+# Unit vector towards the sun
+SUN_DIRECTION = np.array([0.0, 0.0, 1.0])
+# Linear reflectance of the material and the light reaching it
+BASE_COLOR = 0.8
+SUN_STRENGTH = 0.75
+AMBIENT = 0.05
+# Linear RGB of the world background
+BACKGROUND = (0.05, 0.05, 0.05)
+# Gap between the two halves of a side-by-side image, in pixels
+SIDE_BY_SIDE_GAP = 4
+# Candidate pixels tested per rasterization step; bounds the temporaries at a few tens of MB
+MAX_SAMPLES = 1 << 21
+# Bumped whenever renders change their look, so cached previews are drawn again
+PREVIEW_VERSION = '1'
+
+# Perspective camera above the mesh: (x, y) of its axis, its height and the
+# tangents of the half field of view across and up the image
+Camera = namedtuple('Camera', ['center_x', 'center_y', 'height', 'tan_x', 'tan_y'])
+
+
+def fit_camera(triangles, width=PREVIEW_WIDTH, height=PREVIEW_HEIGHT, field_of_view=FIELD_OF_VIEW):
+    """Lowest camera over the bounding box centre that sees every corner, like camera_to_view_selected."""
+    points = np.asarray(triangles, dtype=np.float64).reshape(-1, 3)
+    low, high = points.min(axis=0), points.max(axis=0)
+    center = (low + high) / 2
+    tan_half = math.tan(field_of_view / 2)
+    # Blender's automatic sensor fit spans the field of view across the wider side
+    if width >= height:
+        tan_x, tan_y = tan_half, tan_half * height / width
+    else:
+        tan_x, tan_y = tan_half * width / height, tan_half
+    camera_height = max(
+        (points[:, 2] + np.abs(points[:, 0] - center[0]) / tan_x).max(),
+        (points[:, 2] + np.abs(points[:, 1] - center[1]) / tan_y).max(),
+        # Keep the nearest corner in front of the camera for flat meshes
+        high[2] + 1e-3 * max(float(np.linalg.norm(high - low)), 1e-9),
+    )
+    return Camera(center[0], center[1], camera_height, tan_x, tan_y)
+
+
+def _shade(triangles, camera):
+    """Per-face linear intensity, and a mask of the faces turned towards the camera."""
+    normals = stl_io.face_normals(triangles)
+    eye = np.array([camera.center_x, camera.center_y, camera.height])
+    facing = np.einsum('ij,ij->i', normals, eye - triangles.mean(axis=1)) > 0
+    lambert = np.clip(normals @ SUN_DIRECTION, 0.0, None)
+    return BASE_COLOR * (AMBIENT + SUN_STRENGTH * lambert), facing
+
+
+def _project(triangles, camera, width, height):
+    """Pixel coordinates (n, 3, 2) and inverse depth (n, 3) of every corner."""
+    depth = camera.height - triangles[..., 2]
+    x = (triangles[..., 0] - camera.center_x) / (depth * camera.tan_x)
+    y = (triangles[..., 1] - camera.center_y) / (depth * camera.tan_y)
+    screen = np.stack([(x + 1) * (width / 2), (1 - y) * (height / 2)], axis=-1)
+    return screen, 1.0 / depth
+
+
+def rasterize(screen, inverse_depth, width, height):
+    """Index of the nearest face at each pixel centre, -1 where there is none."""
+    depth_buffer = np.zeros(width * height)
+    face_buffer = np.full(width * height, -1, dtype=np.int64)
+    low = np.floor(screen.min(axis=1)).astype(np.int64)
+    high = np.ceil(screen.max(axis=1)).astype(np.int64)
+    low = np.clip(low, 0, [width - 1, height - 1])
+    high = np.clip(high, 0, [width - 1, height - 1])
+    # Edge function coefficients: w_i(p) = a_i * px + b_i * py + c_i, scaled so the three sum to 1
+    start, end = screen[:, [1, 2, 0]], screen[:, [2, 0, 1]]
+    a = start[..., 1] - end[..., 1]
+    b = end[..., 0] - start[..., 0]
+    c = start[..., 0] * end[..., 1] - end[..., 0] * start[..., 1]
+    area = c.sum(axis=1)
+    valid = np.abs(area) > 1e-12
+    a, b, c = (coefficient[valid] / area[valid, None] for coefficient in (a, b, c))
+    faces = np.flatnonzero(valid)
+    low, high, inverse_depth = low[valid], high[valid], inverse_depth[valid]
+    levels = np.ceil(np.log2(np.maximum((high - low).max(axis=1) + 1, 1))).astype(np.int64)
+    for level in np.unique(levels):
+        side = 1 << int(level)
+        offset_y, offset_x = np.divmod(np.arange(side * side), side)
+        members = np.flatnonzero(levels == level)
+        for batch in np.array_split(members, max(1, len(members) * side * side // MAX_SAMPLES)):
+            px = low[batch, 0, None] + offset_x
+            py = low[batch, 1, None] + offset_y
+            centre_x, centre_y = px + 0.5, py + 0.5
+            weights = (a[batch, :, None] * centre_x[:, None] + b[batch, :, None] * centre_y[:, None]
+                       + c[batch, :, None])
+            inside = (weights >= 0).all(axis=1) & (px <= high[batch, 0, None]) & (py <= high[batch, 1, None])
+            depth = np.einsum('nkp,nk->np', weights, inverse_depth[batch])
+            pixel = (py * width + px)[inside]
+            depth = depth[inside]
+            face = np.broadcast_to(faces[batch, None], inside.shape)[inside]
+            np.maximum.at(depth_buffer, pixel, depth)
+            nearest = depth >= depth_buffer[pixel]
+            face_buffer[pixel[nearest]] = face[nearest]
+    return face_buffer.reshape(height, width)
+
+
+def to_srgb(linear):
+    linear = np.clip(linear, 0.0, 1.0)
+    return np.where(linear <= 0.0031308, 12.92 * linear, 1.055 * linear ** (1 / 2.4) - 0.055)
+
+
+def render_triangles(triangles, width=PREVIEW_WIDTH, height=PREVIEW_HEIGHT, camera=None):
+    """Render (n, 3, 3) corners to an (height, width, 3) uint8 RGB image; the camera is fitted when not given."""
+    triangles = np.asarray(triangles, dtype=np.float64)
+    if camera is None:
+        camera = fit_camera(triangles, width, height)
+    intensity, facing = _shade(triangles, camera)
+    visible = np.flatnonzero(facing)
+    screen, inverse_depth = _project(triangles[visible], camera, width, height)
+    face_at = rasterize(screen, inverse_depth, width, height)
+    colors = np.empty((len(visible) + 1, 3))
+    colors[:-1] = intensity[visible, None]
+    # Index -1 (no face) picks the background from the last row
+    colors[-1] = BACKGROUND
+    return (to_srgb(colors[face_at]) * 255 + 0.5).astype(np.uint8)
+
+
+def simplify_triangles(triangles, cells):
+    """Vertex-clustered proxy of a mesh on a grid of `cells` cells along its longest side, for small renders."""
+    triangles = np.asarray(triangles)
+    points = triangles.reshape(-1, 3)
+    # Column by column; a reduction across the short axis of an (n, 3) array is several times slower
+    low = np.array([points[:, axis].min() for axis in range(3)], dtype=np.float64)
+    high = np.array([points[:, axis].max() for axis in range(3)], dtype=np.float64)
+    cell_size = max(float((high - low).max()) / cells, 1e-12)
+    snapped = ((triangles - low.astype(triangles.dtype)) * (1 / cell_size)).astype(np.int64)
+    # One integer per corner cell (21 bits per axis), so collapsed triangles are found with 1-D compares
+    cell = (snapped[..., 0] << 42) | (snapped[..., 1] << 21) | snapped[..., 2]
+    kept = (cell[:, 0] != cell[:, 1]) & (cell[:, 1] != cell[:, 2]) & (cell[:, 2] != cell[:, 0])
+    # Cluster means over the kept corners only, a small fraction of the mesh
+    corners = np.asarray(triangles[kept], dtype=np.float64).reshape(-1, 3)
+    clusters, cluster_of = np.unique(cell[kept].ravel(), return_inverse=True)
+    counts = np.bincount(cluster_of, minlength=len(clusters))
+    means = np.stack([np.bincount(cluster_of, corners[:, axis], len(clusters)) for axis in range(3)], axis=1)
+    return (means / counts[:, None])[cluster_of.reshape(-1, 3)]
+
+
+def render_view(stl_file_path, width=PREVIEW_WIDTH, height=PREVIEW_HEIGHT, camera_file_path=None, proxy_cells=None):
+    """Image of one STL, with the camera fitted to `camera_file_path` when given."""
+    def load(filepath):
+        triangles = stl_io.read_triangles(filepath)
+        if proxy_cells is not None:
+            return simplify_triangles(triangles, proxy_cells)
+        return np.asarray(triangles, dtype=np.float64)
+
+    triangles = load(stl_file_path)
+    camera = fit_camera(triangles if camera_file_path is None else load(camera_file_path), width, height)
+    return render_triangles(triangles, width, height, camera)
+
+
+def encode_png(image):
+    """An (height, width, 3) uint8 RGB image as the bytes of an 8-bit PNG."""
+    height, width, _ = image.shape
+    # Filter type 0 (None) in front of every row
+    rows = np.concatenate([np.zeros((height, 1), dtype=np.uint8), image.reshape(height, width * 3)], axis=1)
+
+    def chunk(kind, data):
+        return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data))
+
+    return (b'\x89PNG\r\n\x1a\n'
+            + chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0))
+            + chunk(b'IDAT', zlib.compress(rows.tobytes(), 6))
+            + chunk(b'IEND', b''))
+
+
+def write_png(filepath, image):
+    """Write an (height, width, 3) uint8 RGB image as an 8-bit PNG."""
+    with open(filepath, 'wb') as f:
+        f.write(encode_png(image))
+
+
+def render_stl(stl_file_path, output_image_path, width=PREVIEW_WIDTH, height=PREVIEW_HEIGHT):
+    """Same result dict as the Blender render task."""
+    write_png(output_image_path, render_triangles(stl_io.read_triangles(stl_file_path), width, height))
+    return {'output_path': output_image_path}
+
+
+def render_side_by_side(before_path, after_path, width=PREVIEW_WIDTH, height=PREVIEW_HEIGHT):
+    """
+    Before and after images of the same object through one camera, fitted to the
+    before mesh, so the two halves line up. Returns (before, after, combined) images.
+    """
+    before = np.asarray(stl_io.read_triangles(before_path), dtype=np.float64)
+    camera = fit_camera(before, width, height)
+    before_image = render_triangles(before, width, height, camera)
+    after_image = render_triangles(stl_io.read_triangles(after_path), width, height, camera)
+    gap = np.full((height, SIDE_BY_SIDE_GAP, 3), 255, dtype=np.uint8)
+    return before_image, after_image, np.concatenate([before_image, gap, after_image], axis=1)
@@ -0,0 +1,211 @@
+import asyncio
+import itertools
+import json
+import threading
+from collections import OrderedDict, deque
+
+from blender_script_utils import parse_result_line, parse_stage_line
+
+# Log lines kept per job, and how many jobs keep their logs
+LOG_BUFFER_LINES = 500
+LOG_BUFFER_JOBS = 200
+# Longest single line read from a child before it is cut into pieces
+STREAM_LIMIT = 16 * 1024 * 1024
+# Grace period for a worker asked to shut down before it is killed
+STOP_TIMEOUT = 30
+
+
+class WorkerCrashedError(RuntimeError):
+    pass
+
+
+class JobTimeoutError(RuntimeError):
+    pass
+
+
+class SupervisedProcess:
+    """A child process whose stdout and stderr are drained by the supervisor's event loop."""
+
+    def __init__(self, supervisor, process, output_callback=None, stage_callback=None):
+        self.supervisor = supervisor
+        self.process = process
+        self.output_callback = output_callback
+        self.stage_callback = stage_callback
+        self.job_id = None
+        self.results = asyncio.Queue()
+        self.readers = [
+            asyncio.ensure_future(self._drain(process.stdout, is_stdout=True)),
+            asyncio.ensure_future(self._drain(process.stderr, is_stdout=False)),
+        ]
+
+    @property
+    def returncode(self):
+        return self.process.returncode
+
+    async def _drain(self, stream, is_stdout):
+        while True:
+            try:
+                raw = await stream.readline()
+            except ValueError:
+                # Over STREAM_LIMIT; keep whatever part of it is buffered
+                raw = await stream.read(STREAM_LIMIT)
+            if not raw:
+                break
+            self._handle_line(raw.decode('utf-8', errors='replace').rstrip('\r\n'), is_stdout)
+        if is_stdout:
+            # Tells a waiting request that no result can come any more
+            self.results.put_nowait(None)
+
+    def _handle_line(self, line, is_stdout):
+        if is_stdout:
+            result = parse_result_line(line)
+            if result is not None:
+                self.results.put_nowait(result)
+                return
+            stage = parse_stage_line(line)
+            if stage is not None:
+                if self.stage_callback is not None:
+                    self.stage_callback(stage)
+                return
+        if line.strip():
+            self.supervisor.log(self.job_id, line)
+            if self.output_callback is not None:
+                self.output_callback(line.strip())
+
+    async def request(self, job_id, payload):
+        """Send one JSON job line to a long-lived worker and wait for the result with the same id."""
+        self.job_id = job_id
+        self.process.stdin.write((json.dumps(payload) + '\n').encode())
+        await self.process.stdin.drain()
+        while True:
+            result = await self.results.get()
+            if result is None:
+                returncode = await self.process.wait()
+                raise WorkerCrashedError(f"Worker exited with code {returncode} during job {job_id}")
+            if result.get('id') == job_id:
+                return result
+
+    async def finish(self):
+        """Wait for a one-shot process to exit; returns its last result dict or None."""
+        await self.process.wait()
+        await asyncio.gather(*self.readers)
+        result = None
+        while not self.results.empty():
+            result = self.results.get_nowait() or result
+        return result
+
+    async def kill(self):
+        if self.process.returncode is None:
+            self.process.kill()
+        await self.process.wait()
+        await asyncio.gather(*self.readers, return_exceptions=True)
+
+    async def stop(self):
+        try:
+            self.process.stdin.write((json.dumps({'task': 'shutdown'}) + '\n').encode())
+            await self.process.stdin.drain()
+            self.process.stdin.close()
+            await asyncio.wait_for(self.process.wait(), STOP_TIMEOUT)
+        except (OSError, asyncio.TimeoutError):
+            pass
+        await self.kill()
+
+
+class ProcessSupervisor:
+    """
+    One event loop, on one background thread, that starts and watches every
+    Blender child process: long-lived pool workers and one-shot scripts alike.
+    """
+
+    def __init__(self, log_lines=LOG_BUFFER_LINES, log_jobs=LOG_BUFFER_JOBS):
+        self.log_lines = log_lines
+        self.log_jobs = log_jobs
+        self.loop = None
+        self._thread = None
+        self._logs = OrderedDict()
+        self._logs_lock = threading.Lock()
+        self._job_ids = itertools.count(1)
+        self._start_lock = threading.Lock()
+
+    def start(self):
+        with self._start_lock:
+            if self.loop is None:
+                self.loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(target=self.loop.run_forever, name='process-supervisor', daemon=True)
+                self._thread.start()
+        return self
+
+    def submit(self, coroutine):
+        """Schedule a coroutine on the supervisor loop; returns a concurrent.futures.Future."""
+        self.start()
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop)
+
+    def call_soon(self, callback, *args):
+        self.start()
+        self.loop.call_soon_threadsafe(callback, *args)
+
+    def new_job_id(self):
+        return next(self._job_ids)
+
+    async def spawn(self, command, output_callback=None, stage_callback=None):
+        process = await asyncio.create_subprocess_exec(
+            *command, stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE, limit=STREAM_LIMIT
+        )
+        return SupervisedProcess(self, process, output_callback, stage_callback)
+
+    def run(self, command, timeout=None, output_callback=None, stage_callback=None):
+        """Run a one-shot command that reports a RESULT_PREFIX line; returns a Future of its result dict."""
+        return self.submit(self._run(command, timeout, output_callback, stage_callback))
+
+    async def _run(self, command, timeout, output_callback, stage_callback):
+        child = await self.spawn(command, output_callback, stage_callback)
+        child.job_id = self.new_job_id()
+        try:
+            result = await asyncio.wait_for(child.finish(), timeout)
+        except asyncio.TimeoutError:
+            await child.kill()
+            result = {'status': 'error', 'error': f"Killed after running for more than {timeout} seconds"}
+        else:
+            if result is None:
+                result = {'status': 'error',
+                          'error': f"Blender exited with code {child.returncode} before reporting a result"}
+            elif child.returncode != 0 and result['status'] == 'ok':
+                result = {'status': 'error', 'error': f"Blender exited with code {child.returncode}"}
+        result['returncode'] = child.returncode
+        result['job_id'] = child.job_id
+        return result
+
+    def log(self, job_id, line):
+        with self._logs_lock:
+            lines = self._logs.get(job_id)
+            if lines is None:
+                lines = self._logs[job_id] = deque(maxlen=self.log_lines)
+                while len(self._logs) > self.log_jobs:
+                    self._logs.popitem(last=False)
+            lines.append(line)
+
+    def logs(self, job_id):
+        """The last `log_lines` lines a job wrote to stdout or stderr."""
+        with self._logs_lock:
+            return list(self._logs.get(job_id, ()))
+
+    def shutdown(self):
+        if self.loop is not None:
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self._thread.join()
+            self.loop.close()
+            self.loop = None
+
+
+_default_supervisor = None
+_default_lock = threading.Lock()
+
+
+def default_supervisor():
+    """The process-wide supervisor shared by every pool and one-shot script."""
+    global _default_supervisor
+    with _default_lock:
+        if _default_supervisor is None:
+            _default_supervisor = ProcessSupervisor().start()
+        return _default_supervisor
@@ -0,0 +1,101 @@
+import os
+
+from job_scheduler import estimate_job_cost
+
+# Engines the GUI and command line can run the pipeline on
+ENGINES = ('blender', 'native')
+
+# Rough peak-memory model per engine, used for admission control:
+# a fixed process overhead, bytes per triangle of the imported scan and bytes
+# per triangle of the subdivided mesh. Native numbers come from tracemalloc
+# runs of mesh_engine; Blender's are deliberately generous guesses for its
+# mesh plus modifier stack and are worth tuning against observed RSS.
+MEMORY_PROFILES = {
+    'blender': {'base': 400 * 1024 ** 2, 'per_input_triangle': 800, 'per_working_triangle': 600},
+    'native': {'base': 150 * 1024 ** 2, 'per_input_triangle': 1000, 'per_working_triangle': 300},
+}
+# BLENDER_PIPELINE builds its working mesh from these, whatever the target and subdivision levels
+# in the parameters say; only its final decimation uses the target
+BLENDER_INITIAL_DECIMATION_TARGET = 250000
+BLENDER_SUBDIVISION_LEVELS = 1
+
+
+def create_worker_pool(engine, size, output_callback=None, stage_callback=None, job_timeout=None):
+    """Return a started pool with a submit(task, **args) -> Future interface for `engine`."""
+    if engine == 'blender':
+        from blender_worker_pool import BlenderWorkerPool
+        return BlenderWorkerPool(
+            size, output_callback=output_callback, stage_callback=stage_callback, job_timeout=job_timeout
+        ).start()
+    if engine == 'native':
+        # Imported lazily so Blender-only installs do not need NumPy or trimesh
+        from mesh_engine import NativeEnginePool
+        return NativeEnginePool(size, output_callback=output_callback, stage_callback=stage_callback).start()
+    raise ValueError(f"Unknown engine '{engine}', expected one of {', '.join(ENGINES)}")
+
+
+def engine_version(engine):
+    """Version string that changes whenever `engine` would produce different output for the same input."""
+    if engine == 'blender':
+        from blender_script_utils import PIPELINE_VERSION
+        return PIPELINE_VERSION
+    if engine == 'native':
+        from mesh_engine import ENGINE_VERSION
+        return ENGINE_VERSION
+    raise ValueError(f"Unknown engine '{engine}', expected one of {', '.join(ENGINES)}")
+
+
+def estimate_job_memory(filepath, params, engine):
+    """Estimated peak bytes of processing `filepath`: the larger of the imported and the subdivided mesh."""
+    profile = MEMORY_PROFILES[engine]
+    input_triangles = estimate_job_cost(filepath)
+    if engine == 'blender':
+        target, levels = BLENDER_INITIAL_DECIMATION_TARGET, BLENDER_SUBDIVISION_LEVELS
+    else:
+        target, levels = params['target_polygon_count'], params['subdivision_levels']
+    working_triangles = min(input_triangles, target) * 4 ** max(levels, 0)
+    return profile['base'] + max(
+        input_triangles * profile['per_input_triangle'],
+        working_triangles * profile['per_working_triangle'],
+    )
+
+
+def output_filenames(filename, targets):
+    """Output names for one input, one per target; BLENDER_PIPELINE has its own copy of this rule."""
+    if len(targets) == 1:
+        return ["processed_" + filename]
+    stem = os.path.splitext(filename)[0]
+    return [f"processed_{stem}_{target}.stl" for target in targets]
+
+
+def format_outputs(result):
+    """Polygon counts of every output, e.g. '250,000 / 12,896 (over its target of 5,000)'."""
+    return " / ".join(
+        f"{output['output_polygons']:,}" + (f" (over its target of {output['target']:,})"
+                                             if output.get('over_target') else "")
+        for output in result['outputs']
+    )
+
+
+def run_pipeline_job(pool, engine, filepath, output_directory, params, cache=None, log_callback=print):
+    """
+    Process one file on `pool` and return its result dict; raises RuntimeError when the job fails.
+    With a ResultCache, unchanged inputs and settings reuse the stored outputs instead.
+    """
+    filename = os.path.basename(filepath)
+    if cache is not None:
+        key = cache.key(filepath, params, engine)
+        result = cache.fetch(key, output_directory, filename)
+        if result is not None:
+            log_callback(f'{filename}: unchanged input and settings, reused the cached result')
+            return result
+    # Hand the job to one of the engine's long-lived workers and wait for its result
+    result = pool.submit(
+        'process', filepath=filepath, directory_path=output_directory, filename=filename, **params
+    ).result()
+    if result['status'] != 'ok':
+        log_callback(result.get('error', ''))
+        raise RuntimeError(f"Processing failed for {filename}")
+    if cache is not None:
+        cache.save(key, result)
+    return result
@@ -0,0 +1,373 @@
+import itertools
+import os
+import sys
+import time
+
+import numpy as np
+
+# Share of the cheapest collapsible edges considered in each round
+CANDIDATE_FRACTION = 0.25
+# Selection passes per round; later passes fill the gaps left by skipped edges
+SELECTION_PASSES = 4
+# Weight of the planes through boundary edges, square of the edge length times this, which
+# keeps collapses along an open boundary from pulling it out of shape
+BOUNDARY_WEIGHT = 100.0
+
+
+# Upper-triangle entries of a symmetric 4x4 quadric, stored as 10 columns
+QUADRIC_ENTRIES = [(0, 0), (0, 1), (0, 2), (0, 3), (1, 1), (1, 2), (1, 3), (2, 2), (2, 3), (3, 3)]
+
+
+def face_quadrics(vertices, faces):
+    """Area-weighted plane quadrics of every face, accumulated per vertex into packed (n, 10) form."""
+    corners = vertices[faces]
+    normals = np.cross(corners[:, 1] - corners[:, 0], corners[:, 2] - corners[:, 0])
+    double_area = np.linalg.norm(normals, axis=1)
+    valid = double_area > 0
+    unit = np.zeros_like(normals)
+    unit[valid] = normals[valid] / double_area[valid, None]
+    planes = np.concatenate([unit, -np.einsum('ij,ij->i', unit, corners[:, 0])[:, None]], axis=1)
+    weights = 0.5 * double_area
+    quadrics = np.empty((len(vertices), len(QUADRIC_ENTRIES)))
+    # One bincount per entry is much faster than np.add.at on the whole array
+    corner_index = faces.ravel()
+    for column, (i, j) in enumerate(QUADRIC_ENTRIES):
+        entry = np.repeat(weights * planes[:, i] * planes[:, j], 3)
+        quadrics[:, column] = np.bincount(corner_index, weights=entry, minlength=len(vertices))
+    return quadrics
+
+
+def boundary_quadrics(vertices, faces, quadrics):
+    """Add to `quadrics` the plane through every boundary edge, perpendicular to its face."""
+    sides = faces[:, [0, 1, 1, 2, 2, 0]].reshape(-1, 2)
+    ordered = np.sort(sides, axis=1)
+    _, side_edge, counts = np.unique(
+        ordered[:, 0] * len(vertices) + ordered[:, 1], return_inverse=True, return_counts=True
+    )
+    open_sides = counts[side_edge] == 1
+    if not open_sides.any():
+        return quadrics
+    corners = vertices[faces]
+    face_normals = np.repeat(np.cross(corners[:, 1] - corners[:, 0], corners[:, 2] - corners[:, 0]), 3, axis=0)
+    a, b = sides[open_sides, 0], sides[open_sides, 1]
+    direction = vertices[b] - vertices[a]
+    normals = np.cross(direction, face_normals[open_sides])
+    length = np.linalg.norm(normals, axis=1)
+    valid = length > 0
+    unit = np.zeros_like(normals)
+    unit[valid] = normals[valid] / length[valid, None]
+    planes = np.concatenate([unit, -np.einsum('ij,ij->i', unit, vertices[a])[:, None]], axis=1)
+    weights = BOUNDARY_WEIGHT * np.einsum('ij,ij->i', direction, direction)
+    corner_index = np.concatenate([a, b])
+    for column, (i, j) in enumerate(QUADRIC_ENTRIES):
+        entry = np.tile(weights * planes[:, i] * planes[:, j], 2)
+        quadrics[:, column] += np.bincount(corner_index, weights=entry, minlength=len(vertices))
+    return quadrics
+
+
+def quadric_error(q, position):
+    """Evaluate packed quadrics at homogeneous points (x, y, z, 1)."""
+    x, y, z = position[:, 0], position[:, 1], position[:, 2]
+    return (
+        x * (q[:, 0] * x + 2 * (q[:, 1] * y + q[:, 2] * z + q[:, 3]))
+        + y * (q[:, 4] * y + 2 * (q[:, 5] * z + q[:, 6]))
+        + z * (q[:, 7] * z + 2 * q[:, 8])
+        + q[:, 9]
+    )
+
+
+def unique_edges(faces, vertex_count):
+    """Unique undirected edges (a < b) and how many faces share each of them."""
+    edges = np.sort(faces[:, [0, 1, 1, 2, 2, 0]].reshape(-1, 2), axis=1)
+    keys = edges[:, 0].astype(np.int64) * vertex_count + edges[:, 1]
+    keys, counts = np.unique(keys, return_counts=True)
+    return np.stack([keys // vertex_count, keys % vertex_count], axis=1), counts
+
+
+def boundary_vertices(faces, vertex_count):
+    """Mask of vertices on open boundaries or non-manifold edges."""
+    edges, counts = unique_edges(faces, vertex_count)
+    mask = np.zeros(vertex_count, dtype=bool)
+    mask[edges[counts != 2].ravel()] = True
+    return mask
+
+
+def collapse_targets(quadrics, vertices, edges, locked, on_boundary=None):
+    """Best position and quadric error for collapsing each edge; boundary edges keep their point on the edge."""
+    a, b = edges[:, 0], edges[:, 1]
+    q = quadrics[a] + quadrics[b]
+    options = [vertices[a], vertices[b], 0.5 * (vertices[a] + vertices[b])]
+    # Closed-form solve of the symmetric 3x3 system, far cheaper than batched np.linalg calls
+    q00, q01, q02, q03, q11, q12, q13, q22, q23 = (q[:, column] for column in range(9))
+    c00 = q11 * q22 - q12 * q12
+    c01 = q02 * q12 - q01 * q22
+    c02 = q01 * q12 - q02 * q11
+    c11 = q00 * q22 - q02 * q02
+    c12 = q01 * q02 - q00 * q12
+    c22 = q00 * q11 - q01 * q01
+    determinant = q00 * c00 + q01 * c01 + q02 * c02
+    solvable = np.abs(determinant) > 1e-12 * np.maximum((q00 + q11 + q22) ** 3, 1e-300)
+    safe = np.where(solvable, determinant, 1.0)
+    optimal = np.stack([
+        -(c00 * q03 + c01 * q13 + c02 * q23) / safe,
+        -(c01 * q03 + c11 * q13 + c12 * q23) / safe,
+        -(c02 * q03 + c12 * q13 + c22 * q23) / safe,
+    ], axis=1)
+    optimal[~solvable] = options[2][~solvable]
+    edge_length = np.linalg.norm(vertices[a] - vertices[b], axis=1)
+    near = solvable & (np.linalg.norm(optimal - options[2], axis=1) <= edge_length)
+    options.append(np.where(near[:, None], optimal, options[2]))
+
+    costs = [quadric_error(q, position) for position in options[:3]]
+    if on_boundary is not None and on_boundary.any():
+        # Along the edge the error is a parabola through the endpoint and midpoint errors
+        start, end, middle = costs[0][on_boundary], costs[1][on_boundary], costs[2][on_boundary]
+        curvature = 2 * (end - 2 * middle + start)
+        slope = end - start - curvature
+        t = np.clip(-slope / (2 * np.where(curvature > 0, curvature, 1.0)), 0.0, 1.0)
+        t[curvature <= 0] = 0.5
+        options[3][on_boundary] = options[0][on_boundary] + t[:, None] * (
+            options[1][on_boundary] - options[0][on_boundary])
+    costs.append(quadric_error(q, options[3]))
+    costs = np.stack(costs, axis=1)
+    # Scanned from the last option so ties, as on flat regions, go to the optimum or midpoint
+    choice = len(options) - 1 - np.argmin(costs[:, ::-1], axis=1)
+    interior = np.ones(len(edges), dtype=bool) if on_boundary is None else ~on_boundary
+    choice[locked[b] & interior] = 1
+    choice[locked[a] & interior] = 0
+    rows = np.arange(len(edges))
+    targets = np.stack(options, axis=1)[rows, choice]
+    return targets, np.maximum(costs[rows, choice], 0.0)
+
+
+def select_independent(edges, ranks, faces, vertex_count):
+    """
+    Keep the edges whose rank is the lowest among all ranked edges touching
+    the faces around either endpoint, so no two kept edges share a face.
+    """
+    lowest = np.full(vertex_count, np.iinfo(np.int64).max)
+    np.minimum.at(lowest, edges[:, 0], ranks)
+    np.minimum.at(lowest, edges[:, 1], ranks)
+    corner_lowest = lowest[faces]
+    face_lowest = np.minimum(np.minimum(corner_lowest[:, 0], corner_lowest[:, 1]), corner_lowest[:, 2])
+    ring_lowest = np.full(vertex_count, np.iinfo(np.int64).max)
+    np.minimum.at(ring_lowest, faces.ravel(), np.repeat(face_lowest, 3))
+    return ranks == np.minimum(ring_lowest[edges[:, 0]], ring_lowest[edges[:, 1]])
+
+
+def link_condition(edges, all_edges, vertex_count, on_boundary=None):
+    """
+    An edge can collapse without creating non-manifold geometry only if its endpoints share
+    exactly two neighbours, or one for an edge along an open boundary (`on_boundary`).
+    """
+    directed = np.concatenate([all_edges, all_edges[:, ::-1]])
+    owner = np.full(vertex_count, -1)
+    other = np.full(vertex_count, -1)
+    index = np.arange(len(edges))
+    owner[edges[:, 0]] = index
+    owner[edges[:, 1]] = index
+    other[edges[:, 0]] = edges[:, 1]
+    other[edges[:, 1]] = edges[:, 0]
+    start = directed[:, 0]
+    keep = (owner[start] >= 0) & (directed[:, 1] != other[start])
+    pairs = owner[start[keep]].astype(np.int64) * vertex_count + directed[keep, 1]
+    pairs, counts = np.unique(pairs, return_counts=True)
+    common = np.bincount(pairs[counts == 2] // vertex_count, minlength=len(edges))
+    return common == (2 if on_boundary is None else np.where(on_boundary, 1, 2))
+
+
+def flips_faces(edges, targets, vertices, faces):
+    """Mask of edges whose collapse would turn any surviving neighbouring face over."""
+    owner = np.full(len(vertices), -1)
+    owner[edges[:, 0]] = np.arange(len(edges))
+    owner[edges[:, 1]] = np.arange(len(edges))
+    corner_owner = owner[faces]
+    face_owner = np.maximum(np.maximum(corner_owner[:, 0], corner_owner[:, 1]), corner_owner[:, 2])
+    touched = face_owner >= 0
+    local_faces = faces[touched]
+    face_owner = face_owner[touched]
+    moved = corner_owner[touched] >= 0
+    # Faces holding both endpoints disappear with the collapse and are not checked
+    surviving = moved.sum(axis=1) == 1
+    before = vertices[local_faces]
+    after = np.where(moved[..., None], targets[face_owner][:, None, :], before)
+    normal_before = np.cross(before[:, 1] - before[:, 0], before[:, 2] - before[:, 0])
+    normal_after = np.cross(after[:, 1] - after[:, 0], after[:, 2] - after[:, 0])
+    flipped = surviving & (np.einsum('ij,ij->i', normal_before, normal_after) <= 0)
+    bad = np.zeros(len(edges), dtype=bool)
+    bad[face_owner[flipped]] = True
+    return bad
+
+
+def choose_collapses(edges, targets, vertices, faces, all_edges, on_boundary, passes=SELECTION_PASSES):
+    """
+    Indices of valid, independent collapses among `edges`, which are sorted cheapest first.
+    `passes` limits the selection passes; None runs them until every edge has been tried.
+    """
+    vertex_count = len(vertices)
+    ranks = np.arange(len(edges), dtype=np.int64)
+    active = np.ones(len(edges), dtype=bool)
+    chosen = []
+    for _ in itertools.repeat(None) if passes is None else range(passes):
+        index = np.nonzero(active)[0]
+        if len(index) == 0:
+            break
+        selected = index[select_independent(edges[index], ranks[index], faces, vertex_count)]
+        valid = link_condition(edges[selected], all_edges, vertex_count, on_boundary[selected])
+        valid[valid] = ~flips_faces(edges[selected[valid]], targets[selected[valid]], vertices, faces)
+        active[selected] = False
+        accepted = selected[valid]
+        if len(accepted) == 0:
+            continue
+        chosen.append(accepted)
+        # Edges touching the faces around an accepted collapse must wait for the next round
+        touched = np.zeros(vertex_count, dtype=bool)
+        touched[edges[accepted].ravel()] = True
+        blocked = np.zeros(vertex_count, dtype=bool)
+        corner_touched = touched[faces]
+        blocked[faces[corner_touched[:, 0] | corner_touched[:, 1] | corner_touched[:, 2]].ravel()] = True
+        active &= ~(blocked[edges[:, 0]] | blocked[edges[:, 1]])
+    if not chosen:
+        return np.zeros(0, dtype=np.int64)
+    return np.sort(np.concatenate(chosen))
+
+
+def decimate(vertices, faces, target_polygon_count, locked=None, log_callback=None):
+    """
+    Quadric-error-metric edge-collapse decimation; returns compacted (vertices, faces).
+    Boundaries only collapse along themselves and `locked` vertices never move.
+    """
+    vertices = np.asarray(vertices, dtype=np.float64).copy()
+    faces = np.asarray(faces, dtype=np.int64)
+    faces = faces[(faces[:, 0] != faces[:, 1]) & (faces[:, 1] != faces[:, 2]) & (faces[:, 2] != faces[:, 0])]
+    vertex_count = len(vertices)
+    edges, counts = unique_edges(faces, vertex_count)
+    # Pinned vertices never move; boundary ones may only slide along boundary edges
+    pinned = np.zeros(vertex_count, dtype=bool)
+    pinned[edges[counts > 2].ravel()] = True
+    if locked is not None:
+        pinned |= np.asarray(locked, dtype=bool)
+    fixed = pinned.copy()
+    fixed[edges[counts == 1].ravel()] = True
+    quadrics = boundary_quadrics(vertices, faces, face_quadrics(vertices, faces))
+    fraction = CANDIDATE_FRACTION
+    # Costs carried over between rounds; only edges around moved vertices are recomputed
+    cached_keys = np.zeros(0, dtype=np.int64)
+    cached_targets = np.zeros((0, 3))
+    cached_costs = np.zeros(0)
+    moved = np.zeros(vertex_count, dtype=bool)
+
+    while len(faces) > target_polygon_count:
+        all_edges, counts = unique_edges(faces, vertex_count)
+        a, b = all_edges[:, 0], all_edges[:, 1]
+        along_boundary = (counts == 1) & ~pinned[a] & ~pinned[b]
+        movable = ((counts == 2) & ~(fixed[a] & fixed[b])) | along_boundary
+        candidates = all_edges[movable]
+        on_boundary = along_boundary[movable]
+        if len(candidates) == 0:
+            break
+        keys = candidates[:, 0] * vertex_count + candidates[:, 1]
+        position = np.minimum(np.searchsorted(cached_keys, keys), max(len(cached_keys) - 1, 0))
+        reuse = np.zeros(len(keys), dtype=bool)
+        if len(cached_keys):
+            reuse = (cached_keys[position] == keys) & ~moved[candidates[:, 0]] & ~moved[candidates[:, 1]]
+        # Orient every interior edge so the vertex that survives is in the second column
+        swap = fixed[candidates[:, 0]] & ~on_boundary
+        candidates[swap] = candidates[swap][:, ::-1]
+        targets = np.empty((len(candidates), 3))
+        costs = np.empty(len(candidates))
+        targets[reuse] = cached_targets[position[reuse]]
+        costs[reuse] = cached_costs[position[reuse]]
+        targets[~reuse], costs[~reuse] = collapse_targets(
+            quadrics, vertices, candidates[~reuse], fixed, on_boundary[~reuse]
+        )
+        cached_keys, cached_targets, cached_costs = keys, targets, costs
+        moved[:] = False
+
+        pool_size = min(len(candidates), max(1, int(len(candidates) * fraction)))
+        pool = np.argpartition(costs, pool_size - 1)[:pool_size] if pool_size < len(candidates) else np.arange(len(candidates))
+        pool = pool[np.argsort(costs[pool], kind='stable')]
+        chosen = choose_collapses(candidates[pool], targets[pool], vertices, faces, all_edges, on_boundary[pool])
+        if len(chosen) == 0 and pool_size < len(candidates):
+            fraction = min(1.0, fraction * 2)
+            continue
+        if len(chosen) == 0:
+            # On flat regions many free collapses would flip a face and can use up
+            # every pass before a valid one is reached
+            chosen = choose_collapses(
+                candidates[pool], targets[pool], vertices, faces, all_edges, on_boundary[pool], passes=None
+            )
+            if len(chosen) == 0:
+                break
+        fraction = CANDIDATE_FRACTION
+        chosen = pool[chosen]
+
+        # An interior collapse removes two faces, one along the boundary a single face;
+        # chosen is ordered by cost
+        removed_faces = np.cumsum(np.where(on_boundary[chosen], 1, 2))
+        chosen = np.sort(chosen[:np.searchsorted(removed_faces, len(faces) - target_polygon_count) + 1])
+        removed, kept = candidates[chosen, 0], candidates[chosen, 1]
+        vertices[kept] = targets[chosen]
+        quadrics[kept] += quadrics[removed]
+        moved[kept] = True
+        remap = np.arange(vertex_count)
+        remap[removed] = kept
+        faces = remap[faces]
+        faces = faces[(faces[:, 0] != faces[:, 1]) & (faces[:, 1] != faces[:, 2]) & (faces[:, 2] != faces[:, 0])]
+        if log_callback is not None:
+            log_callback(f"Collapsed {len(chosen)} edges, {len(faces)} faces left")
+
+    if len(faces) > target_polygon_count and log_callback is not None:
+        log_callback(f"No valid collapses left at {len(faces)} faces, above the target of {target_polygon_count}")
+    used = np.unique(faces)
+    compact = np.full(vertex_count, -1)
+    compact[used] = np.arange(len(used))
+    return vertices[used], compact[faces]
+
+
+BLENDER_DECIMATE_BENCHMARK = r"""
+import bpy
+import sys
+import time
+bpy.ops.object.select_all(action='SELECT')
+bpy.ops.object.delete()
+bpy.ops.import_mesh.stl(filepath=sys.argv[-2])
+obj = bpy.context.active_object
+faces_before = len(obj.data.polygons)
+start_time = time.time()
+bpy.ops.object.modifier_add(type='DECIMATE')
+obj.modifiers["Decimate"].ratio = int(sys.argv[-1]) / faces_before
+bpy.ops.object.modifier_apply(modifier="Decimate")
+elapsed = time.time() - start_time
+print("@@BENCH", faces_before - len(obj.data.polygons), elapsed, flush=True)
+"""
+
+
+def benchmark(filepath, target_polygon_count, blender_executable='blender'):
+    """Print faces collapsed per second for this decimator and, when Blender is installed, the Decimate modifier."""
+    import shutil
+    import subprocess
+    import trimesh
+
+    mesh = trimesh.load(filepath, file_type='stl', force='mesh', process=True)
+    start_time = time.time()
+    _, faces = decimate(mesh.vertices, mesh.faces, target_polygon_count)
+    elapsed = time.time() - start_time
+    collapsed = len(mesh.faces) - len(faces)
+    print(f"QEM decimate: {len(mesh.faces)} -> {len(faces)} faces in {elapsed:.2f}s, {collapsed / elapsed:,.0f} faces/s")
+
+    if shutil.which(blender_executable) is None:
+        print("Blender not found, skipping the Decimate modifier comparison")
+        return
+    command = [blender_executable, '--background', '--python-expr', BLENDER_DECIMATE_BENCHMARK,
+               '--', os.path.abspath(filepath), str(target_polygon_count)]
+    output = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True).stdout
+    for line in output.splitlines():
+        if line.startswith('@@BENCH'):
+            collapsed, elapsed = int(line.split()[1]), float(line.split()[2])
+            print(f"Blender Decimate: {collapsed} faces removed in {elapsed:.2f}s, {collapsed / elapsed:,.0f} faces/s")
+
+
+if __name__ == '__main__':
+    # python qem_decimate.py scan.stl 250000
+    benchmark(sys.argv[1], int(sys.argv[2]) if len(sys.argv) > 2 else 250000)
@@ -1,22 +1,32 @@
-import subprocess
-import threading
 import os
 
-def generate_blender_script(file, output_image_path):
-    safe_stlpath = file.replace('\\', '\\\\')
-    safe_imagepath = output_image_path.replace('\\', '\\\\')
+from blender_script_utils import RESULT_REPORTER, run_script_process
 
-    blender_script = f"""
+# Blender-side render, shared by the one-shot script and the worker pool.
+BLENDER_RENDER = r"""
 import bpy
+import json
+import os
+import time
 from mathutils import Vector
 
-def set_camera_and_light(obj):
+def set_camera_and_light():
     # Set camera
     cam_data = bpy.data.cameras.new(name='Camera')
     cam = bpy.data.objects.new('Camera', cam_data)
     bpy.context.collection.objects.link(cam)
     bpy.context.scene.camera = cam
 
+    # Set light
+    light_data = bpy.data.lights.new(name="Light", type='SUN')
+    light = bpy.data.objects.new(name="Light", object_data=light_data)
+    bpy.context.collection.objects.link(light)
+    light.location = (5, -5, 5)
+    light_data.energy = 2  # Increase light intensity
+    return cam
+
+
+def fit_camera(cam, obj):
     # Fit camera to object
     bpy.context.view_layer.objects.active = cam
     cam.select_set(True)
@@ -25,87 +35,152 @@ def set_camera_and_light(obj):
     cam.select_set(False)
     obj.select_set(False)
 
-    # Set light
-    light_data = bpy.data.lights.new(name="Light", type='SUN')
-    light = bpy.data.objects.new(name="Light", object_data=light_data)
-    bpy.context.collection.objects.link(light)
-    light.location = (5, -5, 5)
-    light_data.energy = 2  # Increase light intensity
 
+def create_material():
+    # Create a new material
+    mat = bpy.data.materials.new(name="Material")
+    mat.use_nodes = True
+    bsdf = mat.node_tree.nodes.get("Principled BSDF")
+    assert bsdf is not None
+    # Set the material color (can be adjusted)
+    bsdf.inputs['Base Color'].default_value = (0.8, 0.8, 0.8, 1)  # Light grey
+    bsdf.inputs['Roughness'].default_value = 0.5  # Adjust for different surface characteristics
+    bsdf.inputs['Specular'].default_value = 0.5  # Adjust for specular highlights
+    # Enable backface culling
+    mat.use_backface_culling = True
+    return mat
+
+
+def setup_render_scene():
+    # Clear existing data
+    bpy.ops.object.select_all(action='SELECT')
+    bpy.ops.object.delete()
+    cam = set_camera_and_light()
+    mat = create_material()
+
+    # Render settings
+    bpy.context.scene.render.engine = 'BLENDER_EEVEE'
+    bpy.context.scene.eevee.use_gtao = True  # Enable Ambient Occlusion
+    bpy.context.scene.eevee.gtao_factor = 1.5  # Adjust AO factor for more pronounced effect
+    bpy.context.scene.render.image_settings.file_format = 'PNG'
+    bpy.context.scene.render.resolution_x = 1920
+    bpy.context.scene.render.resolution_y = 1080
+    return cam, mat
+
+
+def load_render_mesh(stl_file_path, obj, mat):
+    # Import STL
+    bpy.ops.object.select_all(action='DESELECT')
+    bpy.ops.import_mesh.stl(filepath=stl_file_path)
+    imported_obj = bpy.context.selected_objects[0]
+    if obj is None:
+        obj = imported_obj
+    else:
+        # Keep the object and only swap its mesh datablock
+        old_mesh = obj.data
+        obj.data = imported_obj.data
+        bpy.data.objects.remove(imported_obj)
+        bpy.data.meshes.remove(old_mesh)
+
+    # Center object at origin and print dimensions
+    obj.location = Vector((0.0, 0.0, 0.0))
+    print("Imported object dimensions:", obj.dimensions)
+    # Append material to the object
+    obj.data.materials.append(mat)
+    return obj
+
+
+def render_image(output_image_path):
+    bpy.context.scene.render.filepath = output_image_path
+    bpy.ops.render.render(write_still=True)
+
+
+def render_stl(stl_file_path, output_image_path):
+    cam, mat = setup_render_scene()
+    obj = load_render_mesh(stl_file_path, None, mat)
+    # Setup camera and light
+    fit_camera(cam, obj)
+    render_image(output_image_path)
+    return {'output_path': output_image_path}
+
+
+def render_batch(stl_file_paths, output_image_paths):
+    # The scene, material and render settings are built once; each file only brings its mesh.
+    # Every file is reported as a render stage event the moment it is written.
+    cam, mat = setup_render_scene()
+    obj = None
+    outputs = []
+    for stl_file_path, output_image_path in zip(stl_file_paths, output_image_paths):
+        event = {'file': os.path.basename(stl_file_path), 'stage': 'render'}
+        print('@@STAGE ' + json.dumps(dict(event, event='start', seconds=None)), flush=True)
+        start_time = time.time()
+        try:
+            obj = load_render_mesh(stl_file_path, obj, mat)
+            fit_camera(cam, obj)
+            render_image(output_image_path)
+            output = {'status': 'ok', 'output_path': output_image_path}
+        except Exception as e:
+            output = {'status': 'error', 'error': str(e)}
+        print('@@STAGE ' + json.dumps(dict(output, event='end', seconds=time.time() - start_time, **event)), flush=True)
+        outputs.append(dict(output, file=stl_file_path))
+    return {'outputs': outputs, 'failed': sum(output['status'] != 'ok' for output in outputs)}
+"""
 
-stl_file_path = r"{safe_stlpath}"
-output_image_path = r"{safe_imagepath}"
-
-# Clear existing data
-bpy.ops.object.select_all(action='SELECT')
-bpy.ops.object.delete()
-
-# Import STL
-bpy.ops.import_mesh.stl(filepath=stl_file_path)
-imported_obj = bpy.context.selected_objects[0]
-
-# Center object at origin and print dimensions
-imported_obj.location = Vector((0.0, 0.0, 0.0))
-print("Imported object dimensions:", imported_obj.dimensions)
-
-# Create a new material
-mat = bpy.data.materials.new(name="Material")
-mat.use_nodes = True
-bsdf = mat.node_tree.nodes.get("Principled BSDF")
-assert bsdf is not None
-# Set the material color (can be adjusted)
-bsdf.inputs['Base Color'].default_value = (0.8, 0.8, 0.8, 1)  # Light grey
-bsdf.inputs['Roughness'].default_value = 0.5  # Adjust for different surface characteristics
-bsdf.inputs['Specular'].default_value = 0.5  # Adjust for specular highlights
-# Enable backface culling
-mat.use_backface_culling = True
-# Append material to the object
-imported_obj.data.materials.append(mat)
-
-
-# Setup camera and light
-set_camera_and_light(imported_obj)
-
-# Render settings
-bpy.context.scene.render.engine = 'BLENDER_EEVEE'
-bpy.context.scene.eevee.use_gtao = True  # Enable Ambient Occlusion
-bpy.context.scene.eevee.gtao_factor = 1.5  # Adjust AO factor for more pronounced effect
-bpy.context.scene.render.image_settings.file_format = 'PNG'
-bpy.context.scene.render.filepath = output_image_path
-bpy.context.scene.render.resolution_x = 1920
-bpy.context.scene.render.resolution_y = 1080
-
-bpy.ops.render.render(write_still=True)
+def generate_blender_script(file, output_image_path):
+    blender_script = BLENDER_RENDER + RESULT_REPORTER + f"""
+import sys
+report_result(render_stl, {file!r}, {output_image_path!r})
 """
     return blender_script
 
 
-
-def run_render_script(file, update_status_callback):
+def render_output_path(file):
     # Extract the directory, filename without extension, and then construct the new path
     directory, filename = os.path.split(file)
     filename_without_ext = os.path.splitext(filename)[0]
-    output_image_path = os.path.join(directory, filename_without_ext + ".png")
+    return os.path.join(directory, filename_without_ext + ".png")
+
 
+def run_render_script(file, update_status_callback=None):
+    filename = os.path.basename(file)
+    output_image_path = render_output_path(file)
 
     blender_script = generate_blender_script(file, output_image_path)
 
-    def run_script():
-        command = ['blender', '--background', '--python-expr', blender_script]
-        process = subprocess.Popen(
-            command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True
-        )
-        while True:
-            output = process.stdout.readline()
-            if output == '' and process.poll() is not None:
-                if process.returncode == 0:
-                    update_status_callback(filename, "Complete")
-                else:
-                    update_status_callback(filename, "Error")
-                break
-            if output:
-                print(output.strip())
-                # Use callback for UI updates instead of direct interaction
-
-    thread = threading.Thread(target=run_script)
-    thread.start()
+    command = ['blender', '--background', '--python-exit-code', '1', '--python-expr', blender_script]
+    result = run_script_process(command)
+    if update_status_callback is not None:
+        update_status_callback(filename, "Complete" if result['status'] == 'ok' else "Error")
+    return result
+
+
+def split_render_batches(costed_files, count):
+    """
+    Spread (file, cost) pairs over at most `count` batches of about equal total cost,
+    largest file first into the lightest batch. Each batch is one Blender session.
+    """
+    batches = [[] for _ in range(max(1, min(count, len(costed_files))))]
+    totals = [0] * len(batches)
+    for file, cost in sorted(costed_files, key=lambda entry: entry[1], reverse=True):
+        lightest = totals.index(min(totals))
+        batches[lightest].append(file)
+        totals[lightest] += cost
+    return [batch for batch in batches if batch]
+
+
+def generate_batch_script(files):
+    blender_script = BLENDER_RENDER + RESULT_REPORTER + f"""
+import sys
+report_result(render_batch, {list(files)!r}, {[render_output_path(file) for file in files]!r})
+"""
+    return blender_script
+
+
+def run_render_batch(files, stage_callback=None, timeout=None):
+    """
+    Render every file in one Blender session, writing <name>.png next to each.
+    `stage_callback` gets a 'render' end event per file as soon as its image is written.
+    """
+    blender_script = generate_batch_script(files)
+    command = ['blender', '--background', '--python-exit-code', '1', '--python-expr', blender_script]
+    return run_script_process(command, stage_callback=stage_callback, timeout=timeout)
@@ -0,0 +1,78 @@
+import hashlib
+import json
+import os
+import shutil
+
+from disk_cache import DiskCache
+from processing_backends import engine_version, output_filenames
+
+DEFAULT_CACHE_DIRECTORY = os.path.join(os.path.expanduser('~'), '.cache', 'ModelEnhancer', 'results')
+DEFAULT_MAX_BYTES = 5 * 1024 ** 3
+
+# Read size used while hashing input files
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def hash_file(filepath):
+    digest = hashlib.blake2b(digest_size=20)
+    with open(filepath, 'rb') as f:
+        while True:
+            chunk = f.read(HASH_CHUNK_SIZE)
+            if not chunk:
+                break
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def result_key(filepath, params, engine):
+    """Key of one processing run: input bytes, every pipeline parameter, the engine and its version."""
+    description = json.dumps({
+        'input': hash_file(filepath),
+        'params': params,
+        'engine': engine,
+        'engine_version': engine_version(engine),
+    }, sort_keys=True)
+    return hashlib.blake2b(description.encode(), digest_size=20).hexdigest()
+
+
+class ResultCache:
+    """
+    Processed meshes of earlier runs, keyed by result_key. Every entry is a
+    '<key>.json' copy of the result dict plus one '<key>.<n>.stl' per output (LOD).
+    """
+
+    def __init__(self, directory=DEFAULT_CACHE_DIRECTORY, max_bytes=DEFAULT_MAX_BYTES):
+        self.store = DiskCache(directory, max_bytes)
+
+    def key(self, filepath, params, engine):
+        return result_key(filepath, params, engine)
+
+    def fetch(self, key, directory_path, filename):
+        """Copy the cached outputs for `filename` into `directory_path` and return the result dict, or None on a miss."""
+        metadata = self.store.get_bytes(key + '.json')
+        if metadata is None:
+            return None
+        result = json.loads(metadata)
+        outputs = result['outputs']
+        stored_paths = [self.store.get(f'{key}.{index}.stl') for index in range(len(outputs))]
+        if None in stored_paths:
+            return None
+        # Every target the run was asked for; skipped LODs have no output but still shape the names
+        targets = result.get('targets', [output['target'] for output in outputs])
+        names = dict(zip(targets, output_filenames(filename, targets)))
+        for output, stored_path in zip(outputs, stored_paths):
+            output['output_path'] = os.path.join(directory_path, names[output['target']])
+            try:
+                # A copy rather than a link, so a later run overwriting the output cannot change the cache
+                shutil.copyfile(stored_path, output['output_path'])
+            except FileNotFoundError:
+                return None
+        result['output_path'] = outputs[0]['output_path']
+        result['cached'] = True
+        return result
+
+    def save(self, key, result):
+        for index, output in enumerate(result['outputs']):
+            self.store.put(f'{key}.{index}.stl', output['output_path'])
+        # Written last, so a lookup never finds metadata without its meshes
+        self.store.put_bytes(key + '.json', json.dumps(result).encode())
@@ -0,0 +1,220 @@
+"""
+Per-stage profiling of pipeline runs.
+
+    python stage_profiler.py profile.jsonl    # print the report of an earlier batch
+"""
+import json
+import sys
+import threading
+import time
+
+try:
+    import resource
+except ImportError:
+    # Windows; peak RSS is only reported where the OS exposes it
+    resource = None
+
+# Files listed as the slowest in a report
+SLOWEST_FILES = 10
+
+
+def reset_peak_rss():
+    """Restart the peak RSS high-water mark where the OS allows it (Linux), so each stage gets its own peak."""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+    except OSError:
+        pass
+
+
+def peak_rss():
+    """Peak resident set size of this process in bytes, or None when unknown."""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes everywhere but macOS
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def mesh_counts(mesh):
+    """Vertex and face count of a trimesh or a (vertices, faces) pair of arrays."""
+    if mesh is None:
+        return None, None
+    vertices, faces = (mesh.vertices, mesh.faces) if hasattr(mesh, 'faces') else mesh
+    return len(vertices), len(faces)
+
+
+class StageRecorder:
+    """Wall time, CPU time, peak RSS and mesh sizes of each stage of one run, summed over repeated runs."""
+
+    def __init__(self, stage_callback=None, filename=None):
+        self.stage_callback = stage_callback
+        self.filename = filename
+        self._records = {}
+        self._started = {}
+
+    def report(self, event):
+        if self.stage_callback is not None:
+            self.stage_callback(dict(event, file=self.filename))
+
+    def start(self, stage, mesh=None):
+        reset_peak_rss()
+        self._started[stage] = (time.perf_counter(), time.process_time(), *mesh_counts(mesh))
+        self.report({'stage': stage, 'event': 'start', 'seconds': None})
+
+    def end(self, stage, mesh=None):
+        """Close the stage started last under `stage`; returns its total wall time so far."""
+        wall_start, cpu_start, vertices_in, faces_in = self._started.pop(stage)
+        vertices_out, faces_out = mesh_counts(mesh)
+        record = self._records.setdefault(stage, {
+            'stage': stage, 'wall': 0.0, 'cpu': 0.0, 'peak_rss': None,
+            'vertices_in': None, 'faces_in': None, 'vertices_out': None, 'faces_out': None,
+        })
+        record['wall'] += time.perf_counter() - wall_start
+        record['cpu'] += time.process_time() - cpu_start
+        rss = peak_rss()
+        if rss is not None:
+            record['peak_rss'] = max(record['peak_rss'] or 0, rss)
+        for key, value in (('vertices_in', vertices_in), ('faces_in', faces_in),
+                           ('vertices_out', vertices_out), ('faces_out', faces_out)):
+            if value is not None:
+                record[key] = (record[key] or 0) + value
+        self.report(dict(record, event='end', seconds=record['wall']))
+        return record['wall']
+
+    def skip(self, stage):
+        """Record a stage that did not run, e.g. one restored from a checkpoint."""
+        self._records[stage] = {'stage': stage, 'wall': 0.0, 'cpu': 0.0, 'peak_rss': None, 'skipped': True,
+                                'vertices_in': None, 'faces_in': None, 'vertices_out': None, 'faces_out': None}
+
+    def timings(self):
+        return {stage: record['wall'] for stage, record in self._records.items()}
+
+    def records(self):
+        return list(self._records.values())
+
+
+def percentile(values, fraction):
+    """Linearly interpolated percentile of `values` (fraction in 0..1)."""
+    values = sorted(values)
+    if not values:
+        return None
+    position = (len(values) - 1) * fraction
+    low = int(position)
+    high = min(low + 1, len(values) - 1)
+    return values[low] + (values[high] - values[low]) * (position - low)
+
+
+def build_report(records, slowest=SLOWEST_FILES):
+    """
+    Summary of profile records: per stage the run count, p50/p95/total wall time,
+    CPU time, largest peak RSS and triangles handled per second, plus the slowest jobs.
+    """
+    stages = {}
+    jobs = {}
+    for record in records:
+        if record.get('skipped'):
+            continue
+        stage = stages.setdefault(record['stage'], {'walls': [], 'cpu': 0.0, 'peak_rss': None, 'faces_in': 0})
+        stage['walls'].append(record['wall'])
+        stage['cpu'] += record['cpu']
+        if record['peak_rss'] is not None:
+            stage['peak_rss'] = max(stage['peak_rss'] or 0, record['peak_rss'])
+        # Import has no input mesh; its rate is measured on the triangles it read
+        faces = record['faces_in'] if record['faces_in'] is not None else record['faces_out']
+        stage['faces_in'] += faces or 0
+        jobs[record['job']] = jobs.get(record['job'], 0.0) + record['wall']
+    report = {'stages': [], 'slowest': sorted(jobs.items(), key=lambda item: item[1], reverse=True)[:slowest]}
+    for name, stage in stages.items():
+        total = sum(stage['walls'])
+        report['stages'].append({
+            'stage': name,
+            'runs': len(stage['walls']),
+            'p50': percentile(stage['walls'], 0.5),
+            'p95': percentile(stage['walls'], 0.95),
+            'total': total,
+            'cpu': stage['cpu'],
+            'peak_rss': stage['peak_rss'],
+            'triangles_per_second': stage['faces_in'] / total if total > 0 and stage['faces_in'] else None,
+        })
+    return report
+
+
+def format_report(report):
+    lines = [f"{'stage':<20} {'runs':>5} {'p50 s':>9} {'p95 s':>9} {'total s':>10} {'cpu s':>10} "
+             f"{'peak MiB':>9} {'M tris/s':>9}"]
+    for stage in report['stages']:
+        peak = f"{stage['peak_rss'] / 1024 ** 2:.0f}" if stage['peak_rss'] is not None else '-'
+        rate = f"{stage['triangles_per_second'] / 1e6:.2f}" if stage['triangles_per_second'] else '-'
+        lines.append(
+            f"{stage['stage']:<20} {stage['runs']:>5} {stage['p50']:>9.3f} {stage['p95']:>9.3f} "
+            f"{stage['total']:>10.2f} {stage['cpu']:>10.2f} {peak:>9} {rate:>9}"
+        )
+    if report['slowest']:
+        lines.append("Slowest files:")
+        lines.extend(f"  {seconds:9.2f} s  {job}" for job, seconds in report['slowest'])
+    return "\n".join(lines)
+
+
+def load_records(path):
+    records = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                # Torn last line of an interrupted batch
+                continue
+    return records
+
+
+class ProfileLog:
+    """Appends the stage records of every finished job to a JSON-lines file."""
+
+    def __init__(self, path):
+        self.path = path
+        self.records = []
+        self._lock = threading.Lock()
+        self._file = open(path, 'a', encoding='utf-8')
+
+    def record(self, job_id, result):
+        # Cached results were not processed in this batch and would skew the numbers
+        if result.get('cached'):
+            return
+        entries = [{'job': job_id, **record} for record in result.get('stage_profile', [])]
+        with self._lock:
+            if self._file.closed:
+                return
+            for entry in entries:
+                self._file.write(json.dumps(entry) + '\n')
+            self._file.flush()
+            self.records.extend(entries)
+
+    def profiled(self, job_id, run):
+        """Wrap a scheduler `run(job)` callable so the stage records of its result are logged."""
+        def run_profiled(job):
+            result = run(job)
+            self.record(job_id, result)
+            return result
+        return run_profiled
+
+    def report(self, slowest=SLOWEST_FILES):
+        with self._lock:
+            return build_report(self.records, slowest)
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 2:
+        sys.exit("usage: python stage_profiler.py PROFILE.jsonl")
+    print(format_report(build_report(load_records(sys.argv[1]))))
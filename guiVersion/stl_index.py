@@ -0,0 +1,126 @@
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import numpy as np
+
+import stl_io
+
+DEFAULT_INDEX_PATH = os.path.join(os.path.expanduser('~'), '.cache', 'ModelEnhancer', 'stl_index.json')
+# Triangles reduced per min/max step, so a huge scan never needs more than one chunk of temporaries
+BBOX_CHUNK_TRIANGLES = 1 << 20
+
+
+def read_metadata(filepath):
+    """
+    Triangle count and bounding box of an STL without building a mesh.
+    Binary files are reduced straight from the memory map; ASCII files are streamed.
+    """
+    stat = os.stat(filepath)
+    info = {
+        'path': os.path.abspath(filepath),
+        'size': stat.st_size,
+        'mtime': stat.st_mtime,
+        'mtime_ns': stat.st_mtime_ns,
+        'binary': stl_io.is_binary_stl(filepath),
+        'triangles': 0,
+        'bbox_min': None,
+        'bbox_max': None,
+    }
+    if info['binary']:
+        corners = stl_io.map_triangles(filepath)['vertices']
+        chunks = (corners[start:start + BBOX_CHUNK_TRIANGLES] for start in range(0, len(corners), BBOX_CHUNK_TRIANGLES))
+    else:
+        corners = None
+        chunks = stl_io.iter_ascii_triangles(filepath)
+    low = np.full(3, np.inf)
+    high = np.full(3, -np.inf)
+    for chunk in chunks:
+        info['triangles'] += len(chunk)
+        low = np.minimum(low, chunk.min(axis=(0, 1)))
+        high = np.maximum(high, chunk.max(axis=(0, 1)))
+    if info['triangles']:
+        info['bbox_min'] = low.tolist()
+        info['bbox_max'] = high.tolist()
+    return info
+
+
+class StlIndex:
+    """
+    Metadata of STL files, cached by (path, mtime, size) and kept in a JSON file
+    between sessions, so only new or changed files are read again.
+    """
+
+    def __init__(self, index_path=DEFAULT_INDEX_PATH, max_workers=None):
+        self.index_path = index_path
+        self.max_workers = max_workers or min(8, os.cpu_count() or 1)
+        self._entries = {}
+        # Set when entries were read since the last save
+        self._dirty = False
+        self._lock = threading.Lock()
+        if index_path is not None and os.path.exists(index_path):
+            try:
+                with open(index_path, 'r', encoding='utf-8') as f:
+                    self._entries = {entry['path']: entry for entry in json.load(f)}
+            except (OSError, ValueError, KeyError):
+                # A damaged index is only a cache; start over
+                self._entries = {}
+
+    def cached(self, filepath):
+        """Stored metadata for `filepath` if the file is unchanged since it was read, else None."""
+        path = os.path.abspath(filepath)
+        entry = self._entries.get(path)
+        if entry is None:
+            return None
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        # Entries written before mtime_ns was stored are read again once
+        if entry.get('mtime_ns') != stat.st_mtime_ns or entry['size'] != stat.st_size:
+            return None
+        return entry
+
+    def get(self, filepath):
+        entry = self.cached(filepath)
+        if entry is None:
+            entry = read_metadata(filepath)
+            with self._lock:
+                self._entries[entry['path']] = entry
+                self._dirty = True
+        return entry
+
+    def index_files(self, filepaths, callback=None):
+        """
+        Metadata of every file, read on a thread pool (the min/max reductions release the GIL).
+        `callback(info)` is called as each file finishes; unreadable files are skipped.
+        """
+        results = []
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = [executor.submit(self.get, filepath) for filepath in filepaths]
+            for future in as_completed(futures):
+                try:
+                    info = future.result()
+                except (OSError, ValueError):
+                    continue
+                results.append(info)
+                if callback is not None:
+                    callback(info)
+        self.save()
+        return results
+
+    def index_directory(self, directory, callback=None):
+        filepaths = [os.path.join(directory, name) for name in os.listdir(directory) if name.lower().endswith('.stl')]
+        return self.index_files(filepaths, callback)
+
+    def save(self):
+        if self.index_path is None or not self._dirty:
+            return
+        os.makedirs(os.path.dirname(self.index_path), exist_ok=True)
+        with self._lock:
+            self._dirty = False
+            temp_path = self.index_path + '.tmp'
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump(list(self._entries.values()), f)
+            os.replace(temp_path, self.index_path)
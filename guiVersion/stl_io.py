@@ -0,0 +1,152 @@
+import os
+import re
+import struct
+
+import numpy as np
+
+HEADER_SIZE = 80
+# One binary STL triangle record: normal, three corners and the attribute byte count
+TRIANGLE_DTYPE = np.dtype([
+    ('normal', '<f4', (3,)),
+    ('vertices', '<f4', (3, 3)),
+    ('attribute', '<u2'),
+])
+# Text read per step by the ASCII parser
+ASCII_CHUNK_SIZE = 16 * 1024 * 1024
+
+_VERTEX_PATTERN = re.compile(rb'vertex\s+(\S+)\s+(\S+)\s+(\S+)')
+
+
+def read_header(filepath):
+    """Return (header bytes, triangle count) of a binary STL, or None for anything else."""
+    size = os.path.getsize(filepath)
+    with open(filepath, 'rb') as f:
+        head = f.read(HEADER_SIZE + 4)
+    if len(head) < HEADER_SIZE + 4:
+        return None
+    count = struct.unpack('<I', head[HEADER_SIZE:])[0]
+    # Some exporters start binary headers with "solid" too, so the size is the real test
+    if HEADER_SIZE + 4 + count * TRIANGLE_DTYPE.itemsize != size:
+        return None
+    return head[:HEADER_SIZE], count
+
+
+def is_binary_stl(filepath):
+    return read_header(filepath) is not None
+
+
+def read_triangle_count(filepath):
+    """Triangle count from the binary header, or by scanning an ASCII file."""
+    header = read_header(filepath)
+    if header is not None:
+        return header[1]
+    return sum(len(chunk) for chunk in iter_ascii_triangles(filepath))
+
+
+def map_triangles(filepath):
+    """
+    Memory-map a binary STL and return its triangle records as a read-only
+    TRIANGLE_DTYPE structured array. Nothing is copied; pages are read on access.
+    """
+    header = read_header(filepath)
+    if header is None:
+        raise ValueError(f"{filepath} is not a binary STL")
+    if header[1] == 0:
+        return np.zeros(0, dtype=TRIANGLE_DTYPE)
+    return np.memmap(filepath, dtype=TRIANGLE_DTYPE, mode='r', offset=HEADER_SIZE + 4, shape=(header[1],))
+
+
+def iter_ascii_triangles(filepath, chunk_size=ASCII_CHUNK_SIZE):
+    """Stream an ASCII STL as (k, 3, 3) float32 corner arrays, one chunk of facets at a time."""
+    with open(filepath, 'rb') as f:
+        if not f.read(1024).lstrip().startswith(b'solid'):
+            raise ValueError(f"{filepath} is neither a binary nor an ASCII STL")
+        f.seek(0)
+        pending = b''
+        while True:
+            block = f.read(chunk_size)
+            text = pending + block
+            if block:
+                # Only parse up to the last complete facet, the rest waits for the next block
+                end = text.rfind(b'endfacet')
+                if end < 0:
+                    pending = text
+                    continue
+                end += len(b'endfacet')
+                text, pending = text[:end], text[end:]
+            coordinates = _VERTEX_PATTERN.findall(text)
+            if coordinates:
+                yield np.array(coordinates, dtype=np.float32).reshape(-1, 3, 3)
+            if not block:
+                return
+
+
+def read_triangles(filepath):
+    """
+    Corner coordinates of every triangle as an (n, 3, 3) float32 array.
+    Binary files give a zero-copy view of the memory map, ASCII files are parsed in chunks.
+    """
+    if is_binary_stl(filepath):
+        return map_triangles(filepath)['vertices']
+    chunks = list(iter_ascii_triangles(filepath))
+    if not chunks:
+        return np.zeros((0, 3, 3), dtype=np.float32)
+    return np.concatenate(chunks)
+
+
+def iter_triangle_chunks(filepath, chunk_triangles):
+    """
+    Stream any STL as (k, 3, 3) float32 corner arrays of at most about `chunk_triangles`
+    triangles, so callers never hold more than one chunk of the file in memory.
+    """
+    if is_binary_stl(filepath):
+        records = map_triangles(filepath)
+        for start in range(0, len(records), chunk_triangles):
+            yield np.array(records['vertices'][start:start + chunk_triangles])
+    else:
+        # An ASCII facet takes roughly 250 bytes of text
+        yield from iter_ascii_triangles(filepath, chunk_size=max(chunk_triangles * 250, 4096))
+
+
+def face_normals(triangles):
+    normals = np.cross(triangles[:, 1] - triangles[:, 0], triangles[:, 2] - triangles[:, 0])
+    length = np.linalg.norm(normals, axis=1, keepdims=True)
+    return np.divide(normals, length, out=np.zeros_like(normals), where=length > 0)
+
+
+def write_triangles(filepath, triangles, normals=None, header=b'ModelEnhancer binary STL'):
+    """Write (n, 3, 3) corners as a binary STL: one preallocated buffer, one write call."""
+    triangles = np.asarray(triangles)
+    count = len(triangles)
+    buffer = bytearray(HEADER_SIZE + 4 + count * TRIANGLE_DTYPE.itemsize)
+    buffer[:HEADER_SIZE] = header[:HEADER_SIZE].ljust(HEADER_SIZE, b' ')
+    struct.pack_into('<I', buffer, HEADER_SIZE, count)
+    records = np.frombuffer(buffer, dtype=TRIANGLE_DTYPE, offset=HEADER_SIZE + 4, count=count)
+    records['vertices'] = triangles
+    records['normal'] = face_normals(triangles.astype(np.float32)) if normals is None else normals
+    records['attribute'] = 0
+    with open(filepath, 'wb') as f:
+        f.write(buffer)
+
+
+def write_triangle_chunks(filepath, count, chunks, header=b'ModelEnhancer binary STL'):
+    """
+    Write a binary STL of `count` triangles from an iterable of (n, 3, 3) corner
+    chunks, so the whole mesh never has to be expanded to triangles at once.
+    """
+    written = 0
+    with open(filepath, 'wb') as f:
+        f.write(header[:HEADER_SIZE].ljust(HEADER_SIZE, b' ') + struct.pack('<I', count))
+        for triangles in chunks:
+            records = np.zeros(len(triangles), dtype=TRIANGLE_DTYPE)
+            records['vertices'] = triangles
+            records['normal'] = face_normals(records['vertices'])
+            f.write(records.tobytes())
+            written += len(triangles)
+    if written != count:
+        raise ValueError(f"Wrote {written} triangles to {filepath}, but its header says {count}")
+
+
+def write_mesh(filepath, vertices, faces, header=b'ModelEnhancer binary STL'):
+    """Write an indexed mesh as a binary STL."""
+    write_triangles(filepath, np.asarray(vertices, dtype=np.float32)[np.asarray(faces)], header=header)
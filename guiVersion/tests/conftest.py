@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The GUI modules import each other by bare name, as they do when modifyStlWithGui.py runs
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,41 @@
+import os
+
+from disk_cache import DiskCache
+
+
+def age(cache, key, seconds_ago):
+    """Set an entry's mtime, which the cache orders its evictions by."""
+    mtime = os.path.getmtime(cache.path(key)) - seconds_ago
+    os.utime(cache.path(key), (mtime, mtime))
+
+
+def test_least_recently_used_entries_are_evicted_first(tmp_path):
+    cache = DiskCache(str(tmp_path), max_bytes=300)
+    for index, key in enumerate(('a', 'b', 'c')):
+        cache.put_bytes(key, b'x' * 100)
+        age(cache, key, 100 - index * 10)
+    # Reading refreshes 'a', so 'b' is now the oldest
+    assert cache.get_bytes('a') == b'x' * 100
+    cache.put_bytes('d', b'x' * 100)
+    assert cache.get('b') is None
+    assert all(cache.get(key) is not None for key in ('a', 'c', 'd'))
+    assert cache.size() == 300
+
+
+def test_put_copies_a_file_and_misses_return_none(tmp_path):
+    source = tmp_path / 'source.bin'
+    source.write_bytes(b'data')
+    cache = DiskCache(str(tmp_path / 'cache'), max_bytes=1024)
+    assert cache.get('missing') is None and cache.get_bytes('missing') is None
+    path = cache.put('key', str(source))
+    assert open(path, 'rb').read() == b'data'
+    cache.clear()
+    assert cache.get('key') is None
+
+
+def test_incomplete_entries_are_not_counted(tmp_path):
+    cache = DiskCache(str(tmp_path), max_bytes=1024)
+    (tmp_path / '.incoming-partial').write_bytes(b'x' * 4096)
+    cache.put_bytes('key', b'x' * 10)
+    assert cache.get('key') is not None
+    assert [os.path.basename(path) for _, _, path in cache.entries()] == ['key']
@@ -0,0 +1,62 @@
+import pytest
+
+from job_journal import DONE, FAILED, QUEUED, RUNNING, JobJournal, job_key
+
+
+def test_replay_sorts_jobs_into_the_plan(tmp_path):
+    path = str(tmp_path / 'journal.jsonl')
+    journal = JobJournal(path)
+    for job_id in ('done', 'failed', 'exhausted', 'running', 'queued'):
+        journal.record(job_id, QUEUED)
+    journal.record('done', RUNNING)
+    journal.record('done', DONE, outputs=['out.stl'])
+    journal.record('failed', FAILED, error='boom')
+    for _ in range(2):
+        journal.record('exhausted', FAILED, error='boom')
+    journal.record('running', RUNNING)
+    journal.close()
+
+    plan = JobJournal(path).plan(['done', 'failed', 'exhausted', 'running', 'queued', 'new'], max_attempts=2)
+    assert plan == {
+        'run': ['failed', 'running', 'queued', 'new'],
+        'done': ['done'],
+        'exhausted': ['exhausted'],
+        'reclaimed': ['running'],
+    }
+
+
+def test_torn_last_line_is_ignored(tmp_path):
+    path = str(tmp_path / 'journal.jsonl')
+    journal = JobJournal(path)
+    journal.record('a', DONE)
+    journal.close()
+    with open(path, 'a') as f:
+        f.write('{"job": "b", "sta')
+    journal = JobJournal(path)
+    journal.record('b', DONE)
+    journal.close()
+    assert JobJournal(path).plan(['a', 'b'], max_attempts=1)['done'] == ['a', 'b']
+
+
+def test_journaled_records_each_attempt(tmp_path):
+    journal = JobJournal(str(tmp_path / 'journal.jsonl'))
+    ok = journal.journaled('ok', lambda job: {'outputs': [{'output_path': 'out.stl'}]})
+    ok(None)
+
+    def fail(job):
+        raise RuntimeError('boom')
+
+    with pytest.raises(RuntimeError):
+        journal.journaled('bad', fail)(None)
+    assert journal.jobs['ok']['state'] == DONE
+    assert journal.jobs['bad'] == {'state': FAILED, 'failures': 1, 'error': 'boom'}
+    journal.close()
+
+
+def test_job_key_changes_with_the_settings():
+    settings = {'params': {'target_polygon_count': 5000}, 'engine': 'native', 'output_directory': '/out'}
+    assert job_key('a.stl', settings) == job_key('a.stl', dict(reversed(list(settings.items()))))
+    assert job_key('a.stl', settings) != job_key('b.stl', settings)
+    assert job_key('a.stl', settings) != job_key('a.stl', dict(settings, output_directory='/elsewhere'))
+    assert job_key('a.stl', settings) != job_key(
+        'a.stl', dict(settings, params={'target_polygon_count': 6000}))
@@ -0,0 +1,119 @@
+import threading
+import time
+
+import pytest
+
+from job_scheduler import CANCELLED, COMPLETE, ERROR, JobScheduler
+
+
+def blocker():
+    """A job that holds its worker until the returned event is set."""
+    release = threading.Event()
+    return release, lambda job: release.wait(5)
+
+
+def test_most_expensive_pending_job_runs_first():
+    scheduler = JobScheduler(max_workers=1)
+    release, hold = blocker()
+    order = []
+    scheduler.submit('blocker', hold)
+    for name, cost in (('small', 1), ('large', 100), ('medium', 10)):
+        scheduler.submit(name, lambda job: order.append(job.name), cost=cost)
+    release.set()
+    assert scheduler.wait(5)
+    assert order == ['large', 'medium', 'small']
+    scheduler.shutdown()
+
+
+def test_failed_jobs_are_retried_up_to_max_retries():
+    scheduler = JobScheduler(max_workers=1, max_retries=2)
+
+    def flaky(job):
+        if job.attempts < 3:
+            raise RuntimeError('transient')
+        return 'ok'
+
+    def broken(job):
+        raise RuntimeError('permanent')
+
+    recovered = scheduler.submit('flaky', flaky)
+    failed = scheduler.submit('broken', broken)
+    assert scheduler.wait(5)
+    assert (recovered.status, recovered.result, recovered.error) == (COMPLETE, 'ok', None)
+    assert (failed.status, failed.attempts, str(failed.error)) == (ERROR, 3, 'permanent')
+    scheduler.shutdown()
+
+
+def test_cancel_drops_queued_jobs_and_discards_running_results():
+    scheduler = JobScheduler(max_workers=1)
+    release, hold = blocker()
+    running = scheduler.submit('running', hold, cost=10)
+    ran = []
+    queued = scheduler.submit('queued', lambda job: ran.append(job.name))
+    while running.attempts == 0:
+        time.sleep(0.01)
+    scheduler.cancel()
+    assert queued.status == CANCELLED and queued.done.is_set()
+    release.set()
+    assert scheduler.wait(5)
+    assert running.status == CANCELLED
+    assert ran == []
+    scheduler.shutdown()
+
+
+def test_memory_budget_limits_concurrent_jobs():
+    scheduler = JobScheduler(max_workers=3, memory_budget=100)
+    lock = threading.Lock()
+    in_use = [0, 0]
+
+    def run(job):
+        with lock:
+            in_use[0] += job.memory
+            in_use[1] = max(in_use[1], in_use[0])
+        time.sleep(0.05)
+        with lock:
+            in_use[0] -= job.memory
+
+    for index in range(6):
+        scheduler.submit(f'job{index}', run, cost=index, memory=40)
+    assert scheduler.wait(5)
+    assert in_use[1] == 80
+    scheduler.shutdown()
+
+
+def test_job_over_the_whole_budget_runs_alone():
+    scheduler = JobScheduler(max_workers=2, memory_budget=100)
+    release, hold = blocker()
+    running = []
+    overlapped = []
+
+    def run(job):
+        running.append(job.name)
+        if len(running) > 1 and 'huge' in running:
+            overlapped.append(list(running))
+        time.sleep(0.05)
+        running.remove(job.name)
+
+    scheduler.submit('blocker', hold, cost=1000, memory=10)
+    huge = scheduler.submit('huge', run, cost=100, memory=500)
+    small = scheduler.submit('small', run, cost=1, memory=10)
+    time.sleep(0.1)
+    # The huge job is the most expensive one waiting, so the small one may not pass it
+    assert small.attempts == 0
+    release.set()
+    assert scheduler.wait(5)
+    assert huge.status == small.status == COMPLETE
+    assert overlapped == []
+    scheduler.shutdown()
+
+
+def test_wait_returns_false_at_its_deadline():
+    scheduler = JobScheduler(max_workers=1)
+    release, hold = blocker()
+    scheduler.submit('blocker', hold)
+    start = time.monotonic()
+    assert scheduler.wait(0.1) is False
+    assert time.monotonic() - start == pytest.approx(0.1, abs=0.1)
+    release.set()
+    assert scheduler.wait(5)
+    scheduler.shutdown()
@@ -0,0 +1,34 @@
+import mesh_engine
+
+PARAMS = {
+    'target_polygon_count': 5000,
+    'laplacian_smooth_lambda_factor': 0.5,
+    'subdivision_levels': 1,
+    'smoothing_factor': 0.5,
+    'smoothing_iterations': 2,
+    'crisp_edge_bevel_width': 0.1,
+}
+
+
+def first_changed(keys, other_keys):
+    return next((index for index, (key, other) in enumerate(zip(keys, other_keys)) if key != other), None)
+
+
+def test_checkpoint_keys_change_from_the_first_stage_using_a_parameter():
+    keys = mesh_engine.checkpoint_keys('hash', PARAMS)
+    assert len(keys) == len(mesh_engine.PIPELINE_STAGES) == len(set(keys))
+    assert keys == mesh_engine.checkpoint_keys('hash', dict(PARAMS))
+    names = [name for name, _, _ in mesh_engine.PIPELINE_STAGES]
+    for param, value, stage in (('smoothing_iterations', 3, 'smooth'),
+                                ('crisp_edge_bevel_width', 0.2, 'bevel'),
+                                ('subdivision_levels', 2, 'subdivision'),
+                                ('target_polygon_count', 6000, 'initial_decimation')):
+        changed = mesh_engine.checkpoint_keys('hash', dict(PARAMS, **{param: value}))
+        assert first_changed(keys, changed) == names.index(stage)
+
+
+def test_checkpoint_keys_change_with_the_input_and_engine_version(monkeypatch):
+    keys = mesh_engine.checkpoint_keys('hash', PARAMS)
+    assert first_changed(keys, mesh_engine.checkpoint_keys('other hash', PARAMS)) == 0
+    monkeypatch.setattr(mesh_engine, 'ENGINE_VERSION', mesh_engine.ENGINE_VERSION + '.1')
+    assert first_changed(keys, mesh_engine.checkpoint_keys('hash', PARAMS)) == 0
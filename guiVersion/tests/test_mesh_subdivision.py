@@ -0,0 +1,88 @@
+import tracemalloc
+
+import numpy as np
+import pytest
+import trimesh
+from scipy.spatial import cKDTree
+
+import mesh_subdivision
+
+
+def grid(size):
+    """Open size x size vertex grid, two triangles per cell."""
+    x, y = np.meshgrid(np.arange(size, dtype=float), np.arange(size, dtype=float))
+    vertices = np.stack([x.ravel(), y.ravel(), np.zeros(size * size)], axis=1)
+    index = np.arange(size * size).reshape(size, size)
+    a, b = index[:-1, :-1].ravel(), index[:-1, 1:].ravel()
+    c, d = index[1:, :-1].ravel(), index[1:, 1:].ravel()
+    return vertices, np.concatenate([np.stack([a, b, d], axis=1), np.stack([a, d, c], axis=1)])
+
+
+def sphere(subdivisions):
+    mesh = trimesh.creation.icosphere(subdivisions=subdivisions)
+    return np.asarray(mesh.vertices, dtype=np.float64), np.asarray(mesh.faces, dtype=np.int64)
+
+
+@pytest.mark.parametrize('method', mesh_subdivision.METHODS)
+@pytest.mark.parametrize('levels', [1, 2])
+@pytest.mark.parametrize('mesh', [sphere(4), grid(60)], ids=['closed', 'open'])
+def test_traced_peak_is_within_forecast(mesh, levels, method):
+    vertices, faces = mesh
+    forecast = mesh_subdivision.forecast_subdivision(len(vertices), len(faces), levels, method)
+    tracemalloc.start()
+    try:
+        mesh_subdivision.subdivide(vertices, faces, levels, method, memory_budget=float('inf'))
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    assert peak <= max(entry['peak_bytes'] for entry in forecast)
+
+
+def nearest_distance(points, reference):
+    """Largest distance from any of `points` to the nearest point of `reference`, both ways round."""
+    return max(cKDTree(reference).query(points)[0].max(), cKDTree(points).query(reference)[0].max())
+
+
+@pytest.mark.parametrize('levels', [1, 2])
+def test_loop_matches_trimesh_on_closed_meshes(levels):
+    vertices, faces = sphere(2)
+    new_vertices, new_faces = mesh_subdivision.subdivide(vertices, faces, levels, 'loop')
+    expected_vertices, expected_faces = trimesh.remesh.subdivide_loop(vertices, faces, levels)
+    assert len(new_faces) == len(expected_faces)
+    assert nearest_distance(new_vertices, expected_vertices) < 1e-9
+
+
+@pytest.mark.parametrize('mesh', [sphere(2), grid(8)], ids=['closed', 'open'])
+def test_midpoint_matches_trimesh(mesh):
+    vertices, faces = mesh
+    new_vertices, new_faces = mesh_subdivision.subdivide(vertices, faces, 2, 'midpoint')
+    expected_vertices, expected_faces = vertices, faces
+    for _ in range(2):
+        expected_vertices, expected_faces = trimesh.remesh.subdivide(expected_vertices, expected_faces)
+    assert len(new_faces) == len(expected_faces)
+    assert nearest_distance(new_vertices, expected_vertices) < 1e-9
+
+
+def test_loop_keeps_open_boundaries_on_their_outline():
+    # trimesh pushes boundary vertices outwards here, so it is no reference for open meshes
+    vertices, faces = grid(8)
+    new_vertices, _ = mesh_subdivision.subdivide(vertices, faces, 2, 'loop')
+    assert np.allclose(new_vertices.min(axis=0), vertices.min(axis=0))
+    assert np.allclose(new_vertices.max(axis=0), vertices.max(axis=0))
+
+
+def test_forecast_sizes_match_the_result():
+    vertices, faces = sphere(3)
+    forecast = mesh_subdivision.forecast_subdivision(len(vertices), len(faces), 2)
+    new_vertices, new_faces = mesh_subdivision.subdivide(vertices, faces, 2)
+    assert (forecast[-1]['vertices'], forecast[-1]['faces']) == (len(new_vertices), len(new_faces))
+
+
+def test_levels_over_budget_are_capped_or_raise():
+    vertices, faces = sphere(3)
+    forecast = mesh_subdivision.forecast_subdivision(len(vertices), len(faces), 3)
+    budget = forecast[1]['peak_bytes']
+    new_vertices, new_faces = mesh_subdivision.subdivide(vertices, faces, 3, memory_budget=budget)
+    assert len(new_faces) == 16 * len(faces)
+    with pytest.raises(mesh_subdivision.SubdivisionBudgetError):
+        mesh_subdivision.subdivide(vertices, faces, 3, memory_budget=budget, on_over_budget='raise')
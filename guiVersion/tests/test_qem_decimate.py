@@ -0,0 +1,42 @@
+import numpy as np
+import trimesh
+
+import qem_decimate
+from test_mesh_subdivision import grid, sphere
+
+
+def edge_use_counts(faces):
+    edges = np.sort(np.concatenate([faces[:, [0, 1]], faces[:, [1, 2]], faces[:, [2, 0]]]), axis=1)
+    return np.unique(edges, axis=0, return_counts=True)[1]
+
+
+def test_closed_mesh_reaches_the_target_and_stays_manifold():
+    vertices, faces = sphere(4)
+    new_vertices, new_faces = qem_decimate.decimate(vertices, faces, 500)
+    assert len(new_faces) <= 500
+    assert set(edge_use_counts(new_faces)) == {2}
+    mesh = trimesh.Trimesh(new_vertices, new_faces, process=False)
+    assert mesh.is_watertight and mesh.is_winding_consistent
+    # The unit sphere keeps its shape
+    assert np.allclose(np.linalg.norm(new_vertices, axis=1), 1, atol=0.05)
+
+
+def test_open_boundary_keeps_its_outline():
+    vertices, faces = grid(40)
+    new_vertices, new_faces = qem_decimate.decimate(vertices, faces, 100)
+    assert len(new_faces) <= 100
+    assert set(edge_use_counts(new_faces)) <= {1, 2}
+    corners = [[0, 0, 0], [39, 0, 0], [0, 39, 0], [39, 39, 0]]
+    assert all(np.any(np.all(new_vertices == corner, axis=1)) for corner in corners)
+    # Boundary vertices only slide along the border of the square
+    boundary = qem_decimate.boundary_vertices(new_faces, len(new_vertices))
+    on_border = np.isclose(new_vertices[boundary, :2], 0) | np.isclose(new_vertices[boundary, :2], 39)
+    assert on_border.any(axis=1).all()
+
+
+def test_locked_vertices_do_not_move():
+    vertices, faces = sphere(3)
+    locked = np.zeros(len(vertices), dtype=bool)
+    locked[:12] = True
+    new_vertices, _ = qem_decimate.decimate(vertices, faces, 200, locked=locked)
+    assert all(np.any(np.all(new_vertices == vertex, axis=1)) for vertex in vertices[:12])
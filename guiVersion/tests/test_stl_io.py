@@ -0,0 +1,61 @@
+import numpy as np
+import pytest
+
+import stl_io
+from test_mesh_subdivision import sphere
+
+
+def write_ascii(filepath, triangles):
+    lines = ['solid test']
+    for triangle in triangles:
+        lines.append('  facet normal 0 0 0\n    outer loop')
+        lines.extend(f'      vertex {x!r} {y!r} {z!r}' for x, y, z in triangle.tolist())
+        lines.append('    endloop\n  endfacet')
+    lines.append('endsolid test\n')
+    with open(filepath, 'w') as f:
+        f.write('\n'.join(lines))
+
+
+@pytest.fixture
+def triangles():
+    vertices, faces = sphere(2)
+    return vertices.astype(np.float32)[faces]
+
+
+def test_binary_round_trip(tmp_path, triangles):
+    filepath = str(tmp_path / 'mesh.stl')
+    stl_io.write_triangles(filepath, triangles)
+    assert stl_io.is_binary_stl(filepath)
+    assert stl_io.read_triangle_count(filepath) == len(triangles)
+    assert np.array_equal(stl_io.read_triangles(filepath), triangles)
+    normals = stl_io.map_triangles(filepath)['normal']
+    assert np.allclose(np.linalg.norm(normals, axis=1), 1)
+
+
+def test_ascii_round_trip(tmp_path, triangles):
+    filepath = str(tmp_path / 'mesh.stl')
+    write_ascii(filepath, triangles)
+    assert not stl_io.is_binary_stl(filepath)
+    assert stl_io.read_triangle_count(filepath) == len(triangles)
+    assert np.array_equal(stl_io.read_triangles(filepath), triangles)
+    # Facets split across parser blocks are still read whole
+    chunks = list(stl_io.iter_ascii_triangles(filepath, chunk_size=1000))
+    assert len(chunks) > 1
+    assert np.array_equal(np.concatenate(chunks), triangles)
+
+
+def test_chunked_writes_match_a_single_write(tmp_path, triangles):
+    whole, chunked = str(tmp_path / 'whole.stl'), str(tmp_path / 'chunked.stl')
+    stl_io.write_triangles(whole, triangles)
+    stl_io.write_triangle_chunks(chunked, len(triangles), np.array_split(triangles, 7))
+    assert open(whole, 'rb').read() == open(chunked, 'rb').read()
+    assert np.array_equal(np.concatenate(list(stl_io.iter_triangle_chunks(chunked, 100))), triangles)
+    with pytest.raises(ValueError):
+        stl_io.write_triangle_chunks(chunked, len(triangles) + 1, [triangles])
+
+
+def test_binary_header_starting_with_solid(tmp_path, triangles):
+    filepath = str(tmp_path / 'mesh.stl')
+    stl_io.write_triangles(filepath, triangles, header=b'solid exported by some tool')
+    assert stl_io.is_binary_stl(filepath)
+    assert np.array_equal(stl_io.read_triangles(filepath), triangles)
@@ -0,0 +1,41 @@
+import numpy as np
+
+import vertex_weld
+from test_mesh_subdivision import sphere
+
+
+def test_weld_triangles_rebuilds_the_indexed_mesh():
+    vertices, faces = sphere(2)
+    welded_vertices, welded_faces = vertex_weld.weld_triangles(vertices[faces])
+    assert len(welded_vertices) == len(vertices)
+    assert np.array_equal(welded_vertices[welded_faces], vertices[faces])
+
+
+def test_vertices_within_tolerance_merge_into_the_lowest_index():
+    vertices = np.array([[0, 0, 0], [5e-5, 0, 0], [1, 0, 0], [1, 2e-4, 0], [0.0, 0, 0]])
+    welded, inverse = vertex_weld.weld_vertices(vertices, tolerance=1e-4)
+    assert len(welded) == 3
+    assert inverse[0] == inverse[1] == inverse[4]
+    assert inverse[2] != inverse[3]
+    assert np.array_equal(welded[inverse[0]], [0, 0, 0])
+
+
+def test_chains_of_close_vertices_merge():
+    # Neighbours are within tolerance, the ends of the chain are not
+    vertices = np.array([[i * 0.8e-4, 0, 0] for i in range(5)])
+    welded, inverse = vertex_weld.weld_vertices(vertices, tolerance=1e-4)
+    assert len(welded) == 1 and not inverse.any()
+
+
+def test_negative_zero_welds_exactly():
+    welded, _ = vertex_weld.weld_vertices(np.array([[0.0, 0, 0], [-0.0, 0, 0]]), tolerance=0)
+    assert len(welded) == 1
+
+
+def test_weld_mesh_drops_collapsed_faces():
+    vertices = np.array([[0, 0, 0], [1, 0, 0], [0, 1, 0], [1, 1e-5, 0]], dtype=float)
+    faces = np.array([[0, 1, 2], [1, 3, 2]])
+    welded_vertices, welded_faces = vertex_weld.weld_mesh(vertices, faces)
+    assert len(welded_vertices) == 3
+    assert len(welded_faces) == 1
+    assert np.array_equal(welded_vertices[welded_faces[0]], vertices[[0, 1, 2]])
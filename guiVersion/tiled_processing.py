@@ -0,0 +1,287 @@
+import os
+import tempfile
+import time
+
+import numpy as np
+import trimesh
+
+import mesh_engine
+import mesh_smoothing
+import mesh_subdivision
+import qem_decimate
+import stl_io
+import vertex_weld
+from stage_profiler import StageRecorder
+
+# Cells per axis of the histogram the tiles are cut from; a tile is a box of whole cells
+GRID_CELLS = 64
+# Peak working memory per tile triangle while welding and decimating, measured with tracemalloc
+# (about 950 bytes) plus room for the overlap band
+TILE_BYTES_PER_TRIANGLE = 1500
+# Peak memory of the in-core stages after stitching, per triangle of the subdivided mesh,
+# measured with tracemalloc (about 1450 bytes, the final decimation dominates)
+STITCHED_BYTES_PER_TRIANGLE = 1600
+# Memory per triangle of one streamed chunk: corners, centroids, cells and tile lookups
+STREAM_BYTES_PER_TRIANGLE = 400
+
+# A cell and its 26 neighbours
+_NEIGHBOUR_OFFSETS = np.array([(dx, dy, dz) for dx in (-1, 0, 1) for dy in (-1, 0, 1) for dz in (-1, 0, 1)])
+
+
+def fits_in_memory(triangle_count, memory_budget):
+    return triangle_count * TILE_BYTES_PER_TRIANGLE <= memory_budget
+
+
+def stitched_peak(vertex_count, face_count, subdivision_levels, memory_budget):
+    """Forecast peak bytes of the stages after stitching, which run on the whole subdivided mesh."""
+    levels = mesh_subdivision.affordable_levels(vertex_count, face_count, subdivision_levels, memory_budget)
+    return face_count * 4 ** levels * STITCHED_BYTES_PER_TRIANGLE
+
+
+def chunk_triangles(memory_budget):
+    # A quarter of the budget for the chunk, the rest stays free for the tile being written
+    return max(4096, memory_budget // (4 * STREAM_BYTES_PER_TRIANGLE))
+
+
+def bounding_box(filepath, chunk_size):
+    low = np.full(3, np.inf)
+    high = np.full(3, -np.inf)
+    for chunk in stl_io.iter_triangle_chunks(filepath, chunk_size):
+        corners = chunk.reshape(-1, 3)
+        low = np.minimum(low, corners.min(axis=0))
+        high = np.maximum(high, corners.max(axis=0))
+    return low, high
+
+
+class TileGrid:
+    """The histogram grid over the scan's bounding box and the tile each cell belongs to."""
+
+    def __init__(self, low, high):
+        self.low = low
+        # Flat axes still get a non-zero cell size
+        self.cell_size = np.maximum(high - low, 1e-9) / GRID_CELLS
+        self.cell_tile = None
+        self.tiles = []
+
+    def cells(self, triangles):
+        centroids = triangles.mean(axis=1, dtype=np.float64)
+        cells = np.floor((centroids - self.low) / self.cell_size).astype(np.int64)
+        return np.clip(cells, 0, GRID_CELLS - 1)
+
+    def histogram(self, filepath, chunk_size):
+        counts = np.zeros((GRID_CELLS,) * 3, dtype=np.int64)
+        for chunk in stl_io.iter_triangle_chunks(filepath, chunk_size):
+            cells = self.cells(chunk)
+            np.add.at(counts, (cells[:, 0], cells[:, 1], cells[:, 2]), 1)
+        return counts
+
+    def split(self, counts, tile_triangles):
+        """kd-split the grid into boxes of at most `tile_triangles`, cutting the longest axis at the median."""
+        boxes = [(np.zeros(3, dtype=np.int64), np.full(3, GRID_CELLS, dtype=np.int64))]
+        tiles = []
+        while boxes:
+            low, high = boxes.pop()
+            box_counts = counts[low[0]:high[0], low[1]:high[1], low[2]:high[2]]
+            total = box_counts.sum()
+            if total == 0:
+                continue
+            if total <= tile_triangles or np.all(high - low == 1):
+                tiles.append((low, high, int(total)))
+                continue
+            axis = int(np.argmax(high - low))
+            other_axes = tuple(a for a in range(3) if a != axis)
+            running = np.cumsum(box_counts.sum(axis=other_axes))
+            cut = int(np.searchsorted(running, total / 2))
+            cut = min(max(cut, 1), high[axis] - low[axis] - 1)
+            first_high, second_low = high.copy(), low.copy()
+            first_high[axis] = second_low[axis] = low[axis] + cut
+            boxes += [(low, first_high), (second_low, high)]
+        self.tiles = tiles
+        self.cell_tile = np.full((GRID_CELLS,) * 3, -1, dtype=np.int64)
+        for index, (low, high, _) in enumerate(tiles):
+            self.cell_tile[low[0]:high[0], low[1]:high[1], low[2]:high[2]] = index
+        return tiles
+
+    def assign(self, triangles):
+        """(core tile per triangle, (triangle, tile) pairs of the overlap band of every other tile)."""
+        core = self.cell_tile[tuple(self.cells(triangles).T)]
+        triangle_index = np.arange(len(triangles))[:, None]
+        pairs = []
+        for corner in range(3):
+            corner_cells = np.floor((triangles[:, corner] - self.low) / self.cell_size).astype(np.int64)
+            neighbours = np.clip(corner_cells, 0, GRID_CELLS - 1)[:, None, :] + _NEIGHBOUR_OFFSETS[None, :, :]
+            inside = np.all((neighbours >= 0) & (neighbours < GRID_CELLS), axis=2)
+            neighbours = np.clip(neighbours, 0, GRID_CELLS - 1)
+            tiles = self.cell_tile[neighbours[..., 0], neighbours[..., 1], neighbours[..., 2]]
+            band = inside & (tiles != core[:, None]) & (tiles >= 0)
+            pairs.append(np.stack([np.broadcast_to(triangle_index, band.shape)[band], tiles[band]], axis=1))
+        return core, np.unique(np.concatenate(pairs), axis=0)
+
+
+def _append(path, triangles):
+    with open(path, 'ab') as f:
+        f.write(np.ascontiguousarray(triangles, dtype='<f4').tobytes())
+
+
+def _read(path):
+    if not os.path.exists(path):
+        return np.zeros((0, 3, 3), dtype=np.float32)
+    return np.fromfile(path, dtype='<f4').reshape(-1, 3, 3)
+
+
+def bin_triangles(filepath, grid, chunk_size, directory):
+    """Stream the scan once more and append every triangle to its tile's core file and any band files."""
+    for chunk in stl_io.iter_triangle_chunks(filepath, chunk_size):
+        core, pairs = grid.assign(chunk)
+        order = np.argsort(core, kind='stable')
+        tiles, starts = np.unique(core[order], return_index=True)
+        for tile, group in zip(tiles, np.split(order, starts[1:])):
+            _append(os.path.join(directory, f'{tile}.core'), chunk[group])
+        if len(pairs):
+            # Pairs come sorted by triangle; group them by tile
+            pairs = pairs[np.argsort(pairs[:, 1], kind='stable')]
+            tiles, starts = np.unique(pairs[:, 1], return_index=True)
+            for tile, group in zip(tiles, np.split(pairs[:, 0], starts[1:])):
+                _append(os.path.join(directory, f'{tile}.band'), chunk[group])
+
+
+def decimate_tile(core_triangles, target_polygon_count):
+    """
+    Weld and decimate one tile's core. Its cut edges are mesh boundary, which is
+    locked, so neighbouring tiles still share the same seam vertices.
+    """
+    vertices, faces = vertex_weld.weld_triangles(core_triangles)
+    if len(faces) > target_polygon_count:
+        # The one-ring around the seam is locked too; collapsing into a seam vertex could
+        # otherwise join two seam vertices that the neighbouring tile also joins
+        seam = qem_decimate.boundary_vertices(faces, len(vertices))
+        locked = np.zeros(len(vertices), dtype=bool)
+        locked[faces[seam[faces].any(axis=1)].ravel()] = True
+        vertices, faces = qem_decimate.decimate(vertices, faces, target_polygon_count, locked=locked)
+    return vertices, faces
+
+
+def smooth_tile(vertices, faces, band_triangles, laplacian_smooth_lambda_factor):
+    """Smooth a tile together with its overlap band, so seam vertices average over both sides of the cut."""
+    band_vertices, band_faces = vertex_weld.weld_triangles(band_triangles)
+    merged, inverse = vertex_weld.weld_vertices(np.concatenate([vertices, band_vertices]))
+    all_faces = np.concatenate([inverse[faces], inverse[band_faces + len(vertices)]])
+    in_tile = np.zeros(len(merged), dtype=bool)
+    in_tile[inverse[:len(vertices)]] = True
+    pinned = qem_decimate.boundary_vertices(all_faces, len(merged)) & ~in_tile
+    smoothed = mesh_smoothing.laplacian_smooth(
+        merged, all_faces, laplacian_smooth_lambda_factor, weights='cotangent', pinned=pinned
+    )
+    return smoothed[inverse[:len(vertices)]]
+
+
+def average_seams(pieces):
+    """Move seam vertices to the mean of their smoothed positions, so neighbouring tiles meet again."""
+    seams = [qem_decimate.boundary_vertices(faces, len(vertices)) for vertices, _, faces in pieces]
+    # Seam vertices were locked while decimating, so both tiles still have them at the same position
+    _, group = vertex_weld.weld_vertices(np.concatenate([vertices[seam] for (vertices, _, _), seam in zip(pieces, seams)]))
+    seam_smoothed = np.concatenate([smoothed[seam] for (_, smoothed, _), seam in zip(pieces, seams)])
+    counts = np.bincount(group)
+    means = np.stack([np.bincount(group, seam_smoothed[:, axis]) for axis in range(3)], axis=1) / counts[:, None]
+    averaged = []
+    start = 0
+    for (_, smoothed, faces), seam in zip(pieces, seams):
+        smoothed = smoothed.copy()
+        smoothed[seam] = means[group[start:start + seam.sum()]]
+        start += seam.sum()
+        averaged.append((smoothed, faces))
+    return averaged
+
+
+def process_stl_tiled(
+    filepath, directory_path, filename,
+    target_polygon_count, laplacian_smooth_lambda_factor,
+    subdivision_levels, smoothing_factor, smoothing_iterations,
+    crisp_edge_bevel_width, memory_budget, lod_polygon_counts=(), log_callback=print, stage_callback=None
+):
+    """
+    Out-of-core variant of mesh_engine.process_stl for scans that do not fit in `memory_budget`.
+    The budget covers the tile phase only; the stitched mesh is processed in core.
+    """
+    params = {
+        'target_polygon_count': target_polygon_count,
+        'laplacian_smooth_lambda_factor': laplacian_smooth_lambda_factor,
+        'subdivision_levels': subdivision_levels,
+        'smoothing_factor': smoothing_factor,
+        'smoothing_iterations': smoothing_iterations,
+        'crisp_edge_bevel_width': crisp_edge_bevel_width,
+    }
+    log_callback(f"Processing file: {filename} in tiles")
+    file_start_time = time.time()
+    stages = StageRecorder(stage_callback, filename)
+    chunk_size = chunk_triangles(memory_budget)
+
+    stages.start('import')
+    input_polygons = stl_io.read_triangle_count(filepath)
+    grid = TileGrid(*bounding_box(filepath, chunk_size))
+    tiles = grid.split(grid.histogram(filepath, chunk_size), memory_budget // TILE_BYTES_PER_TRIANGLE)
+    oversized = [count for _, _, count in tiles if not fits_in_memory(count, memory_budget)]
+    if oversized:
+        log_callback(f"{len(oversized)} tiles are a single grid cell over the memory budget, "
+                     f"the largest has {max(oversized)} triangles")
+
+    with tempfile.TemporaryDirectory(prefix='tiles-') as tile_directory:
+        bin_triangles(filepath, grid, chunk_size, tile_directory)
+        stages.end('import')
+        log_callback(f"Binned {input_polygons} triangles into {len(tiles)} tiles")
+
+        pieces = []
+        for index, (_, _, count) in enumerate(tiles):
+            core = _read(os.path.join(tile_directory, f'{index}.core'))
+            # The tile is still a triangle soup, three corners per face
+            stages.start('initial_decimation', (core.reshape(-1, 3), core))
+            tile_target = max(1, round(target_polygon_count * count / input_polygons))
+            vertices, faces = decimate_tile(core, tile_target)
+            stages.end('initial_decimation', (vertices, faces))
+            stages.start('laplacian_smooth', (vertices, faces))
+            smoothed = smooth_tile(
+                vertices, faces, _read(os.path.join(tile_directory, f'{index}.band')), laplacian_smooth_lambda_factor
+            )
+            stages.end('laplacian_smooth', (vertices, faces))
+            pieces.append((vertices, smoothed, faces))
+        stages.start('laplacian_smooth')
+        pieces = average_seams(pieces)
+        stages.end('laplacian_smooth')
+        for name in ('initial_decimation', 'laplacian_smooth'):
+            log_callback(f"Time for {name}: {stages.timings()[name]} seconds")
+
+    # The seam vertices of neighbouring tiles are identical again, so welding stitches them
+    offsets = np.cumsum([0] + [len(vertices) for vertices, _ in pieces[:-1]])
+    vertices, faces = vertex_weld.weld_mesh(
+        np.concatenate([vertices for vertices, _ in pieces]),
+        np.concatenate([faces + offset for (_, faces), offset in zip(pieces, offsets)])
+    )
+    mesh = trimesh.Trimesh(vertices, faces, process=False)
+    peak = stitched_peak(len(vertices), len(faces), subdivision_levels, memory_budget)
+    if peak > memory_budget:
+        log_callback(f"Warning: the stitched mesh of {len(faces):,} triangles needs about {peak / 1024 ** 2:,.0f} MiB "
+                     f"for the remaining stages, over the {memory_budget / 1024 ** 2:,.0f} MiB budget that only "
+                     f"covers the tiles; lower the target polygon count or subdivision levels to stay within it")
+
+    for name, function, param_names in mesh_engine.PIPELINE_STAGES[2:]:
+        stages.start(name, mesh)
+        if name == 'subdivision':
+            mesh = function(mesh, subdivision_levels, memory_budget, log_callback)
+        else:
+            mesh = function(mesh, *(params[param] for param in param_names))
+        log_callback(f"Time for {name}: {stages.end(name, mesh)} seconds")
+
+    outputs = mesh_engine.export_outputs(
+        mesh, directory_path, filename, target_polygon_count, lod_polygon_counts, stages, log_callback
+    )
+    return {
+        'output_path': outputs[0]['output_path'],
+        'input_polygons': input_polygons,
+        'output_polygons': outputs[0]['output_polygons'],
+        'outputs': outputs,
+        'stage_timings': stages.timings(),
+        'stage_profile': stages.records(),
+        'total_time': time.time() - file_start_time,
+        'resumed_after': None,
+        'tiles': len(tiles),
+    }
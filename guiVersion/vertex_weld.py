@@ -0,0 +1,88 @@
+import numpy as np
+import scipy.sparse
+from scipy.sparse.csgraph import connected_components
+
+# Same merge distance as Blender's remove_doubles default
+WELD_TOLERANCE = 1e-4
+
+# The cell itself plus the 13 neighbours that come after it in key order;
+# checking only these finds every pair of adjacent cells exactly once
+_HALF_NEIGHBOURHOOD = [
+    (dx, dy, dz)
+    for dx in (-1, 0, 1) for dy in (-1, 0, 1) for dz in (-1, 0, 1)
+    if (dx, dy, dz) >= (0, 0, 0)
+]
+
+
+def _exact_unique(vertices):
+    """Collapse bit-identical coordinates; returns (unique vertices, inverse)."""
+    # Adding zero turns -0.0 into 0.0 so both land on the same bytes
+    vertices = np.ascontiguousarray(vertices + 0.0, dtype=np.float64)
+    rows = vertices.view(np.dtype((np.void, vertices.dtype.itemsize * 3))).ravel()
+    _, first, inverse = np.unique(rows, return_index=True, return_inverse=True)
+    return vertices[first], inverse.ravel()
+
+
+def _close_pairs(vertices, tolerance):
+    """Index pairs (i, j) of vertices at most `tolerance` apart, found through a grid of tolerance-sized cells."""
+    cells = np.floor((vertices - vertices.min(axis=0)) / tolerance).astype(np.int64)
+    dims = cells.max(axis=0) + 1
+    if float(dims[0]) * float(dims[1]) * float(dims[2]) >= 2 ** 62:
+        raise ValueError(f"Weld tolerance {tolerance} is too fine for a mesh of this size")
+    keys = (cells[:, 0] * dims[1] + cells[:, 1]) * dims[2] + cells[:, 2]
+    order = np.argsort(keys, kind='stable')
+    sorted_keys = keys[order]
+    positions = np.arange(len(order))
+
+    first, second = [], []
+    for dx, dy, dz in _HALF_NEIGHBOURHOOD:
+        # Neighbours past a grid face wrap onto another row; the distance test drops them
+        target = sorted_keys + (dx * dims[1] + dy) * dims[2] + dz
+        low = np.searchsorted(sorted_keys, target, side='left')
+        counts = np.searchsorted(sorted_keys, target, side='right') - low
+        source = np.repeat(positions, counts)
+        starts = np.repeat(np.cumsum(counts) - counts, counts)
+        candidate = low[source] + np.arange(len(source)) - starts
+        if (dx, dy, dz) == (0, 0, 0):
+            keep = candidate > source
+            source, candidate = source[keep], candidate[keep]
+        i, j = order[source], order[candidate]
+        close = np.einsum('ij,ij->i', vertices[i] - vertices[j], vertices[i] - vertices[j]) <= tolerance ** 2
+        first.append(i[close])
+        second.append(j[close])
+    return np.concatenate(first), np.concatenate(second)
+
+
+def weld_vertices(vertices, tolerance=WELD_TOLERANCE):
+    """Merge vertices closer than `tolerance`, like remove_doubles; returns (welded vertices, inverse)."""
+    unique, inverse = _exact_unique(vertices)
+    if tolerance <= 0 or len(unique) < 2:
+        return unique, inverse
+    i, j = _close_pairs(unique, tolerance)
+    if len(i) == 0:
+        return unique, inverse
+    graph = scipy.sparse.coo_matrix((np.ones(len(i), dtype=np.int8), (i, j)), shape=(len(unique), len(unique)))
+    _, labels = connected_components(graph, directed=False)
+    _, representative, groups = np.unique(labels, return_index=True, return_inverse=True)
+    return unique[representative], groups.ravel()[inverse]
+
+
+def weld_triangles(triangles, tolerance=WELD_TOLERANCE):
+    """
+    Build an indexed mesh from (n, 3, 3) triangle corners, as read from an STL.
+    Triangles that lose a corner to the weld are dropped.
+    """
+    triangles = np.asarray(triangles, dtype=np.float64)
+    vertices, inverse = weld_vertices(triangles.reshape(-1, 3), tolerance)
+    return vertices, _without_degenerate(inverse.reshape(-1, 3))
+
+
+def weld_mesh(vertices, faces, tolerance=WELD_TOLERANCE):
+    """Weld an indexed mesh; returns new (vertices, faces) with collapsed faces dropped."""
+    vertices, inverse = weld_vertices(vertices, tolerance)
+    return vertices, _without_degenerate(inverse[np.asarray(faces)])
+
+
+def _without_degenerate(faces):
+    keep = (faces[:, 0] != faces[:, 1]) & (faces[:, 1] != faces[:, 2]) & (faces[:, 2] != faces[:, 0])
+    return faces[keep]
@@ -1,114 +1,234 @@
-import bpy
+"""
+Headless batch front end for the mesh pipeline.
+
+    python modifyStl.py E:/scans/scripts/todo --engine native --jobs 8
+    python modifyStl.py "scans/**/*.stl" --output-dir processed --target-polygon-count 250000,50000
+    python modifyStl.py E:/scans/overnight --journal overnight.jsonl   # rerun the same line to resume
+    python modifyStl.py E:/scans/sample --profile sample-profile.jsonl  # per-stage timing report at the end
+"""
+import argparse
+import glob
 import os
+import sys
+import threading
 import time
-# C:\Program Files\Blender Foundation\Blender 3.6
-#  ./blender --background --python modifyStl.py
-# Set the directory path
-directory_path = "E:/scans/scripts/todo"
-
-# Get a list of all files in directory
-all_files = os.listdir(directory_path)
-
-# Filter out all .stl files
-stl_files = [f for f in all_files if f.endswith(".stl")]
-
-for stl in stl_files:
-    # Clear all mesh objects
-    bpy.ops.object.select_all(action='DESELECT')
-    bpy.ops.object.select_by_type(type='MESH')
-    bpy.ops.object.delete()
-
-    print("Processing file: ", stl, flush=True)
-
-    # Import STL file
-    start_time = time.time()
-    bpy.ops.import_mesh.stl(filepath=os.path.join(directory_path, stl))
-    print("Time to import: ", time.time() - start_time, "seconds", flush=True)
-
-    # Get the current object
-    obj = bpy.context.active_object
-
-    print("Applying final decimation...", flush=True)
-    start_time = time.time() 
-    # Decimate the model to 50k polygons
-    final_decimate_ratio = 250000 / len(obj.data.polygons)
-    bpy.ops.object.modifier_add(type='DECIMATE')
-    obj.modifiers["Decimate"].ratio = final_decimate_ratio
-    bpy.ops.object.modifier_apply(modifier="Decimate")
-    print("Time for final decimation: ", time.time() - start_time, "seconds", flush=True)
-
-    print("Denoising the surface - Laplacian Smooth...", flush=True)
-    start_time = time.time()
-    # Denoise the surface using Laplacian Smooth
-    bpy.ops.object.modifier_add(type='LAPLACIANSMOOTH')
-    obj.modifiers["LaplacianSmooth"].lambda_factor = 0.1
-    bpy.ops.object.modifier_apply(modifier="LaplacianSmooth")
-    print("Time for Laplacian Smooth denoising: ", time.time() - start_time, "seconds", flush=True)
-
-    print("Applying subdivision surface modifier...", flush=True)
-    start_time = time.time()
-    # Dynamic subdivision (Subdivision Surface)
-    bpy.ops.object.modifier_add(type='SUBSURF')
-    obj.modifiers["Subdivision"].levels = 1 # Increase as needed
-    bpy.ops.object.modifier_apply(modifier="Subdivision")
-    print("Time for subdivision: ", time.time() - start_time, "seconds", flush=True)
-
-    print("Denoising the surface - Smooth...", flush=True)
-    start_time = time.time()
-    # Denoise the surface using Smooth
-    bpy.ops.object.modifier_add(type='SMOOTH')
-    obj.modifiers["Smooth"].factor = .5
-    obj.modifiers["Smooth"].iterations = 2
-    bpy.ops.object.modifier_apply(modifier="Smooth")
-    print("Time for denoising - Smooth: ", time.time() - start_time, "seconds", flush=True)
-    
-    print("Making edges crisp...", flush=True)
-    start_time = time.time()
-    # Make edges more crisp
-    bpy.ops.object.modifier_add(type='BEVEL')
-    obj.modifiers["Bevel"].width = 0.01
-    bpy.ops.object.modifier_apply(modifier="Bevel")
-    print("Time for making edges crisp: ", time.time() - start_time, "seconds", flush=True)
-
-    print("Cleaning up the mesh...", flush=True)
-    start_time = time.time()
-    # Clean up the mesh
-    bpy.ops.object.mode_set(mode = 'EDIT')
-    bpy.ops.mesh.remove_doubles()
-    bpy.ops.mesh.fill_holes()
-    bpy.ops.object.mode_set(mode = 'OBJECT')
-    print("Time for cleaning up the mesh: ", time.time() - start_time, "seconds", flush=True)
-
-    # print("Remeshing...", flush=True)
-    # start_time = time.time()
-    # Remeshing
-    # bpy.ops.object.modifier_add(type='REMESH')
-    # obj.modifiers["Remesh"].octree_depth = 5
-    # obj.modifiers["Remesh"].use_smooth_shade = True
-    # bpy.ops.object.modifier_apply(modifier="Remesh")
-    # print("Time for remeshing: ", time.time() - start_time, "seconds", flush=True)
-
-    print("Applying final decimation...", flush=True)
-    start_time = time.time() 
-    # Decimate the model to 50k polygons
-    final_decimate_ratio = 250000 / len(obj.data.polygons)
-    bpy.ops.object.modifier_add(type='DECIMATE')
-    obj.modifiers["Decimate"].ratio = final_decimate_ratio
-    bpy.ops.object.modifier_apply(modifier="Decimate")
-    print("Time for final decimation: ", time.time() - start_time, "seconds", flush=True)
-
-    # print("Adding Edge Split modifier...", flush=True)
-    # start_time = time.time()
-    # # Add Edge Split modifier
-    # bpy.ops.object.modifier_add(type='EDGE_SPLIT')
-    # obj.modifiers["EdgeSplit"].split_angle = 0.785398 # 45 degrees
-    # bpy.ops.object.modifier_apply(modifier="EdgeSplit")
-    # print("Time for Edge Split: ", time.time() - start_time, "seconds", flush=True)
-
-    print("Exporting the processed STL...", flush=True)
-    start_time = time.time()
-    # Export the processed STL
-    bpy.ops.export_mesh.stl(filepath=os.path.join(directory_path, "processed_" + stl))
-    print("Time for exporting: ", time.time() - start_time, "seconds", flush=True)
-
-    print("Done processing ", stl, "\n", flush=True)
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'guiVersion'))
+
+from job_journal import JobJournal, QUEUED, job_key
+from job_scheduler import JobScheduler, COMPLETE, ERROR, CANCELLED, RETRYING, estimate_job_cost
+from processing_backends import (
+    ENGINES, create_worker_pool, engine_version, estimate_job_memory, format_outputs, run_pipeline_job
+)
+from result_cache import ResultCache
+from stage_profiler import ProfileLog, format_report
+
+EXIT_FAILED = 1
+EXIT_INTERRUPTED = 130
+
+
+def parse_targets(text):
+    targets = sorted((int(target) for target in text.split(',')), reverse=True)
+    if not targets or targets[-1] <= 0:
+        raise argparse.ArgumentTypeError(f"expected positive polygon counts, got '{text}'")
+    return targets
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Process STL scans with the ModelEnhancer pipeline.")
+    parser.add_argument('inputs', nargs='+',
+                        help="directories, STL files or glob patterns (quote them so the shell leaves ** alone)")
+    parser.add_argument('--output-dir', help="where processed files go; defaults to each input's own directory")
+    parser.add_argument('--engine', choices=ENGINES, default='blender')
+    parser.add_argument('--jobs', type=int, default=os.cpu_count() or 1, help="files processed in parallel")
+    parser.add_argument('--memory-budget', type=float,
+                        help="GiB the running jobs may use together, by their estimated peak memory. Native jobs on "
+                             "scans over mesh_engine.MEMORY_BUDGET are tiled; that budget bounds the tile phase "
+                             "only, not the stages run on the stitched mesh")
+    parser.add_argument('--timeout', type=float,
+                        help="seconds a Blender job may run before its worker is killed and the job fails")
+    parser.add_argument('--retries', type=int, default=0, help="extra attempts for a failed file")
+    parser.add_argument('--no-cache', action='store_true', help="always reprocess, even when a cached result exists")
+    parser.add_argument('--journal', help="JSON-lines job journal; rerunning with the same journal resumes the batch")
+    parser.add_argument('--max-attempts', type=int, default=3,
+                        help="with --journal, failed attempts per file across restarts before it is given up on; "
+                             "runs interrupted by a crash do not count")
+    parser.add_argument('--profile',
+                        help="append per-stage timing, CPU, memory and mesh size records to this JSON-lines file "
+                             "and print a per-stage report when the batch ends")
+
+    pipeline = parser.add_argument_group('pipeline parameters')
+    pipeline.add_argument('--target-polygon-count', type=parse_targets, default=[250000],
+                          help="one count, or comma-separated counts to write an LOD per count")
+    pipeline.add_argument('--laplacian-smooth-lambda-factor', type=float, default=1.0)
+    pipeline.add_argument('--subdivision-levels', type=int, default=1)
+    pipeline.add_argument('--smoothing-factor', type=float, default=1.0)
+    pipeline.add_argument('--smoothing-iterations', type=int, default=2)
+    pipeline.add_argument('--crisp-edge-bevel-width', type=float, default=0.1)
+    return parser.parse_args(argv)
+
+
+def collect_inputs(patterns):
+    """STL files named by `patterns`, skipping earlier outputs (processed_*)."""
+    files = {}
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            matches = glob.glob(os.path.join(pattern, '*.stl'))
+        else:
+            matches = glob.glob(pattern, recursive=True)
+        for match in matches:
+            name = os.path.basename(match)
+            if name.lower().endswith('.stl') and not name.startswith('processed_'):
+                files.setdefault(os.path.abspath(match), None)
+    return sorted(files)
+
+
+def pipeline_params(args):
+    return {
+        'target_polygon_count': args.target_polygon_count[0],
+        'laplacian_smooth_lambda_factor': args.laplacian_smooth_lambda_factor,
+        'subdivision_levels': args.subdivision_levels,
+        'smoothing_factor': args.smoothing_factor,
+        'smoothing_iterations': args.smoothing_iterations,
+        'crisp_edge_bevel_width': args.crisp_edge_bevel_width,
+        'lod_polygon_counts': args.target_polygon_count[1:],
+    }
+
+
+def output_directory(args, filepath):
+    return args.output_dir or os.path.dirname(filepath)
+
+
+def format_duration(seconds):
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours:d}:{minutes:02d}:{seconds:02d}"
+
+
+class ProgressReporter:
+    """Scheduler status callback printing one line per finished job with running throughput."""
+
+    def __init__(self, total, stream=sys.stdout):
+        self.total = total
+        self.stream = stream
+        self.start_time = time.time()
+        self.finished = {COMPLETE: 0, ERROR: 0, CANCELLED: 0}
+        self.input_triangles = 0
+        self._lock = threading.Lock()
+
+    @property
+    def done(self):
+        return sum(self.finished.values())
+
+    def __call__(self, job, status):
+        with self._lock:
+            if status == RETRYING:
+                self.print(f"retrying {job.name} after attempt {job.attempts}: {job.error}")
+                return
+            if status not in self.finished:
+                return
+            self.finished[status] += 1
+            detail = ''
+            if status == COMPLETE:
+                self.input_triangles += job.result['input_polygons']
+                detail = f"{job.result['input_polygons']:,} -> {format_outputs(job.result)} tris"
+                if job.result.get('cached'):
+                    detail += " (cached)"
+            elif status == ERROR:
+                detail = str(job.error)
+            elapsed = time.time() - self.start_time
+            rate = self.done / elapsed if elapsed > 0 else 0.0
+            remaining = format_duration((self.total - self.done) / rate) if rate > 0 else '?'
+            self.print(
+                f"[{self.done:{len(str(self.total))}d}/{self.total}] {status:<9} {job.name}  {detail}  | "
+                f"{rate * 60:.1f} files/min, {self.input_triangles / max(elapsed, 1e-9) / 1e6:.2f}M tris/s, "
+                f"ETA {remaining}"
+            )
+
+    def print(self, line):
+        print(line, file=self.stream, flush=True)
+
+    def summary(self):
+        elapsed = time.time() - self.start_time
+        return (
+            f"{self.finished[COMPLETE]} processed, {self.finished[ERROR]} failed, "
+            f"{self.finished[CANCELLED]} cancelled in {format_duration(elapsed)} "
+            f"({self.input_triangles / max(elapsed, 1e-9) / 1e6:.2f}M input tris/s)"
+        )
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    files = collect_inputs(args.inputs)
+    if not files:
+        print("No STL files matched " + ", ".join(args.inputs), file=sys.stderr)
+        return EXIT_FAILED
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+    params = pipeline_params(args)
+    journal = None
+    exhausted = []
+    # Journal id per file; it covers the settings, so a changed setting reprocesses the file
+    job_ids = {
+        file: job_key(file, {
+            'params': params,
+            'engine': args.engine,
+            'engine_version': engine_version(args.engine),
+            'output_directory': output_directory(args, file),
+        })
+        for file in files
+    }
+    if args.journal:
+        journal = JobJournal(args.journal)
+        files_by_id = {job_id: file for file, job_id in job_ids.items()}
+        plan = journal.plan(list(files_by_id), args.max_attempts)
+        files, exhausted = [files_by_id[job_id] for job_id in plan['run']], plan['exhausted']
+        print(f"Journal {args.journal}: {len(plan['done'])} already done, {len(plan['reclaimed'])} reclaimed "
+              f"from an interrupted run, {len(exhausted)} failed {args.max_attempts} times and skipped", flush=True)
+        for job_id in exhausted:
+            print(f"  giving up on {files_by_id[job_id]}: {journal.jobs[job_id]['error']}", flush=True)
+    cache = None if args.no_cache else ResultCache()
+    reporter = ProgressReporter(len(files))
+    profile = ProfileLog(args.profile) if args.profile else None
+    pool = create_worker_pool(args.engine, args.jobs, job_timeout=args.timeout)
+    memory_budget = args.memory_budget * 1024 ** 3 if args.memory_budget else None
+    scheduler = JobScheduler(args.jobs, args.retries, status_callback=reporter, memory_budget=memory_budget)
+    reporter.print(f"Processing {len(files)} files with the {args.engine} engine, {args.jobs} at a time")
+    try:
+        for file in sorted(files, key=estimate_job_cost, reverse=True):
+            run = lambda job, file=file: run_pipeline_job(
+                pool, args.engine, file, output_directory(args, file), params, cache, reporter.print
+            )
+            if journal is not None:
+                journal.record(job_ids[file], QUEUED)
+                run = journal.journaled(job_ids[file], run)
+            if profile is not None:
+                run = profile.profiled(file, run)
+            scheduler.submit(
+                os.path.basename(file), run, estimate_job_cost(file), estimate_job_memory(file, params, args.engine)
+            )
+        # A timeout keeps the main thread responsive to Ctrl+C
+        while not scheduler.wait(timeout=0.5):
+            pass
+    except KeyboardInterrupt:
+        reporter.print("Interrupted, cancelling the remaining jobs")
+        scheduler.cancel()
+        scheduler.shutdown(wait=False)
+        pool.shutdown(wait=False)
+        reporter.print(reporter.summary())
+        return EXIT_INTERRUPTED
+    finally:
+        if journal is not None:
+            journal.close()
+        if profile is not None:
+            profile.close()
+    scheduler.shutdown()
+    pool.shutdown()
+    reporter.print(reporter.summary())
+    if profile is not None:
+        reporter.print(format_report(profile.report()))
+    return EXIT_FAILED if reporter.finished[ERROR] or exhausted else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
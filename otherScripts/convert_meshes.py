@@ -0,0 +1,231 @@
+"""
+Convert folders of scans between STL and OBJ.
+
+    python convert_meshes.py E:/scans/scripts/todo --to obj
+    python convert_meshes.py E:/scans/obj --to stl --output-dir E:/scans/stl --jobs 8
+"""
+import argparse
+import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'guiVersion'))
+
+import stl_io
+import vertex_weld
+
+FORMATS = ('obj', 'stl')
+EXIT_FAILED = 1
+# Rows formatted per write by the OBJ writer; bounds the temporary Python objects
+OBJ_ROWS_PER_WRITE = 1 << 18
+# Text parsed per step by the OBJ reader
+OBJ_CHUNK_SIZE = 32 * 1024 * 1024
+# Faces expanded to triangles per step when writing an STL
+STL_FACES_PER_WRITE = 1 << 20
+# Enough significant digits to round-trip the float32 coordinates of an STL
+OBJ_VERTEX_FORMAT = 'v %.9g %.9g %.9g\n'
+OBJ_FACE_FORMAT = 'f %d %d %d\n'
+
+_VERTEX_PREFIXES = (b'v ', b'v\t')
+_FACE_PREFIXES = (b'f ', b'f\t')
+# Texture and normal references of a face corner (v/vt/vn, v//vn)
+_CORNER_SUFFIX = re.compile(rb'/[^\s]*')
+
+
+def write_obj(filepath, vertices, faces):
+    """Write an indexed mesh as OBJ text, formatting OBJ_ROWS_PER_WRITE rows per string operation."""
+    vertices = np.asarray(vertices)
+    faces = np.asarray(faces, dtype=np.int64) + 1
+    with open(filepath, 'w', encoding='ascii', newline='\n') as f:
+        f.write(f"# ModelEnhancer OBJ\n# {len(vertices)} vertices, {len(faces)} faces\n")
+        for array, row_format in ((vertices, OBJ_VERTEX_FORMAT), (faces, OBJ_FACE_FORMAT)):
+            for start in range(0, len(array), OBJ_ROWS_PER_WRITE):
+                block = array[start:start + OBJ_ROWS_PER_WRITE]
+                f.write((row_format * len(block)) % tuple(block.ravel().tolist()))
+
+
+def _polygon_faces(chunk, vertex_count):
+    """Slow path for a chunk with polygons or negative indices: fan-triangulate line by line."""
+    vertices, faces = [], []
+    for line in chunk.splitlines():
+        parts = line.split()
+        if not parts:
+            continue
+        if parts[0] == b'v':
+            vertices.append([float(value) for value in parts[1:4]])
+        elif parts[0] == b'f':
+            corners = []
+            for part in parts[1:]:
+                index = int(part.split(b'/')[0])
+                # Negative indices count back from the last vertex read so far
+                corners.append(index - 1 if index > 0 else vertex_count + len(vertices) + index)
+            faces.extend([corners[0], corners[i], corners[i + 1]] for i in range(1, len(corners) - 1))
+    return (np.array(vertices, dtype=np.float32).reshape(-1, 3),
+            np.array(faces, dtype=np.int64).reshape(-1, 3))
+
+
+def _parse_records(chunk, vertex_count):
+    """Vertices and triangles of one chunk, parsed by NumPy; polygons fall back to _polygon_faces."""
+    lines = chunk.split(b'\n')
+    vertex_lines = [line[2:] for line in lines if line.startswith(_VERTEX_PREFIXES)]
+    face_lines = [line[2:] for line in lines if line.startswith(_FACE_PREFIXES)]
+    vertices = np.fromstring(b' '.join(vertex_lines), dtype=np.float32, sep=' ')
+    face_text = b' '.join(face_lines)
+    if b'/' in face_text:
+        face_text = _CORNER_SUFFIX.sub(b'', face_text)
+    faces = np.fromstring(face_text, dtype=np.int64, sep=' ')
+    if len(vertices) != 3 * len(vertex_lines) or len(faces) != 3 * len(face_lines) or (len(faces) and faces.min() < 1):
+        return _polygon_faces(chunk, vertex_count)
+    return vertices.reshape(-1, 3), faces.reshape(-1, 3) - 1
+
+
+def iter_obj_chunks(filepath, chunk_size=OBJ_CHUNK_SIZE):
+    """
+    Yield (vertices, faces) per chunk of an OBJ file, faces as 0-based indices into
+    all vertices read so far. Only 'v' and 'f' records are read; polygons are fanned into triangles.
+    """
+    vertex_count = 0
+    with open(filepath, 'rb') as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            # Finish the line the chunk ends in
+            chunk += f.readline()
+            vertices, faces = _parse_records(chunk, vertex_count)
+            vertex_count += len(vertices)
+            yield vertices, faces
+
+
+def read_obj(filepath, chunk_size=OBJ_CHUNK_SIZE):
+    """
+    Indexed mesh of an OBJ file. The text is streamed, so only the binary arrays
+    (float32 vertices, int64 faces) have to fit in memory, not the file.
+    """
+    vertices, faces = [], []
+    for vertex_chunk, face_chunk in iter_obj_chunks(filepath, chunk_size):
+        vertices.append(vertex_chunk)
+        faces.append(face_chunk)
+    vertices = np.concatenate(vertices) if vertices else np.zeros((0, 3), dtype=np.float32)
+    faces = np.concatenate(faces) if faces else np.zeros((0, 3), dtype=np.int64)
+    if len(faces) and (faces.min() < 0 or faces.max() >= len(vertices)):
+        raise ValueError(f"{filepath} has faces that refer to missing vertices")
+    return vertices, faces
+
+
+def stl_to_obj(input_path, output_path, weld_tolerance=0.0):
+    vertices, faces = vertex_weld.weld_triangles(stl_io.read_triangles(input_path), weld_tolerance)
+    write_obj(output_path, vertices, faces)
+    return len(faces)
+
+
+def obj_to_stl(input_path, output_path):
+    vertices, faces = read_obj(input_path)
+    chunks = (vertices[faces[start:start + STL_FACES_PER_WRITE]] for start in range(0, len(faces), STL_FACES_PER_WRITE))
+    stl_io.write_triangle_chunks(output_path, len(faces), chunks)
+    return len(faces)
+
+
+def output_path_for(input_path, output_directory, output_format):
+    name = os.path.splitext(os.path.basename(input_path))[0] + '.' + output_format
+    return os.path.join(output_directory or os.path.dirname(input_path), name)
+
+
+def is_up_to_date(input_path, output_path):
+    return os.path.exists(output_path) and os.path.getmtime(output_path) >= os.path.getmtime(input_path)
+
+
+def convert_file(input_path, output_path, weld_tolerance=0.0):
+    """Convert one file by its extensions; returns (faces, seconds). The output appears only when complete."""
+    start_time = time.time()
+    temp_path = output_path + '.partial'
+    try:
+        if output_path.lower().endswith('.obj'):
+            faces = stl_to_obj(input_path, temp_path, weld_tolerance)
+        else:
+            faces = obj_to_stl(input_path, temp_path)
+        os.replace(temp_path, output_path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+    return faces, time.time() - start_time
+
+
+def collect_inputs(input_folder, output_format):
+    input_extension = '.stl' if output_format == 'obj' else '.obj'
+    return sorted(
+        os.path.join(input_folder, name) for name in os.listdir(input_folder) if name.lower().endswith(input_extension)
+    )
+
+
+def convert_folder(input_folder, output_folder, output_format, jobs=1, force=False, weld_tolerance=0.0):
+    """
+    Convert every STL (to OBJ) or OBJ (to STL) file of `input_folder` into `output_folder`.
+    Returns (converted, skipped, failed) counts.
+    """
+    os.makedirs(output_folder, exist_ok=True)
+    pending = []
+    skipped = 0
+    for input_path in collect_inputs(input_folder, output_format):
+        output_path = output_path_for(input_path, output_folder, output_format)
+        if not force and is_up_to_date(input_path, output_path):
+            skipped += 1
+        else:
+            pending.append((input_path, output_path))
+    converted = failed = 0
+
+    def report(input_path, output_path, outcome):
+        nonlocal converted, failed
+        try:
+            faces, seconds = outcome()
+        except Exception as e:
+            failed += 1
+            print(f"Error converting {input_path}: {e}", flush=True)
+            return
+        converted += 1
+        print(f"Converted '{input_path}' to '{output_path}' ({faces:,} faces, {seconds:.2f}s)", flush=True)
+
+    if jobs <= 1 or len(pending) <= 1:
+        for input_path, output_path in pending:
+            report(input_path, output_path, lambda: convert_file(input_path, output_path, weld_tolerance))
+    else:
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            futures = {
+                executor.submit(convert_file, input_path, output_path, weld_tolerance): (input_path, output_path)
+                for input_path, output_path in pending
+            }
+            for future in as_completed(futures):
+                report(*futures[future], future.result)
+    return converted, skipped, failed
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Convert a folder of meshes between STL and OBJ.")
+    parser.add_argument('input_folder')
+    parser.add_argument('--to', dest='output_format', choices=FORMATS, required=True,
+                        help="obj converts every STL of the folder, stl every OBJ")
+    parser.add_argument('--output-dir', help="defaults to the input folder")
+    parser.add_argument('--jobs', type=int, default=os.cpu_count() or 1, help="files converted in parallel")
+    parser.add_argument('--force', action='store_true', help="convert even when the output is newer than the input")
+    parser.add_argument('--weld-tolerance', type=float, default=0.0,
+                        help="STL to OBJ: merge corners closer than this (0 merges exact duplicates only)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    start_time = time.time()
+    converted, skipped, failed = convert_folder(
+        args.input_folder, args.output_dir or args.input_folder, args.output_format,
+        args.jobs, args.force, args.weld_tolerance
+    )
+    print(f"{converted} converted, {skipped} up to date, {failed} failed in {time.time() - start_time:.1f}s")
+    return EXIT_FAILED if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
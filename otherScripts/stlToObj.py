@@ -1,28 +1,12 @@
-import os
-import trimesh
+import sys
 
-def convert_stl_to_obj(input_folder, output_folder):
-    # Ensure output directory exists
-    if not os.path.exists(output_folder):
-        os.makedirs(output_folder)
+from convert_meshes import convert_folder, main
 
-    # Iterate through all files in the input directory
-    for file in os.listdir(input_folder):
-        if file.lower().endswith('.stl'):
-            input_file = os.path.join(input_folder, file)
-            output_file = os.path.join(output_folder, os.path.splitext(file)[0] + '.obj')
 
-            # Load STL file
-            try:
-                mesh = trimesh.load(input_file)
-                # Export as OBJ
-                mesh.export(output_file, file_type='obj')
-                print(f"Converted '{input_file}' to '{output_file}'")
-            except Exception as e:
-                print(f"Error converting {input_file}: {e}")
+def convert_stl_to_obj(input_folder, output_folder, jobs=1):
+    return convert_folder(input_folder, output_folder, 'obj', jobs)
 
-# Set your folder paths here
-input_folder = 'E:/scans/scripts/todo'
-output_folder = 'E:/scans/scripts/todo'
 
-convert_stl_to_obj(input_folder, output_folder)
\ No newline at end of file
+if __name__ == '__main__':
+    # python stlToObj.py FOLDER [--output-dir DIR] [--jobs N]
+    sys.exit(main(sys.argv[1:] + ['--to', 'obj']))